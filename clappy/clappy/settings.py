@@ -63,6 +63,38 @@ ROOT_URLCONF = 'clappy.urls'
 # Configuration SMS NIMBASMS
 NIMBASMS_API_KEY = 'Basic ZTRjMWQ1ZTA0NDA5NzY4OTg4MzljOGQ3OWZjZTQzMjc6UEs5U0FvUjdVb1Zzd2lkQWtHd1Nrc0NaeGlGMWtHaXJRNU5SdnpleV85TUFlbUZPbGQ2MDFNUUtabHBKbGhkeHZSVEJGMVpIV2toeW1zU2VJZG9BTXdSV2stdVpvOGswQ3pwNGR2bFRYbGc='
 NIMBASMS_SENDER_NAME = 'Clappy CO'
+# Serveur NimbaSMS (surchargeable pour pointer vers `manage.py faux_nimbasms` en test)
+NIMBASMS_HOTE = os.getenv('NIMBASMS_HOTE', 'api.nimbasms.com')
+NIMBASMS_PORT = int(os.getenv('NIMBASMS_PORT')) if os.getenv('NIMBASMS_PORT') else None
+NIMBASMS_HTTPS = os.getenv('NIMBASMS_HTTPS', '1') not in ('0', 'false', 'False')
+# Pool d'envoi SMS: nombre de workers (une connexion keep-alive chacun) et taille de la file
+SMS_NOMBRE_WORKERS = 4
+SMS_TAILLE_FILE = 10000
+SMS_TIMEOUT_SECONDES = 30
+SMS_MAX_DESTINATAIRES = 100  # Numéros par requête pour un même message (champ "to")
+# File d'envoi durable (NotificationSortante), vidée après chaque commit et par
+# `manage.py traiter_notifications --boucle`; délai = BASE x 2^(tentative-1), plafonné à MAX
+NOTIFICATIONS_ENVOI_IMMEDIAT = True
+NOTIFICATIONS_TAILLE_LOT = 100
+NOTIFICATIONS_MAX_TENTATIVES = 6
+NOTIFICATIONS_DELAI_BASE_SECONDES = 30
+NOTIFICATIONS_DELAI_MAX_SECONDES = 3600
+NOTIFICATIONS_BAIL_SECONDES = 120
+NOTIFICATIONS_INTERVALLE_SECONDES = 2
+# Google Maps (géocodage, distance matrix) et son cache à deux niveaux
+GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
+GOOGLE_MAPS_BASE_URL = os.getenv('GOOGLE_MAPS_BASE_URL', 'https://maps.googleapis.com')  # Serveur local pour les tests
+GOOGLE_MAPS_CACHE_TAILLE_MEMOIRE = 5000
+GOOGLE_MAPS_CACHE_TTL_GEOCODAGE = 30 * 24 * 3600
+GOOGLE_MAPS_CACHE_TTL_ITINERAIRE = 7 * 24 * 3600
+GOOGLE_MAPS_CACHE_PRECISION = 4  # Décimales des coordonnées dans la clé (~11 m)
+# Routage (distance/durée des courses): Google par défaut, ou graphe OSM local
+# si ROUTAGE_OSM_FICHIER pointe vers un extrait .osm (Google reste en repli)
+ROUTAGE_OSM_FICHIER = os.getenv('ROUTAGE_OSM_FICHIER')
+ROUTAGE_BACKEND = {
+    'BACKEND': 'gestionclappy.routage.BackendOSM' if ROUTAGE_OSM_FICHIER else 'gestionclappy.routage.BackendGoogle',
+    'OPTIONS': {'fichier': ROUTAGE_OSM_FICHIER, 'repli_google': True} if ROUTAGE_OSM_FICHIER else {},
+}
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
@@ -78,15 +110,117 @@ CORS_ALLOWED_ORIGINS = [
 # Channels configuration
 ASGI_APPLICATION = 'clappy.asgi.application'
 
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',  #  Pour le développement
-        # 'BACKEND': 'channels_redis.core.RedisChannelLayer',  # Pour la production
-        # 'CONFIG': {
-        #     "hosts": [('127.0.0.1', 6379)],
-        # },
-    },
+# Couche partagée dès que REDIS_URL est défini (obligatoire avec plusieurs workers ASGI:
+# la couche en mémoire ne relie que les sockets d'un même processus).
+# CHANNELS_BACKEND: 'memoire', 'redis' (listes + scripts Lua, messages conservés jusqu'à
+# expiration), 'redis_pubsub' (PUBLISH/SUBSCRIBE, plus léger, sans rétention) ou
+# 'postgres' (LISTEN/NOTIFY sur la base de l'application, sans Redis; nécessite asyncpg)
+REDIS_URL = os.getenv('REDIS_URL')
+CHANNELS_BACKEND = os.getenv('CHANNELS_BACKEND', 'redis' if REDIS_URL else 'memoire')
+CHANNELS_BACKENDS = {
+    'memoire': 'channels.layers.InMemoryChannelLayer',
+    'redis': 'channels_redis.core.RedisChannelLayer',
+    'redis_pubsub': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+    'postgres': 'gestionclappy.couche_postgres.PostgresChannelLayer',
+}
+
+if CHANNELS_BACKEND == 'memoire':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': CHANNELS_BACKENDS['memoire'],  #  Pour le développement
+        },
+    }
+elif CHANNELS_BACKEND == 'postgres':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': CHANNELS_BACKENDS['postgres'],
+            'CONFIG': {
+                "alias": 'default',
+                "prefix": os.getenv('CHANNELS_PREFIXE', 'clappy'),
+                "capacity": int(os.getenv('CHANNELS_CAPACITE', 1000)),
+                "expiry": int(os.getenv('CHANNELS_EXPIRATION_SECONDES', 60)),
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': CHANNELS_BACKENDS[CHANNELS_BACKEND],
+            'CONFIG': {
+                "hosts": [REDIS_URL or 'redis://127.0.0.1:6379/0'],
+                "prefix": os.getenv('CHANNELS_PREFIXE', 'clappy'),
+            },
+        },
+    }
+    if CHANNELS_BACKEND == 'redis':
+        CHANNEL_LAYERS['default']['CONFIG'].update({
+            "capacity": int(os.getenv('CHANNELS_CAPACITE', 1000)),
+            "expiry": int(os.getenv('CHANNELS_EXPIRATION_SECONDES', 60)),
+        })
+
+# Délai maximal de l'aller-retour du contrôle de santé de la couche channels
+CHANNELS_SANTE_TIMEOUT_SECONDES = 2
+
+# Compression permessage-deflate des WebSockets (commande serveur_asgi): réduit la
+# bande passante mobile, mais chaque socket garde son propre contexte zlib et
+# recompresse chaque trame (la trame n'est encodée qu'une fois, pas compressée une fois)
+WEBSOCKET_PERMESSAGE_DEFLATE = os.getenv('WEBSOCKET_PERMESSAGE_DEFLATE', '0') in ('1', 'true', 'True')
+
+# Dispatch des courses: K chauffeurs les plus proches, rayon élargi par vagues
+# (vagues suivantes programmées dans la file NotificationSortante)
+DISPATCH_RAYONS_KM = [2, 5, 10]
+DISPATCH_NOMBRE_CHAUFFEURS = 5
+DISPATCH_DELAI_VAGUE_SECONDES = 30
+DISPATCH_FRAICHEUR_POSITION_MINUTES = 10
+DISPATCH_DIFFUSION_SI_AUCUN = True  # Repli sur la diffusion générale si personne à proximité
+# Groupes WebSocket par zone (type de véhicule + cellule): une diffusion ne vise que
+# les cellules à moins de DISPATCH_RAYON_DIFFUSION_KM du départ
+DISPATCH_TAILLE_CELLULE_GROUPES_DEG = 0.05  # ~5,5 km
+DISPATCH_RAYON_DIFFUSION_KM = 10
+
+# Synchronisation par delta des courses (/api/courses/modifications/?depuis=<jeton>)
+SYNC_MARGE_SECONDES = 2  # Retard accepté pour couvrir les transactions lentes et les écarts d'horloge
+SYNC_TAILLE_MAX = 500  # Courses par réponse, le reste au prochain appel (complet: false)
+
+# Listes de courses par values() + dicts (serializers.CourseLecture), sortie identique à CourseSerializer
+COURSES_LECTURE_RAPIDE = True
+
+# Exports en flux (?sortie=json sur l'historique des courses): lignes lues et encodées par lots
+FLUX_TAILLE_LOT = 2000
+
+# Index des positions en direct (grille en degrés, ~1,1 km par cellule)
+# Pour partager l'index entre workers: 'gestionclappy.positions.BackendCache' + un cache Redis
+POSITIONS_BACKEND = {
+    'BACKEND': 'gestionclappy.positions.BackendMemoire',
+    'OPTIONS': {},
 }
+POSITIONS_TAILLE_CELLULE_DEG = 0.01
+POSITIONS_FRAICHEUR_MINUTES = 30
+POSITIONS_RAYON_MAX_KM = 50
+# Estimation des temps d'approche (geo.eta_minutes): vitesse moyenne en ville et
+# rapport distance routière / distance à vol d'oiseau
+ETA_VITESSE_MOYENNE_KMH = 25
+ETA_FACTEUR_DETOUR = 1.3
+# Ingestion GPS par lots: points en tampon écrits en base toutes les N secondes ou dès TAILLE_MAX points;
+# base indisponible: les points restent en attente, les plus anciens abandonnés au-delà de ATTENTE_MAX
+POSITIONS_TAMPON_SECONDES = 2
+POSITIONS_TAMPON_TAILLE_MAX = 500
+POSITIONS_TAMPON_ATTENTE_MAX = 50000
+# Partitions de HistoriquePosition (commande partitions_positions, à planifier chaque jour)
+POSITIONS_PARTITION_GRANULARITE = 'jour'  # 'jour' ou 'semaine'
+POSITIONS_RETENTION_JOURS = 30
+POSITIONS_TRACE_RESUME_MINUTES = 5
+# Majoration dynamique: multiplicateur = 1 + SENSIBILITE x (demandes / chauffeurs - SEUIL),
+# borné à [1, MAX], par cellule de grille et type de véhicule
+# Resynchronisation depuis la base toutes les RESYNCHRONISATION_SECONDES, en fond (la première au premier devis)
+MAJORATION_ACTIVE = True
+MAJORATION_TAILLE_CELLULE_DEG = 0.02
+MAJORATION_FENETRE_MINUTES = 15
+MAJORATION_SEUIL = 1.0
+MAJORATION_SENSIBILITE = 0.5
+MAJORATION_MAX = 2.0
+MAJORATION_RESYNCHRONISATION_SECONDES = 300
+
 # settings.py
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -7,14 +7,14 @@ from .models import *
 @admin.register(Client)
 class ClientAdmin(admin.ModelAdmin):
     list_display = ['utilisateur', 'telephone', 'date_creation']
-    search_fields = ['utilisateur__username', 'utilisateur__first_name', 'utilisateur__last_name', 'telephone']
+    search_fields = ['utilisateur__username', 'utilisateur__first_name', 'utilisateur__last_name', 'telephone', 'telephone_e164']
     list_filter = ['date_creation']
 
 @admin.register(Chauffeur)
 class ChauffeurAdmin(admin.ModelAdmin):
     list_display = ['utilisateur', 'numero_permis', 'statut', 'est_approuve', 'note_moyenne']
     list_filter = ['statut', 'est_approuve', 'date_creation']
-    search_fields = ['utilisateur__username', 'numero_permis', 'telephone']
+    search_fields = ['utilisateur__username', 'numero_permis', 'telephone', 'telephone_e164']
     actions = ['approuver_chauffeurs']
 
     def approuver_chauffeurs(self, request, queryset):
@@ -47,11 +47,38 @@ class EvaluationAdmin(admin.ModelAdmin):
 
 @admin.register(Tarif)
 class TarifAdmin(admin.ModelAdmin):
-    list_display = ['type_vehicule', 'prix_base', 'prix_par_km', 'est_actif']
+    list_display = ['type_vehicule', 'prix_base', 'prix_par_km', 'prix_par_minute', 'tarif_minimum', 'est_actif']
     list_filter = ['type_vehicule', 'est_actif']
 
 @admin.register(CustomUser)
 class CustomUserAdmin(admin.ModelAdmin):
     list_display = ['username', 'email', 'first_name', 'last_name', 'telephone', 'is_staff', 'is_active']
-    search_fields = ['username', 'email', 'first_name', 'last_name', 'telephone']
-    list_filter = ['is_staff', 'is_active', 'is_client', 'is_chauffeur']
\ No newline at end of file
+    search_fields = ['username', 'email', 'first_name', 'last_name', 'telephone', 'telephone_e164']
+    list_filter = ['is_staff', 'is_active', 'is_client', 'is_chauffeur']
+
+@admin.register(CacheGeographique)
+class CacheGeographiqueAdmin(admin.ModelAdmin):
+    list_display = ['cle', 'type_requete', 'nombre_hits', 'date_creation', 'date_expiration']
+    list_filter = ['type_requete']
+    search_fields = ['cle']
+@admin.register(NotificationSortante)
+class NotificationSortanteAdmin(admin.ModelAdmin):
+    list_display = ['id', 'type_notification', 'destinataire', 'course', 'statut', 'tentatives', 'prochaine_tentative', 'date_creation']
+    list_filter = ['statut', 'type_notification']
+    search_fields = ['destinataire', 'course__id']
+    readonly_fields = ['date_creation', 'date_envoi']
+    actions = ['remettre_en_file']
+
+    @admin.action(description="Remettre en file les notifications sélectionnées")
+    def remettre_en_file(self, request, queryset):
+        from .notifications import remettre_en_file
+        nombre = remettre_en_file(queryset)
+        self.message_user(request, f"{nombre} notification(s) remise(s) en file")
+
+    def changelist_view(self, request, extra_context=None):
+        # Volume de la file par statut, affiché en tête de liste
+        from django.db.models import Count
+        compteurs = dict(NotificationSortante.objects.values_list('statut').annotate(Count('id')))
+        resume = ", ".join(f"{libelle}: {compteurs.get(code, 0)}" for code, libelle in NotificationSortante.STATUT_CHOIX)
+        extra_context = {**(extra_context or {}), 'title': f"Notifications sortantes ({resume})"}
+        return super().changelist_view(request, extra_context=extra_context)
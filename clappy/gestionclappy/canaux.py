@@ -0,0 +1,79 @@
+# canaux.py
+"""
+Outils autour de la couche channels (CHANNEL_LAYERS).
+
+Avec plusieurs workers ASGI, les groupes chauffeurs_<type> ne fonctionnent que
+si la couche est partagée (Redis): verifier_couche() fait un aller-retour
+complet send -> receive pour le contrôle de santé.
+"""
+import asyncio
+import json
+import logging
+import time
+
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+
+from .reglages import parametre
+
+logger = logging.getLogger(__name__)
+
+
+def evenement_trame(trame):
+    """
+    Événement channels portant une trame WebSocket déjà sérialisée: le JSON est
+    produit une fois à l'envoi et chaque consommateur le relaie tel quel
+    (handler relayer_trame), au lieu d'un json.dumps par socket.
+    """
+    return {'type': 'relayer_trame', 'texte': json.dumps(trame)}
+
+
+def nom_backend(channel_layer=None):
+    channel_layer = channel_layer or get_channel_layer()
+    if channel_layer is None:
+        return None
+    return f"{type(channel_layer).__module__}.{type(channel_layer).__name__}"
+
+
+def couche_partagee(channel_layer=None):
+    """False pour la couche en mémoire, propre à chaque processus"""
+    channel_layer = channel_layer or get_channel_layer()
+    return channel_layer is not None and not isinstance(channel_layer, InMemoryChannelLayer)
+
+
+async def verifier_couche(timeout=None):
+    """
+    Envoyer un message à un canal neuf et le relire.
+    Retourne {'ok', 'backend', 'partagee', 'latence_ms', 'erreur'}.
+    """
+    timeout = timeout or parametre('CHANNELS_SANTE_TIMEOUT_SECONDES', 2)
+    channel_layer = get_channel_layer()
+    resultat = {
+        'ok': False,
+        'backend': nom_backend(channel_layer),
+        'partagee': couche_partagee(channel_layer),
+        'latence_ms': None,
+        'erreur': None,
+    }
+    if channel_layer is None:
+        resultat['erreur'] = "Channel layer non configuré"
+        return resultat
+
+    debut = time.perf_counter()
+    try:
+        canal = await asyncio.wait_for(channel_layer.new_channel('sante.'), timeout)
+        await asyncio.wait_for(channel_layer.send(canal, {'type': 'sante', 'envoi': debut}), timeout)
+        message = await asyncio.wait_for(channel_layer.receive(canal), timeout)
+    except asyncio.TimeoutError:
+        resultat['erreur'] = f"Pas de réponse en {timeout} s"
+        return resultat
+    except Exception as e:
+        logger.error(f"Contrôle de santé channels en échec: {e}")
+        resultat['erreur'] = f"{type(e).__name__}: {e}"
+        return resultat
+
+    if message.get('envoi') != debut:
+        resultat['erreur'] = "Message reçu différent du message envoyé"
+        return resultat
+    resultat['ok'] = True
+    resultat['latence_ms'] = round((time.perf_counter() - debut) * 1000, 2)
+    return resultat
@@ -2,6 +2,7 @@ from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 import json
 from .models import Chauffeur
+from .views import ChauffeurConsumer  # noqa: F401 (référencé par routing.py)
 
 class NotificationConsumer(AsyncWebsocketConsumer):
     async def connect(self):
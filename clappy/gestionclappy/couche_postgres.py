@@ -0,0 +1,341 @@
+# couche_postgres.py
+"""
+Couche channels sur PostgreSQL LISTEN/NOTIFY, pour partager les groupes des
+consommateurs (chauffeurs_<type>, chauffeur_<id>) entre workers ASGI sans Redis.
+
+Chaque worker (et chaque boucle asyncio du processus) ouvre une connexion
+asyncpg dédiée à l'écoute et un petit pool pour les envois:
+- un canal spécifique "specific.<worker>!<id>" est joint par un NOTIFY sur le
+  canal PostgreSQL du worker qui l'a créé;
+- un groupe correspond à un canal PostgreSQL écouté par les seuls workers qui
+  ont un membre dans ce groupe: group_send = un NOTIFY, chaque worker répartit
+  ensuite le message entre ses propres sockets.
+
+NOTIFY limite la charge utile à 8000 octets: au-delà, le message est écrit dans
+MessageCanal et la notification ne transporte que son id.
+
+    CHANNEL_LAYERS = {'default': {
+        'BACKEND': 'gestionclappy.couche_postgres.PostgresChannelLayer',
+        'CONFIG': {'alias': 'default', 'prefix': 'clappy'},
+    }}
+"""
+import asyncio
+import base64
+import hashlib
+import logging
+import time
+import uuid
+
+import msgpack
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+try:
+    import asyncpg
+except ImportError:  # dépendance optionnelle, seulement pour ce backend
+    asyncpg = None
+
+logger = logging.getLogger(__name__)
+
+TABLE_DEBORDEMENT = 'gestionclappy_messagecanal'
+
+
+class PostgresChannelLayer(BaseChannelLayer):
+    """Point d'entrée configuré par CHANNEL_LAYERS; l'état vit dans une _CoucheBoucle par boucle asyncio"""
+
+    extensions = ['groups', 'flush']
+
+    def __init__(self, alias='default', dsn=None, prefix='canaux', expiry=60, capacity=100,
+                 channel_capacity=None, taille_max_notify=7900, taille_pool=4, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        if asyncpg is None:
+            raise ImportError("La couche channels PostgreSQL nécessite asyncpg (pip install asyncpg)")
+        self.alias = alias
+        self.dsn = dsn
+        self.prefix = prefix
+        self.taille_max_notify = taille_max_notify
+        self.taille_pool = taille_pool
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self._boucles = {}
+
+    def parametres_connexion(self):
+        if self.dsn:
+            return {'dsn': self.dsn}
+        from django.conf import settings
+
+        base = settings.DATABASES[self.alias]
+        return {
+            'host': base.get('HOST') or None,
+            'port': int(base['PORT']) if base.get('PORT') else None,
+            'user': base.get('USER') or None,
+            'password': base.get('PASSWORD') or None,
+            'database': base.get('NAME') or None,
+        }
+
+    def _couche(self):
+        boucle = asyncio.get_running_loop()
+        for fermee in [b for b in self._boucles if b.is_closed()]:
+            del self._boucles[fermee]
+        couche = self._boucles.get(boucle)
+        if couche is None:
+            couche = self._boucles[boucle] = _CoucheBoucle(self)
+        return couche
+
+    # ---------- API channels ----------
+
+    async def new_channel(self, prefix='specific.'):
+        return await self._couche().new_channel(prefix)
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        await self._couche().send(channel, message)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        return await self._couche().receive(channel)
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._couche().group_add(group, channel)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._couche().group_discard(group, channel)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_group_name(group)
+        await self._couche().group_send(group, message)
+
+    async def flush(self):
+        await self._couche().fermer()
+
+    async def close(self):
+        await self._couche().fermer()
+
+    # ---------- Encodage ----------
+
+    @staticmethod
+    def encoder(message):
+        return msgpack.packb(message, use_bin_type=True)
+
+    @staticmethod
+    def decoder(donnees):
+        return msgpack.unpackb(donnees, raw=False)
+
+    def canal_pg(self, type_canal, nom):
+        """Identifiant PostgreSQL (63 octets max): préfixe + empreinte du nom"""
+        return f"{self.prefix}_{type_canal}_{hashlib.sha1(nom.encode()).hexdigest()[:24]}"
+
+
+class _CoucheBoucle:
+    """Connexions et abonnements d'un worker pour une boucle asyncio"""
+
+    def __init__(self, couche):
+        self.couche = couche
+        self.worker = uuid.uuid4().hex[:16]
+        self.canal_worker = f"{couche.prefix}_w_{self.worker}"
+        self.canaux = {}  # nom du canal -> asyncio.Queue d'octets msgpack
+        self.groupes = {}  # groupe -> {canaux locaux}
+        self.ecoutes = {}  # canal PostgreSQL -> ('worker' | 'groupe' | 'canal', nom)
+        self._ecoute = None
+        self._pool = None
+        self._verrou = asyncio.Lock()
+        self._entrants = asyncio.Queue()
+        self._distributeur = None
+        self._dernier_nettoyage = 0.0
+
+    # ---------- Connexions ----------
+
+    async def _connecter(self):
+        async with self._verrou:
+            if self._ecoute is not None and not self._ecoute.is_closed():
+                return
+            parametres = self.couche.parametres_connexion()
+            if self._pool is None:
+                self._pool = await asyncpg.create_pool(min_size=1, max_size=self.couche.taille_pool, **parametres)
+            self._ecoute = await asyncpg.connect(**parametres)
+            self._ecoute.add_termination_listener(self._connexion_perdue)
+            # Après une reconnexion, réécouter tout ce qui l'était
+            self.ecoutes.setdefault(self.canal_worker, ('worker', self.worker))
+            for canal_pg in list(self.ecoutes):
+                await self._ecoute.add_listener(canal_pg, self._notification)
+            if self._distributeur is None or self._distributeur.done():
+                self._distributeur = asyncio.create_task(self._distribuer())
+
+    def _connexion_perdue(self, connexion):
+        if self._ecoute is not connexion:
+            return
+        logger.warning("Connexion d'écoute PostgreSQL perdue, reconnexion")
+        self._ecoute = None
+        asyncio.get_running_loop().create_task(self._reconnecter())
+
+    async def _reconnecter(self):
+        delai = 0.5
+        while self._ecoute is None:
+            try:
+                await self._connecter()
+            except Exception as e:
+                logger.error(f"Reconnexion PostgreSQL impossible: {e}")
+                await asyncio.sleep(delai)
+                delai = min(delai * 2, 30)
+
+    async def _ecouter(self, canal_pg, nature, nom):
+        await self._connecter()
+        if canal_pg not in self.ecoutes:
+            self.ecoutes[canal_pg] = (nature, nom)
+            await self._ecoute.add_listener(canal_pg, self._notification)
+
+    async def _ne_plus_ecouter(self, canal_pg):
+        if self.ecoutes.pop(canal_pg, None) is not None and self._ecoute is not None and not self._ecoute.is_closed():
+            await self._ecoute.remove_listener(canal_pg, self._notification)
+
+    async def fermer(self):
+        if self._distributeur is not None:
+            self._distributeur.cancel()
+            self._distributeur = None
+        if self._ecoute is not None:
+            ecoute, self._ecoute = self._ecoute, None
+            await ecoute.close()
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await pool.close()
+        self.canaux.clear()
+        self.groupes.clear()
+        self.ecoutes.clear()
+
+    # ---------- Envoi ----------
+
+    async def _notifier(self, canal_pg, entete, message):
+        donnees = self.couche.encoder(message)
+        charge = entete + base64.b64encode(donnees).decode()
+        await self._connecter()
+        async with self._pool.acquire() as connexion:
+            if len(charge) > self.couche.taille_max_notify:
+                # Trop grand pour NOTIFY: contenu en table, seul l'id circule
+                identifiant = await connexion.fetchval(
+                    f"INSERT INTO {TABLE_DEBORDEMENT} (contenu, expire_le) "
+                    f"VALUES ($1, now() + make_interval(secs => $2)) RETURNING id",
+                    donnees, float(self.couche.expiry),
+                )
+                charge = f"{entete}@{identifiant}"
+                await self._nettoyer(connexion)
+            await connexion.execute("SELECT pg_notify($1, $2)", canal_pg, charge)
+
+    async def _nettoyer(self, connexion):
+        maintenant = time.monotonic()
+        if maintenant - self._dernier_nettoyage > self.couche.expiry:
+            self._dernier_nettoyage = maintenant
+            await connexion.execute(f"DELETE FROM {TABLE_DEBORDEMENT} WHERE expire_le < now()")
+
+    async def new_channel(self, prefix):
+        await self._connecter()
+        canal = f"{prefix}{self.worker}!{uuid.uuid4().hex}"
+        self.canaux[canal] = asyncio.Queue()
+        return canal
+
+    async def send(self, channel, message):
+        if '!' in channel:
+            worker = channel.split('!', 1)[0].rsplit('.', 1)[-1]
+            if worker == self.worker:
+                # Canal de ce worker: pas d'aller-retour par la base
+                if not self._deposer(channel, self.couche.encoder(message)):
+                    raise ChannelFull(channel)
+                return
+            await self._notifier(f"{self.couche.prefix}_w_{worker}", f"{channel}|", message)
+        else:
+            await self._notifier(self.couche.canal_pg('c', channel), '', message)
+
+    async def group_send(self, group, message):
+        await self._notifier(self.couche.canal_pg('g', group), '', message)
+
+    # ---------- Réception ----------
+
+    async def receive(self, channel):
+        if channel not in self.canaux:
+            self.canaux[channel] = asyncio.Queue()
+            if '!' not in channel:
+                await self._ecouter(self.couche.canal_pg('c', channel), 'canal', channel)
+        file = self.canaux[channel]
+        try:
+            donnees = await file.get()
+        except (asyncio.CancelledError, GeneratorExit):
+            # Consommateur arrêté: libérer son canal et ses groupes
+            self.canaux.pop(channel, None)
+            for group in [g for g, membres in self.groupes.items() if channel in membres]:
+                await self.group_discard(group, channel)
+            if '!' not in channel:
+                await self._ne_plus_ecouter(self.couche.canal_pg('c', channel))
+            raise
+        return self.couche.decoder(donnees)
+
+    async def group_add(self, group, channel):
+        self.groupes.setdefault(group, set()).add(channel)
+        await self._ecouter(self.couche.canal_pg('g', group), 'groupe', group)
+
+    async def group_discard(self, group, channel):
+        membres = self.groupes.get(group)
+        if membres is None:
+            return
+        membres.discard(channel)
+        if not membres:
+            del self.groupes[group]
+            await self._ne_plus_ecouter(self.couche.canal_pg('g', group))
+
+    def _notification(self, connexion, pid, canal_pg, charge):
+        # Appelé par asyncpg: traitement en série pour garder l'ordre des messages
+        self._entrants.put_nowait((canal_pg, charge))
+
+    async def _distribuer(self):
+        while True:
+            canal_pg, charge = await self._entrants.get()
+            try:
+                await self._traiter(canal_pg, charge)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Notification channels illisible sur {canal_pg}: {e}", exc_info=True)
+
+    async def _traiter(self, canal_pg, charge):
+        ecoute = self.ecoutes.get(canal_pg)
+        if ecoute is None:
+            return
+        nature, nom = ecoute
+        if nature == 'worker':
+            cible, charge = charge.split('|', 1)
+            destinataires = [cible]
+        elif nature == 'groupe':
+            destinataires = list(self.groupes.get(nom, ()))
+        else:
+            destinataires = [nom]
+        if not destinataires:
+            return
+
+        if charge.startswith('@'):
+            async with self._pool.acquire() as connexion:
+                donnees = await connexion.fetchval(
+                    f"SELECT contenu FROM {TABLE_DEBORDEMENT} WHERE id = $1", int(charge[1:])
+                )
+            if donnees is None:
+                logger.warning(f"Message débordé {charge} expiré avant lecture")
+                return
+            donnees = bytes(donnees)
+        else:
+            donnees = base64.b64decode(charge)
+
+        for canal in destinataires:
+            self._deposer(canal, donnees)
+
+    def _deposer(self, canal, donnees):
+        file = self.canaux.get(canal)
+        if file is None:
+            return True
+        if file.qsize() >= self.couche.get_capacity(canal):
+            # Socket trop lent: on perd le message plutôt que la mémoire du worker
+            logger.warning(f"Canal {canal} plein, message ignoré")
+            return False
+        file.put_nowait(donnees)
+        return True
@@ -0,0 +1,139 @@
+# courses.py
+"""
+Transitions du cycle de vie d'une course.
+
+L'acceptation est un UPDATE conditionnel unique (statut='demandee' et pas de
+chauffeur): c'est la base qui arbitre entre chauffeurs concurrents. Le premier
+UPDATE verrouille la ligne, les suivants attendent puis réévaluent la condition
+et ne modifient rien: un seul gagnant, sans lecture préalable ni save() de
+toute la ligne.
+
+Les variantes préfixées par « a » (ademarrer_course...) servent aux vues async.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .majoration import moteur_majoration
+from .models import Chauffeur, Course, Paiement, Vehicule
+
+logger = logging.getLogger(__name__)
+
+ACCEPTEE = 'acceptee'
+DEJA_PRISE = 'deja_prise'
+COURSE_INTROUVABLE = 'course_introuvable'
+CHAUFFEUR_INTROUVABLE = 'chauffeur_introuvable'
+DEMARREE = 'demarree'
+NON_ACCEPTEE = 'non_acceptee'
+TERMINEE = 'terminee'
+NON_TERMINABLE = 'non_terminable'
+
+
+def courses_visibles(utilisateur, courses=None):
+    """
+    Courses qu'un utilisateur peut manipuler: un chauffeur ne voit que les
+    courses libres de son type de véhicule et celles qu'il a acceptées.
+    """
+    courses = Course.objects.all() if courses is None else courses
+    if not hasattr(utilisateur, 'chauffeur'):
+        return courses
+    chauffeur = utilisateur.chauffeur
+    type_vehicule = Vehicule.objects.filter(chauffeur=chauffeur).values_list('type_vehicule', flat=True).first()
+    if type_vehicule is None:
+        return Course.objects.none()
+    return courses.filter(type_vehicule_demande=type_vehicule).filter(
+        Q(statut='demandee', chauffeur__isnull=True) | Q(chauffeur=chauffeur)
+    )
+
+
+def _majoration_apres_acceptation(course_id, chauffeur_id):
+    # update() ne déclenche pas post_save: on prévient le moteur comme le feraient les signaux
+    moteur_majoration.course_fermee(course_id)
+    moteur_majoration.chauffeur_indisponible(chauffeur_id)
+
+
+def accepter_course(course_id, chauffeur_id, courses=None):
+    """
+    Attribuer la course au chauffeur si elle est encore libre.
+    `courses` restreint les courses visibles (queryset de la vue), Course.objects par défaut.
+    Retourne ACCEPTEE, DEJA_PRISE, COURSE_INTROUVABLE ou CHAUFFEUR_INTROUVABLE.
+    """
+    courses = Course.objects.all() if courses is None else courses
+    with transaction.atomic():
+        maintenant = timezone.now()
+        gagne = courses.filter(pk=course_id, statut='demandee', chauffeur__isnull=True).update(
+            chauffeur_id=chauffeur_id,
+            statut='acceptee',
+            date_acceptation=maintenant,
+            date_modification=maintenant,
+        )
+        if not gagne:
+            etat = Course.objects.filter(pk=course_id).values_list('statut', 'chauffeur_id').first()
+            if etat is None or etat == ('demandee', None):
+                return COURSE_INTROUVABLE
+            return DEJA_PRISE
+
+        if not Chauffeur.objects.filter(pk=chauffeur_id).update(statut='en_course'):
+            # La clé étrangère n'est vérifiée qu'au commit: on annule l'attribution
+            transaction.set_rollback(True)
+            return CHAUFFEUR_INTROUVABLE
+
+        transaction.on_commit(lambda: _majoration_apres_acceptation(course_id, chauffeur_id))
+    logger.info(f"Course {course_id} acceptée par le chauffeur {chauffeur_id}")
+    return ACCEPTEE
+
+
+def demarrer_course(course_id, courses=None):
+    """Passer une course acceptée 'en_cours'; retourne DEMARREE, NON_ACCEPTEE ou COURSE_INTROUVABLE"""
+    courses = Course.objects.all() if courses is None else courses
+    maintenant = timezone.now()
+    if courses.filter(pk=course_id, statut='acceptee').update(
+        statut='en_cours', date_debut=maintenant, date_modification=maintenant
+    ):
+        return DEMARREE
+    return NON_ACCEPTEE if courses.filter(pk=course_id).exists() else COURSE_INTROUVABLE
+
+
+async def ademarrer_course(course_id, courses=None):
+    courses = Course.objects.all() if courses is None else courses
+    maintenant = timezone.now()
+    if await courses.filter(pk=course_id, statut='acceptee').aupdate(
+        statut='en_cours', date_debut=maintenant, date_modification=maintenant
+    ):
+        return DEMARREE
+    return NON_ACCEPTEE if await courses.filter(pk=course_id).aexists() else COURSE_INTROUVABLE
+
+
+def terminer_course(course_id, tarif_final=None, courses=None):
+    """
+    Terminer une course acceptée ou en cours, libérer le chauffeur et créer le
+    paiement en attente. Retourne TERMINEE, NON_TERMINABLE (déjà terminée,
+    annulée ou pas encore acceptée) ou COURSE_INTROUVABLE.
+    """
+    courses = Course.objects.all() if courses is None else courses
+    with transaction.atomic():
+        # Le verrou sérialise deux terminaisons concurrentes: la seconde relit le statut 'terminee'
+        course = courses.select_for_update(of=('self',)).filter(
+            pk=course_id, statut__in=('acceptee', 'en_cours')
+        ).first()
+        if course is None:
+            return NON_TERMINABLE if courses.filter(pk=course_id).exists() else COURSE_INTROUVABLE
+        course.statut = 'terminee'
+        course.date_fin = timezone.now()
+        course.tarif_final = course.tarif_estime if tarif_final is None else tarif_final
+        course.save(update_fields=['statut', 'date_fin', 'tarif_final', 'date_modification'])
+
+        # save() plutôt que update(): les signaux tiennent la majoration à jour
+        chauffeur = Chauffeur.objects.filter(pk=course.chauffeur_id).first()
+        if chauffeur is not None:
+            chauffeur.statut = 'disponible'
+            chauffeur.save(update_fields=['statut', 'date_modification'])
+
+        Paiement.objects.create(
+            course=course,
+            montant=course.tarif_final,
+            statut_paiement='en_attente'
+        )
+    return TERMINEE
@@ -0,0 +1,212 @@
+# dispatch.py
+import math
+
+from .canaux import evenement_trame
+from .geo import eta_minutes, haversine_km
+from .models import Chauffeur, Course
+from .positions import cellule_de, get_index
+from .reglages import parametre
+
+
+def groupe_chauffeur(chauffeur_id):
+    """Nom du groupe WebSocket personnel d'un chauffeur"""
+    return f"chauffeur_{chauffeur_id}"
+
+
+def groupe_type(type_vehicule):
+    """Groupe de tous les chauffeurs d'un type (courses sans point de départ)"""
+    return f"chauffeurs_{type_vehicule}"
+
+
+def groupe_sans_position(type_vehicule):
+    """Groupe des chauffeurs d'un type dont la position n'est pas connue"""
+    return f"chauffeurs_{type_vehicule}_sans_position"
+
+
+def cellule_groupe(lat, lon):
+    return cellule_de(float(lat), float(lon), parametre('DISPATCH_TAILLE_CELLULE_GROUPES_DEG', 0.05))
+
+
+def groupe_zone(type_vehicule, lat, lon):
+    """Groupe WebSocket des chauffeurs d'un type situés dans la cellule du point"""
+    ligne, colonne = cellule_groupe(lat, lon)
+    return f"chauffeurs_{type_vehicule}_{ligne}_{colonne}"
+
+
+def groupes_autour(type_vehicule, lat, lon, rayon_km=None):
+    """
+    Groupes à alerter pour un point de départ: les cellules qui recoupent le
+    disque de `rayon_km` autour du point, plus le groupe des chauffeurs non localisés.
+    Sans point de départ, tous les chauffeurs du type.
+    """
+    if lat is None or lon is None:
+        return [groupe_type(type_vehicule)]
+    lat, lon = float(lat), float(lon)
+    rayon_km = rayon_km or parametre('DISPATCH_RAYON_DIFFUSION_KM', max(parametre('DISPATCH_RAYONS_KM', [2, 5, 10])))
+    taille = parametre('DISPATCH_TAILLE_CELLULE_GROUPES_DEG', 0.05)
+
+    delta_lat = rayon_km / 111.32
+    delta_lon = rayon_km / (111.32 * max(math.cos(math.radians(lat)), 0.01))
+    ligne_min, colonne_min = cellule_de(lat - delta_lat, lon - delta_lon, taille)
+    ligne_max, colonne_max = cellule_de(lat + delta_lat, lon + delta_lon, taille)
+
+    groupes = []
+    for ligne in range(ligne_min, ligne_max + 1):
+        for colonne in range(colonne_min, colonne_max + 1):
+            # Point de la cellule le plus proche du départ
+            lat_proche = min(max(lat, ligne * taille), (ligne + 1) * taille)
+            lon_proche = min(max(lon, colonne * taille), (colonne + 1) * taille)
+            if haversine_km(lat, lon, lat_proche, lon_proche) <= rayon_km:
+                groupes.append(f"chauffeurs_{type_vehicule}_{ligne}_{colonne}")
+    groupes.append(groupe_sans_position(type_vehicule))
+    return groupes
+
+
+def chauffeurs_proches(course, rayon_km, nombre, exclure=()):
+    """
+    Retourne les `nombre` chauffeurs disponibles les plus proches du point de départ
+    de la course, dans un rayon de `rayon_km`, sous forme de liste (chauffeur_id, distance_km)
+    triée par distance croissante.
+    """
+    fraicheur = parametre('DISPATCH_FRAICHEUR_POSITION_MINUTES', 10)
+
+    # Chauffeurs éligibles (statut/type); les positions viennent de l'index en direct
+    disponibles = set(
+        Chauffeur.objects.filter(
+            statut='disponible',
+            vehicule__type_vehicule=course.type_vehicule_demande
+        ).values_list('id', flat=True)
+    )
+    disponibles.difference_update(exclure)
+    if not disponibles:
+        return []
+
+    return get_index().plus_proches(
+        course.latitude_depart, course.longitude_depart, nombre,
+        rayon_max_km=rayon_km,
+        filtre=disponibles,
+        fraicheur=fraicheur * 60
+    )
+
+
+def trame_alerte_course(course, distance_km=None, eta=None):
+    """Trame WebSocket 'new_course' telle que reçue par l'application chauffeur"""
+    return {
+        "type": "new_course",
+        "message": "Nouvelle course disponible!",
+        "course_id": course.id,
+        "depart": course.adresse_depart,
+        "destination": course.adresse_destination,
+        "tarif_estime": str(course.tarif_estime),
+        "type_vehicule": course.type_vehicule_demande,
+        "distance_km": distance_km,
+        "eta_minutes": eta
+    }
+
+
+def trame_course_confirmee(course, chauffeur):
+    """Trame WebSocket 'course_confirmed' envoyée aux chauffeurs qui ont reçu l'alerte"""
+    return {
+        "type": "course_confirmed",
+        "message": "Cette course a été confirmée par un autre chauffeur",
+        "course_id": course.id,
+        "chauffeur_name": str(chauffeur)
+    }
+
+
+class DispatchService:
+    """
+    Envoie une nouvelle course aux K chauffeurs disponibles les plus proches,
+    puis élargit le rayon par vagues successives tant que personne n'accepte.
+    """
+
+    @staticmethod
+    def lancer(course_id):
+        """Démarrer le dispatch d'une course (première vague)"""
+        try:
+            course = Course.objects.get(id=course_id)
+        except Course.DoesNotExist:
+            print(f"❌ Course {course_id} non trouvée pour dispatch")
+            return False
+
+        if course.latitude_depart is None or course.longitude_depart is None:
+            # Sans point de départ, impossible de cibler: on diffuse au type de véhicule
+            print(f"⚠ Course {course_id} sans coordonnées de départ, diffusion à tous les chauffeurs")
+            DispatchService.diffuser(course)
+            return True
+
+        DispatchService._vague(course_id, 0, set())
+        return True
+
+    @staticmethod
+    def _vague(course_id, index, deja_notifies):
+        """
+        Exécuter la vague `index` et programmer la suivante dans la file d'envoi
+        (NotificationSortante de type 'dispatch'), traitée par traiter_lot().
+        """
+        from .notifications import ajouter_vague
+
+        rayons = parametre('DISPATCH_RAYONS_KM', [2, 5, 10])
+        nombre = parametre('DISPATCH_NOMBRE_CHAUFFEURS', 5)
+        delai = parametre('DISPATCH_DELAI_VAGUE_SECONDES', 30)
+
+        course = Course.objects.filter(id=course_id).first()
+        if course is None or course.statut != 'demandee' or course.chauffeur_id is not None:
+            print(f"✅ Dispatch course {course_id} terminé (statut: {course.statut if course else 'supprimée'})")
+            return
+
+        rayon = rayons[min(index, len(rayons) - 1)]
+        candidats = chauffeurs_proches(course, rayon, nombre, exclure=deja_notifies)
+        print(f"🎯 Vague {index + 1}/{len(rayons)} course {course_id}: "
+              f"{len(candidats)} chauffeurs dans {rayon} km")
+
+        if candidats:
+            DispatchService.notifier_chauffeurs(course, candidats)
+            deja_notifies.update(chauffeur_id for chauffeur_id, _ in candidats)
+
+        if index + 1 < len(rayons):
+            ajouter_vague(course, index + 1, deja_notifies, delai)
+        elif not deja_notifies and parametre('DISPATCH_DIFFUSION_SI_AUCUN', True):
+            # Aucun chauffeur localisé à proximité: repli sur la diffusion générale
+            print(f"⚠ Aucun chauffeur proche pour course {course_id}, diffusion générale")
+            DispatchService.diffuser(course)
+
+    @staticmethod
+    def vague_programmee(notification):
+        """Exécuter une vague sortie de la file (payload: vague, deja_notifies)"""
+        DispatchService._vague(
+            notification.course_id, notification.payload['vague'], set(notification.payload['deja_notifies'])
+        )
+
+    @staticmethod
+    def notifier_chauffeurs(course, candidats):
+        """Alerte WebSocket + SMS aux seuls chauffeurs sélectionnés (via la file d'envoi)"""
+        from .notifications import ajouter_websocket
+        from .views import SMSService
+
+        etas = eta_minutes([distance for _, distance in candidats]).tolist()
+        ajouter_websocket(
+            [
+                (
+                    groupe_chauffeur(chauffeur_id),
+                    evenement_trame(trame_alerte_course(course, round(distance, 2), round(eta)))
+                )
+                for (chauffeur_id, distance), eta in zip(candidats, etas)
+            ],
+            course=course
+        )
+
+        SMSService.envoyer_sms_chauffeurs(course.id, chauffeur_ids=[chauffeur_id for chauffeur_id, _ in candidats])
+
+    @staticmethod
+    def diffuser(course):
+        """Diffusion aux chauffeurs du type demandé dans les zones autour du départ"""
+        from .notifications import ajouter_websocket
+        from .views import SMSService
+
+        # Encodée une seule fois pour tous les groupes et tous les chauffeurs
+        evenement = evenement_trame(trame_alerte_course(course))
+        groupes = groupes_autour(course.type_vehicule_demande, course.latitude_depart, course.longitude_depart)
+        ajouter_websocket([(groupe, evenement) for groupe in groupes], course=course)
+
+        SMSService.envoyer_sms_chauffeurs(course.id)
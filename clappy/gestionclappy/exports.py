@@ -0,0 +1,151 @@
+# exports.py
+"""
+Exports CSV et NDJSON des courses, paiements et positions (finance, ops).
+
+Une même définition sert aux actions `exporter` de l'API et à la commande
+`exporter`: colonnes lues avec values_list(), filtres ?du=&au= sur le champ de
+date de l'export, filtres d'égalité (statut...), ordre stable sur un index.
+Les lignes sont lues par lots (flux.lots) et encodées lot par lot.
+
+Montants en texte décimal exact, dates ISO 8601 dans le fuseau courant. En
+CSV, les textes saisis qui commencent par = + - @ sont préfixés d'une
+apostrophe pour qu'un tableur ne les évalue pas comme formules.
+"""
+import csv
+from datetime import datetime
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .flux import encoder_json, filtrer_periode
+from .models import Course, HistoriquePosition, Paiement
+
+SORTIES = ('csv', 'ndjson')
+TYPES_CONTENU = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+_FORMULE = ('=', '+', '-', '@')
+
+
+class _Echo:
+    """Fichier dont write() rend la ligne écrite, pour csv.writer"""
+
+    def write(self, valeur):
+        return valeur
+
+
+def _valeur(valeur):
+    if isinstance(valeur, datetime):
+        return timezone.localtime(valeur).isoformat() if timezone.is_aware(valeur) else valeur.isoformat()
+    if isinstance(valeur, Decimal):
+        return format(valeur, 'f')
+    return valeur
+
+
+def _cellule(valeur):
+    if valeur is None:
+        return ''
+    if isinstance(valeur, str):
+        return "'" + valeur if valeur.startswith(_FORMULE) else valeur
+    return _valeur(valeur)
+
+
+class Export:
+    """
+    `colonnes`: (entête, champ values_list). `filtres`: paramètre de requête ->
+    champ filtré par égalité. `ordre` doit suivre un index pour que le curseur
+    côté serveur renvoie les premières lignes sans trier toute la table.
+    """
+
+    def __init__(self, nom, queryset, colonnes, champ_date, ordre, filtres=None):
+        self.nom = nom
+        self.queryset = queryset
+        self.colonnes = colonnes
+        self.champ_date = champ_date
+        self.ordre = ordre
+        self.filtres = filtres or {}
+
+    @property
+    def entetes(self):
+        return [entete for entete, _ in self.colonnes]
+
+    def lignes(self, du=None, au=None, **filtres):
+        """values_list() filtré et ordonné; ValueError si une date est illisible"""
+        queryset = filtrer_periode(self.queryset, du, au, self.champ_date)
+        egalites = {
+            self.filtres[parametre]: valeur
+            for parametre, valeur in filtres.items() if parametre in self.filtres and valeur not in (None, '')
+        }
+        return queryset.filter(**egalites).order_by(*self.ordre).values_list(
+            *[champ for _, champ in self.colonnes]
+        )
+
+    def encodeur(self, sortie):
+        """(encoder(lot), début du flux) pour `sortie` ('csv' ou 'ndjson')"""
+        if sortie == 'csv':
+            ecrivain = csv.writer(_Echo())
+
+            def encoder(lot):
+                return ''.join(ecrivain.writerow([_cellule(valeur) for valeur in ligne]) for ligne in lot)
+
+            return encoder, ecrivain.writerow(self.entetes)
+
+        entetes = self.entetes
+
+        def encoder(lot):
+            return ''.join(
+                encoder_json(dict(zip(entetes, map(_valeur, ligne)))) + '\n' for ligne in lot
+            )
+
+        return encoder, ''
+
+    def nom_fichier(self, sortie):
+        return f"{self.nom}_{timezone.localtime():%Y%m%d_%H%M%S}.{sortie}"
+
+
+EXPORTS = {
+    'courses': Export(
+        'courses', Course.objects.all(),
+        colonnes=(
+            ('id', 'id'), ('date_demande', 'date_demande'),
+            ('client_id', 'client_id'), ('client', 'client__utilisateur__username'),
+            ('chauffeur_id', 'chauffeur_id'), ('chauffeur', 'chauffeur__utilisateur__username'),
+            ('type_vehicule', 'type_vehicule_demande'), ('type_course', 'type_course'), ('statut', 'statut'),
+            ('methode_paiement', 'methode_paiement'), ('tarif_estime', 'tarif_estime'),
+            ('tarif_final', 'tarif_final'), ('adresse_depart', 'adresse_depart'),
+            ('adresse_destination', 'adresse_destination'), ('date_debut', 'date_debut'),
+            ('date_fin', 'date_fin'), ('date_modification', 'date_modification'),
+        ),
+        champ_date='date_demande',
+        ordre=('date_demande', 'id'),
+        filtres={'statut': 'statut', 'client_id': 'client_id', 'chauffeur_id': 'chauffeur_id',
+                 'methode_paiement': 'methode_paiement'},
+    ),
+    # Rapprochement: chaque paiement avec la course qu'il règle
+    'paiements': Export(
+        'paiements', Paiement.objects.all(),
+        colonnes=(
+            ('id', 'id'), ('date_paiement', 'date_paiement'), ('date_confirmation', 'date_confirmation'),
+            ('montant', 'montant'), ('statut_paiement', 'statut_paiement'),
+            ('identifiant_transaction', 'identifiant_transaction'),
+            ('operateur_mobile_money', 'operateur_mobile_money'),
+            ('course_id', 'course_id'), ('course_statut', 'course__statut'),
+            ('methode_paiement', 'course__methode_paiement'), ('tarif_final', 'course__tarif_final'),
+            ('client_id', 'course__client_id'), ('chauffeur_id', 'course__chauffeur_id'),
+            ('date_fin_course', 'course__date_fin'),
+        ),
+        champ_date='date_paiement',
+        ordre=('date_paiement', 'id'),
+        filtres={'statut': 'statut_paiement', 'operateur': 'operateur_mobile_money',
+                 'chauffeur_id': 'course__chauffeur_id'},
+    ),
+    # Par chauffeur puis dans le temps: suit l'index (chauffeur, date_position) de chaque partition
+    'positions': Export(
+        'positions', HistoriquePosition.objects.all(),
+        colonnes=(
+            ('id', 'id'), ('chauffeur_id', 'chauffeur_id'), ('date_position', 'date_position'),
+            ('latitude', 'latitude'), ('longitude', 'longitude'),
+        ),
+        champ_date='date_position',
+        ordre=('chauffeur_id', 'date_position'),
+        filtres={'chauffeur_id': 'chauffeur_id'},
+    ),
+}
@@ -0,0 +1,52 @@
+# fields.py
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models.lookups import (
+    Exact, GreaterThan, GreaterThanOrEqual, LessThan, LessThanOrEqual,
+)
+
+
+class CoordonneeField(models.IntegerField):
+    """
+    Coordonnée géographique (degrés) stockée en entier de microdegrés (int32).
+    Précision ~0,11 m; côté Python la valeur est un simple float.
+
+    Type compact à choisir champ par champ, le défaut restant DecimalField: il
+    sert aux tables volumineuses dont l'API arrondit déjà à 6 décimales
+    (HistoriquePosition, TracePosition). Les coordonnées de Course restent en
+    DecimalField(25, 20), précision promise par CourseSerializer.
+    """
+    ECHELLE = 1_000_000
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return value / self.ECHELLE
+
+    def to_python(self, value):
+        if value is None or isinstance(value, float):
+            return value
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise ValidationError(
+                "La valeur « %(value)s » doit être une coordonnée décimale.",
+                code='invalid',
+                params={'value': value},
+            )
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None:
+            return None
+        return round(self.to_python(value) * self.ECHELLE)
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{'form_class': forms.FloatField, **kwargs})
+
+
+# Les lookups d'IntegerField arrondissent les floats à l'entier (en degrés ici):
+# on reprend les lookups génériques, la conversion se fait dans get_prep_value.
+for _lookup in (Exact, GreaterThan, GreaterThanOrEqual, LessThan, LessThanOrEqual):
+    CoordonneeField.register_lookup(_lookup)
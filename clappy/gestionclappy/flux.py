@@ -0,0 +1,130 @@
+# flux.py
+"""
+Réponses en flux pour les exports volumineux (historique complet d'un client
+ou d'un chauffeur, exports CSV/NDJSON de exports.py).
+
+Les lignes sont lues par lots avec un curseur côté serveur
+(iterator(chunk_size=...)) et encodées lot par lot: la mémoire reste celle d'un lot,
+quel que soit le nombre de lignes. Sous ASGI (uvicorn) le flux est un
+générateur async, sinon Django le lirait entièrement en mémoire avant de
+l'envoyer; sous WSGI (runserver) c'est un générateur synchrone.
+"""
+import json
+from datetime import datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .reglages import parametre
+
+
+def _instant(texte, fin):
+    """Date ou date-heure ISO; une date seule couvre toute la journée"""
+    jour = parse_date(texte)
+    if jour is not None:
+        moment = datetime.combine(jour + timedelta(days=1) if fin else jour, time.min)
+    else:
+        moment = parse_datetime(texte)
+        if moment is None:
+            raise ValueError(f"Date invalide: {texte}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def filtrer_periode(queryset, du=None, au=None, champ='date_demande'):
+    """
+    ?du=...&au=... (bornes incluses, dates ou dates-heures ISO).
+    ValueError si une borne est illisible.
+    """
+    if du:
+        queryset = queryset.filter(**{f'{champ}__gte': _instant(du, fin=False)})
+    if au:
+        # Une date seule donne le début du jour suivant, exclu
+        operateur = 'lt' if parse_date(au) else 'lte'
+        queryset = queryset.filter(**{f'{champ}__{operateur}': _instant(au, fin=True)})
+    return queryset
+
+
+def lots(queryset, taille=None):
+    """Lignes de `queryset` par listes de `taille`, lues avec un curseur côté serveur"""
+    taille = taille or parametre('FLUX_TAILLE_LOT', 2000)
+    lot = []
+    for ligne in queryset.iterator(chunk_size=taille):
+        lot.append(ligne)
+        if len(lot) == taille:
+            yield lot
+            lot = []
+    if lot:
+        yield lot
+
+
+async def alots(queryset, taille=None):
+    """
+    lots() lu depuis la boucle async, un lot par passage dans le thread de l'ORM.
+    QuerySet.aiterator() exécute la requête dans la boucle pour values_list().
+    """
+    generateur = lots(queryset, taille)
+    suivant = sync_to_async(lambda: next(generateur, None))
+    try:
+        while (lot := await suivant()) is not None:
+            yield lot
+    finally:
+        # Client parti avant la fin: fermer le curseur côté serveur
+        await sync_to_async(generateur.close)()
+
+
+def morceaux(paquets, encoder, debut='', separateur='', fin=''):
+    """Texte du flux: debut, encoder(lot) pour chaque lot de `paquets` séparés par `separateur`, fin"""
+    if debut:
+        yield debut
+    premier = True
+    for lot in paquets:
+        yield ('' if premier else separateur) + encoder(lot)
+        premier = False
+    if fin:
+        yield fin
+
+
+async def amorceaux(paquets, encoder, debut='', separateur='', fin=''):
+    if debut:
+        yield debut
+    premier = True
+    async for lot in paquets:
+        yield ('' if premier else separateur) + encoder(lot)
+        premier = False
+    if fin:
+        yield fin
+
+
+def reponse_en_flux(request, queryset, encoder, content_type, nom_fichier=None,
+                    debut='', separateur='', fin='', taille_lot=None):
+    """StreamingHttpResponse des morceaux de `queryset`, async sous ASGI"""
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        contenu = amorceaux(alots(queryset, taille_lot), encoder, debut, separateur, fin)
+    else:
+        contenu = morceaux(lots(queryset, taille_lot), encoder, debut, separateur, fin)
+    reponse = StreamingHttpResponse(contenu, content_type=content_type)
+    if nom_fichier:
+        reponse['Content-Disposition'] = f'attachment; filename="{nom_fichier}"'
+    return reponse
+
+
+def encoder_json(objet):
+    # Même encodage compact que le JSONRenderer de DRF
+    return json.dumps(objet, ensure_ascii=False, separators=(',', ':'))
+
+
+def json_en_flux(request, queryset, representer, nom_fichier=None, taille_lot=None):
+    """
+    Tableau JSON de representer(lot) pour chaque lot de `queryset` (en général
+    une projection values()), envoyé au fur et à mesure de la lecture.
+    """
+    def encoder(lot):
+        return ','.join(encoder_json(ligne) for ligne in representer(lot))
+
+    return reponse_en_flux(request, queryset, encoder, 'application/json', nom_fichier,
+                           debut='[', separateur=',', fin=']', taille_lot=taille_lot)
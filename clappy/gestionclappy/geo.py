@@ -0,0 +1,50 @@
+# geo.py
+import math
+
+import numpy as np
+
+from .reglages import parametre
+
+# Rayon moyen de la Terre (km)
+RAYON_TERRE_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Distance à vol d'oiseau (km) entre deux points exprimés en degrés
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, (float(lat1), float(lon1), float(lat2), float(lon2)))
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    return 2 * RAYON_TERRE_KM * math.asin(math.sqrt(a))
+
+
+def distances_haversine_km(latitudes, longitudes, lat, lon):
+    """
+    Distances (km) de N points au point (lat, lon), en une passe vectorisée.
+    `latitudes` et `longitudes` sont des séquences ou tableaux NumPy de degrés;
+    retourne un tableau float64 de même longueur.
+    """
+    phi = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lambda_ = np.radians(np.asarray(longitudes, dtype=np.float64))
+    phi0 = math.radians(float(lat))
+    lambda0 = math.radians(float(lon))
+    a = np.sin((phi - phi0) / 2) ** 2 + math.cos(phi0) * np.cos(phi) * np.sin((lambda_ - lambda0) / 2) ** 2
+    return 2 * RAYON_TERRE_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def eta_minutes(distances_km, vitesse_kmh=None, facteur_detour=None):
+    """
+    Durée estimée (minutes) à partir de distances à vol d'oiseau: la distance
+    routière est approchée par `facteur_detour` fois la distance directe.
+    """
+    vitesse_kmh = vitesse_kmh or parametre('ETA_VITESSE_MOYENNE_KMH', 25)
+    facteur_detour = facteur_detour or parametre('ETA_FACTEUR_DETOUR', 1.3)
+    return np.asarray(distances_km, dtype=np.float64) * (facteur_detour * 60.0 / vitesse_kmh)
+
+
+def distances_et_eta(latitudes, longitudes, lat, lon):
+    """(distances_km, eta_minutes) de chaque point vers (lat, lon)"""
+    distances = distances_haversine_km(latitudes, longitudes, lat, lon)
+    return distances, eta_minutes(distances)
@@ -0,0 +1,184 @@
+# ingestion.py
+"""
+Ingestion des points GPS des chauffeurs par lots.
+
+Les points sont validés sans passer par un ModelSerializer, gardés dans un
+tampon court puis écrits avec bulk_create par un thread dédié du processus.
+Un téléphone peut envoyer plusieurs points enregistrés hors ligne, chacun avec
+sa date_position: tous sont conservés (le trajet d'une course en dépend), seuls
+les doublons exacts sont fusionnés. Un point sans date prend l'heure de réception.
+L'index en direct ne reçoit que le point le plus récent de chaque chauffeur.
+"""
+import atexit
+import logging
+import threading
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .majoration import moteur_majoration
+from .models import Chauffeur, HistoriquePosition
+from .positions import get_index
+from .reglages import parametre
+
+logger = logging.getLogger(__name__)
+
+
+def _coordonnee(valeur, limite):
+    coordonnee = float(valeur)
+    if coordonnee != coordonnee or not -limite <= coordonnee <= limite:
+        raise ValueError
+    return coordonnee
+
+
+def _date_position(valeur, maintenant):
+    """Date ISO 8601 du point, ni future (à la dérive d'horloge près) ni au-delà de la rétention"""
+    if valeur is None:
+        return maintenant
+    date = parse_datetime(valeur) if isinstance(valeur, str) else None
+    if date is None:
+        raise ValueError
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    retention = timedelta(days=parametre('POSITIONS_RETENTION_JOURS', 30))
+    if not maintenant - retention <= date <= maintenant + timedelta(minutes=5):
+        raise ValueError
+    return date
+
+
+def plus_recents(points):
+    """{chauffeur_id: (latitude, longitude)} du point le plus récent de chaque chauffeur"""
+    recents = {}
+    for chauffeur_id, latitude, longitude, date in points:
+        if chauffeur_id not in recents or date >= recents[chauffeur_id][2]:
+            recents[chauffeur_id] = (latitude, longitude, date)
+    return {chauffeur_id: (latitude, longitude) for chauffeur_id, (latitude, longitude, _) in recents.items()}
+
+
+def valider_positions(donnees, chauffeur_id=None):
+    """
+    Valider une liste de points {"chauffeur", "latitude", "longitude", "date_position"?}.
+    Si `chauffeur_id` est donné (socket authentifiée), il remplace le champ "chauffeur".
+    Retourne (points, erreurs) où points = [(chauffeur_id, latitude, longitude, date)].
+    """
+    if not isinstance(donnees, list):
+        return [], [{'index': None, 'erreur': 'Une liste de positions est attendue'}]
+
+    points = []
+    erreurs = []
+    maintenant = timezone.now()
+    for index, item in enumerate(donnees):
+        if not isinstance(item, dict):
+            erreurs.append({'index': index, 'erreur': 'Position invalide'})
+            continue
+        try:
+            identifiant = chauffeur_id if chauffeur_id is not None else int(item['chauffeur'])
+        except (KeyError, TypeError, ValueError):
+            erreurs.append({'index': index, 'erreur': 'Chauffeur invalide'})
+            continue
+        try:
+            latitude = _coordonnee(item['latitude'], 90)
+            longitude = _coordonnee(item['longitude'], 180)
+        except (KeyError, TypeError, ValueError):
+            erreurs.append({'index': index, 'erreur': 'Coordonnées invalides'})
+            continue
+        try:
+            date = _date_position(item.get('date_position'), maintenant)
+        except ValueError:
+            erreurs.append({'index': index, 'erreur': 'Date de position invalide'})
+            continue
+        points.append((identifiant, latitude, longitude, date))
+
+    if chauffeur_id is None and points:
+        # Un seul aller-retour pour vérifier l'existence des chauffeurs
+        existants = set(
+            Chauffeur.objects.filter(id__in={point[0] for point in points}).values_list('id', flat=True)
+        )
+        inconnus = [point for point in points if point[0] not in existants]
+        if inconnus:
+            erreurs.extend({'chauffeur': point[0], 'erreur': 'Chauffeur non trouvé'} for point in inconnus)
+            points = [point for point in points if point[0] in existants]
+
+    return points, erreurs
+
+
+class TamponPositions:
+    """
+    Tampon des points reçus (sans doublons exacts), vidé en base par un seul
+    thread toutes les `delai` secondes, ou dès `taille_max` points. Un lot dont
+    l'écriture échoue est remis en tête du tampon et retenté au passage suivant;
+    au-delà de `attente_max` points en attente, les plus anciens sont abandonnés.
+    """
+
+    def __init__(self, delai=None, taille_max=None, attente_max=None):
+        self.delai = delai if delai is not None else parametre('POSITIONS_TAMPON_SECONDES', 2)
+        self.taille_max = taille_max or parametre('POSITIONS_TAMPON_TAILLE_MAX', 500)
+        self.attente_max = attente_max or parametre('POSITIONS_TAMPON_ATTENTE_MAX', 50000)
+        # Dict utilisé comme ensemble ordonné de (chauffeur_id, latitude, longitude, date)
+        self._points = {}
+        self._verrou = threading.Lock()
+        self._plein = threading.Event()
+        self._thread = None
+
+    def ajouter(self, points):
+        """Ajouter des points validés; l'index en direct est mis à jour immédiatement"""
+        index = get_index()
+        with self._verrou:
+            self._points.update(dict.fromkeys(points))
+            if len(self._points) >= self.taille_max:
+                self._plein.set()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._boucle, name="positions", daemon=True)
+                self._thread.start()
+
+        for chauffeur_id, (latitude, longitude) in plus_recents(points).items():
+            index.mettre_a_jour(chauffeur_id, latitude, longitude)
+            moteur_majoration.chauffeur_deplace(chauffeur_id, latitude, longitude)
+        return len(points)
+
+    def _boucle(self):
+        while True:
+            self._plein.wait(self.delai)
+            self._plein.clear()
+            try:
+                self.vider()
+            finally:
+                close_old_connections()
+
+    def vider(self):
+        """Écrire en base les points en attente (un INSERT par lot de `taille_max`)"""
+        with self._verrou:
+            points, self._points = self._points, {}
+        ecrits = 0
+        lots = list(points)
+        for debut in range(0, len(lots), self.taille_max):
+            lot = lots[debut:debut + self.taille_max]
+            try:
+                HistoriquePosition.objects.bulk_create([
+                    HistoriquePosition(chauffeur_id=chauffeur_id, latitude=latitude, longitude=longitude,
+                                       date_position=date)
+                    for chauffeur_id, latitude, longitude, date in lot
+                ])
+            except Exception as e:
+                self._remettre(lots[debut:])
+                logger.error(f"Erreur écriture de {len(lot)} positions, {len(lots) - debut} remises en attente: {e}",
+                             exc_info=True)
+                break
+            ecrits += len(lot)
+        return ecrits
+
+    def _remettre(self, points):
+        """Remettre des points non écrits devant ceux arrivés entre-temps"""
+        with self._verrou:
+            self._points = {**dict.fromkeys(points), **self._points}
+            surplus = len(self._points) - self.attente_max
+            if surplus > 0:
+                for point in list(self._points)[:surplus]:
+                    del self._points[point]
+                logger.error(f"Tampon de positions saturé: {surplus} points les plus anciens abandonnés")
+
+
+tampon_positions = TamponPositions()
+atexit.register(tampon_positions.vider)
@@ -0,0 +1,249 @@
+# majoration.py
+"""
+Majoration dynamique des tarifs selon l'offre et la demande par zone.
+
+Pour chaque couple (cellule de la grille, type de véhicule), le moteur tient:
+- la demande: courses 'demandee' ouvertes dans la fenêtre glissante,
+- l'offre: chauffeurs 'disponible' localisés dans la cellule.
+
+Ces compteurs sont mis à jour événement par événement (changements de statut
+des courses et des chauffeurs, après commit, et déplacements), et seul le
+multiplicateur de la zone touchée est recalculé. La lecture par le moteur de
+tarification est un simple accès dictionnaire.
+
+Toutes les MAJORATION_RESYNCHRONISATION_SECONDES, les compteurs sont
+reconstruits depuis la base dans un thread de fond, hors du verrou des tables:
+les événements reçus pendant la reconstruction sont rejoués sur les nouvelles
+tables avant qu'elles ne remplacent les anciennes.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .positions import cellule_de
+from .reglages import parametre
+
+logger = logging.getLogger(__name__)
+
+
+class MoteurMajoration:
+    """Table des multiplicateurs (cellule, type_vehicule) -> float"""
+
+    def __init__(self):
+        self.taille_cellule = parametre('MAJORATION_TAILLE_CELLULE_DEG', 0.02)
+        self.fenetre = parametre('MAJORATION_FENETRE_MINUTES', 15) * 60
+        self.seuil = parametre('MAJORATION_SEUIL', 1.0)
+        self.sensibilite = parametre('MAJORATION_SENSIBILITE', 0.5)
+        self.maximum = parametre('MAJORATION_MAX', 2.0)
+        self.resynchronisation = parametre('MAJORATION_RESYNCHRONISATION_SECONDES', 300)
+
+        self._demande = defaultdict(dict)  # zone -> {course_id: horodatage}
+        self._courses = {}  # course_id -> zone
+        self._offre = defaultdict(set)  # zone -> {chauffeur_id}
+        self._chauffeurs = {}  # chauffeur_id -> zone
+        self._types_chauffeurs = {}  # chauffeur_id -> type_vehicule (chauffeurs disponibles)
+        self._multiplicateurs = {}  # zone -> (multiplicateur, valable_jusqu_a)
+        self._verrou = threading.RLock()
+        self._verrou_chargement = threading.Lock()
+        self._charge_le = None
+        self._en_rechargement = False
+        self._journal = None  # événements reçus pendant une reconstruction, à rejouer
+
+    # ---------- Lecture ----------
+
+    def multiplicateur(self, lat, lon, type_vehicule):
+        """Multiplicateur courant de la zone (1.0 si rien de particulier)"""
+        if lat is None or lon is None or not parametre('MAJORATION_ACTIVE', True):
+            return 1.0
+        self._verifier_chargement()
+        zone = (cellule_de(float(lat), float(lon), self.taille_cellule), type_vehicule)
+        valeur = self._multiplicateurs.get(zone)
+        if valeur is None:
+            return 1.0
+        multiplicateur, valable_jusqu_a = valeur
+        if valable_jusqu_a < time.time():
+            # Des demandes sont sorties de la fenêtre glissante
+            with self._verrou:
+                self._recalculer(zone)
+            return self._multiplicateurs.get(zone, (1.0, 0))[0]
+        return multiplicateur
+
+    def table(self):
+        """Multiplicateurs supérieurs à 1: {(cellule, type_vehicule): multiplicateur}"""
+        self._verifier_chargement()
+        return {zone: valeur[0] for zone, valeur in self._multiplicateurs.items()}
+
+    # ---------- Événements ----------
+
+    def _noter(self, *evenement):
+        journal = self._journal
+        if journal is not None:
+            journal.append(evenement)
+
+    def course_ouverte(self, course_id, lat, lon, type_vehicule, horodatage=None):
+        if lat is None or lon is None:
+            return
+        horodatage = horodatage or time.time()
+        zone = (cellule_de(float(lat), float(lon), self.taille_cellule), type_vehicule)
+        with self._verrou:
+            self._noter('course_ouverte', course_id, lat, lon, type_vehicule, horodatage)
+            ancienne = self._courses.get(course_id)
+            if ancienne is not None and ancienne != zone:
+                self._retirer_course(course_id)
+            self._courses[course_id] = zone
+            self._demande[zone][course_id] = horodatage
+            self._recalculer(zone)
+
+    def course_fermee(self, course_id):
+        with self._verrou:
+            self._noter('course_fermee', course_id)
+            self._retirer_course(course_id)
+
+    def chauffeur_disponible(self, chauffeur_id, type_vehicule, lat=None, lon=None):
+        """Chauffeur passé 'disponible'; sans position connue il ne compte dans aucune zone"""
+        with self._verrou:
+            self._noter('chauffeur_disponible', chauffeur_id, type_vehicule, lat, lon)
+            self._types_chauffeurs[chauffeur_id] = type_vehicule
+            if lat is not None and lon is not None:
+                self.chauffeur_deplace(chauffeur_id, lat, lon)
+
+    def chauffeur_indisponible(self, chauffeur_id):
+        with self._verrou:
+            self._noter('chauffeur_indisponible', chauffeur_id)
+            self._types_chauffeurs.pop(chauffeur_id, None)
+            zone = self._chauffeurs.pop(chauffeur_id, None)
+            if zone is not None:
+                self._offre[zone].discard(chauffeur_id)
+                self._recalculer(zone)
+
+    def chauffeur_deplace(self, chauffeur_id, lat, lon):
+        """Nouveau point GPS: seul un changement de cellule d'un chauffeur disponible coûte un recalcul"""
+        self._noter('chauffeur_deplace', chauffeur_id, lat, lon)
+        type_vehicule = self._types_chauffeurs.get(chauffeur_id)
+        if type_vehicule is None:
+            return
+        zone = (cellule_de(float(lat), float(lon), self.taille_cellule), type_vehicule)
+        with self._verrou:
+            ancienne = self._chauffeurs.get(chauffeur_id)
+            if ancienne == zone:
+                return
+            if ancienne is not None:
+                self._offre[ancienne].discard(chauffeur_id)
+                self._recalculer(ancienne)
+            self._chauffeurs[chauffeur_id] = zone
+            self._offre[zone].add(chauffeur_id)
+            self._recalculer(zone)
+
+    # ---------- Calcul ----------
+
+    def _retirer_course(self, course_id):
+        zone = self._courses.pop(course_id, None)
+        if zone is not None:
+            self._demande[zone].pop(course_id, None)
+            self._recalculer(zone)
+
+    def _recalculer(self, zone):
+        """Multiplicateur d'une seule zone, à partir de ses compteurs"""
+        limite = time.time() - self.fenetre
+        demandes = self._demande.get(zone, {})
+        for course_id in [cid for cid, horodatage in demandes.items() if horodatage < limite]:
+            del demandes[course_id]
+            self._courses.pop(course_id, None)
+        if not demandes:
+            self._demande.pop(zone, None)
+        if not self._offre.get(zone):
+            self._offre.pop(zone, None)
+
+        ratio = len(demandes) / max(len(self._offre.get(zone, ())), 1)
+        multiplicateur = 1.0 + self.sensibilite * (ratio - self.seuil)
+        multiplicateur = round(min(max(multiplicateur, 1.0), self.maximum), 1)
+        if multiplicateur > 1.0:
+            # Valable jusqu'à la sortie de fenêtre de la plus ancienne demande
+            self._multiplicateurs[zone] = (multiplicateur, min(demandes.values()) + self.fenetre)
+        else:
+            self._multiplicateurs.pop(zone, None)
+
+    # ---------- Chargement ----------
+
+    def _verifier_chargement(self):
+        # Filet de sécurité: les update() en masse et les autres processus ne passent pas par les signaux
+        if self._charge_le is None:
+            # Premier devis du processus: les tables sont construites avant de répondre
+            with self._verrou_chargement:
+                if self._charge_le is None:
+                    self._recharger()
+        elif time.monotonic() - self._charge_le > self.resynchronisation and not self._en_rechargement:
+            with self._verrou:
+                if self._en_rechargement:
+                    return
+                self._en_rechargement = True
+            threading.Thread(target=self._recharger_en_fond, name="majoration", daemon=True).start()
+
+    def _recharger(self):
+        try:
+            self.charger()
+        except Exception as e:
+            logger.error(f"Chargement des majorations impossible: {e}")
+            self._charge_le = time.monotonic()
+
+    def _recharger_en_fond(self):
+        try:
+            self._recharger()
+        finally:
+            self._en_rechargement = False
+            close_old_connections()
+
+    def charger(self):
+        """
+        Reconstruire les compteurs depuis la base et l'index des positions dans
+        des tables neuves, sans bloquer les devis ni les événements, puis les
+        substituer aux tables courantes.
+        """
+        from .models import Chauffeur, Course
+        from .positions import get_index
+
+        with self._verrou:
+            self._journal = []
+        try:
+            nouveau = MoteurMajoration()
+            courses = Course.objects.filter(
+                statut='demandee',
+                date_demande__gte=timezone.now() - timedelta(seconds=self.fenetre),
+                latitude_depart__isnull=False,
+                longitude_depart__isnull=False,
+            ).values_list('id', 'latitude_depart', 'longitude_depart', 'type_vehicule_demande', 'date_demande')
+            for course_id, lat, lon, type_vehicule, date_demande in courses.iterator():
+                nouveau.course_ouverte(course_id, lat, lon, type_vehicule, date_demande.timestamp())
+
+            index = get_index()
+            chauffeurs = Chauffeur.objects.filter(
+                statut='disponible', vehicule__isnull=False
+            ).values_list('id', 'vehicule__type_vehicule')
+            for chauffeur_id, type_vehicule in chauffeurs.iterator():
+                position = index.position(chauffeur_id)
+                nouveau.chauffeur_disponible(
+                    chauffeur_id, type_vehicule,
+                    *(position[:2] if position is not None else (None, None))
+                )
+        except Exception:
+            with self._verrou:
+                self._journal = None
+            raise
+
+        with self._verrou:
+            journal, self._journal = self._journal, None
+            for methode, *arguments in journal:
+                getattr(nouveau, methode)(*arguments)
+            self._demande, self._courses = nouveau._demande, nouveau._courses
+            self._offre, self._chauffeurs = nouveau._offre, nouveau._chauffeurs
+            self._types_chauffeurs, self._multiplicateurs = nouveau._types_chauffeurs, nouveau._multiplicateurs
+            self._charge_le = time.monotonic()
+        logger.info(f"Majorations chargées: {len(self._courses)} demandes, {len(self._chauffeurs)} chauffeurs localisés")
+
+
+moteur_majoration = MoteurMajoration()
@@ -0,0 +1,133 @@
+import asyncio
+import multiprocessing
+import queue
+import statistics
+import time
+
+from channels.layers import channel_layers
+from django.core.management.base import BaseCommand, CommandError
+
+from gestionclappy.canaux import couche_partagee, nom_backend
+
+
+def _centile(valeurs, p):
+    if not valeurs:
+        return None
+    valeurs = sorted(valeurs)
+    return valeurs[min(int(len(valeurs) * p / 100), len(valeurs) - 1)]
+
+
+def _worker(alias, groupe, sockets, pret, resultats, delai):
+    """Un processus = un worker ASGI avec `sockets` consommateurs abonnés au groupe"""
+
+    async def recevoir(channel_layer, canal, latences):
+        while True:
+            message = await channel_layer.receive(canal)
+            if message['type'] == 'bench.fin':
+                return
+            latences.append(time.time() - message['envoi'])
+
+    async def principal():
+        channel_layer = channel_layers.make_backend(alias)
+        canaux = [await channel_layer.new_channel() for _ in range(sockets)]
+        for canal in canaux:
+            await channel_layer.group_add(groupe, canal)
+        pret.release()
+        latences = []
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(recevoir(channel_layer, canal, latences) for canal in canaux)), delai
+            )
+        except asyncio.TimeoutError:
+            pass
+        for canal in canaux:
+            await channel_layer.group_discard(groupe, canal)
+        resultats.put(latences)
+
+    asyncio.run(principal())
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la latence de diffusion group_send vers des sockets répartis sur 1, 4 et 16 "
+        "processus workers (couche CHANNEL_LAYERS configurée, voir faux_redis)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default='1,4,16', help="Nombres de workers, séparés par des virgules")
+        parser.add_argument('--sockets-par-worker', type=int, default=10)
+        parser.add_argument('--messages', type=int, default=200)
+        parser.add_argument('--intervalle-ms', type=float, default=5, help="Pause entre deux group_send")
+        parser.add_argument('--taille-payload', type=int, default=300, help="Octets de données par message")
+        parser.add_argument('--alias', default='default')
+
+    def handle(self, *args, **options):
+        if options['alias'] not in channel_layers.configs:
+            raise CommandError(f"Couche channels '{options['alias']}' non configurée")
+        channel_layer = channel_layers.make_backend(options['alias'])
+        self.stdout.write(f"Couche: {nom_backend(channel_layer)}")
+        if not couche_partagee(channel_layer):
+            self.stdout.write(self.style.WARNING(
+                "Couche en mémoire: les messages ne traversent pas les processus, seules les livraisons "
+                "du processus courant seraient comptées (définir REDIS_URL / CHANNELS_BACKEND)."
+            ))
+
+        for nombre in [int(n) for n in options['workers'].split(',') if n.strip()]:
+            self.mesurer(nombre, options)
+
+    def mesurer(self, nombre_workers, options):
+        contexte = multiprocessing.get_context('fork')
+        groupe = f"bench_{nombre_workers}_{int(time.time())}"
+        sockets = options['sockets_par_worker']
+        delai = options['messages'] * options['intervalle_ms'] / 1000 + 30
+        pret = contexte.Semaphore(0)
+        resultats = contexte.Queue()
+        processus = [
+            contexte.Process(target=_worker, args=(options['alias'], groupe, sockets, pret, resultats, delai), daemon=True)
+            for _ in range(nombre_workers)
+        ]
+        for p in processus:
+            p.start()
+        for _ in processus:
+            if not pret.acquire(timeout=30):
+                raise CommandError("Les workers ne se sont pas abonnés au groupe à temps")
+
+        payload = 'x' * options['taille_payload']
+
+        async def envoyer():
+            channel_layer = channel_layers.make_backend(options['alias'])
+            debut = time.perf_counter()
+            for numero in range(options['messages']):
+                await channel_layer.group_send(groupe, {
+                    'type': 'bench.message', 'numero': numero, 'envoi': time.time(), 'payload': payload,
+                })
+                await asyncio.sleep(options['intervalle_ms'] / 1000)
+            duree = time.perf_counter() - debut
+            await asyncio.sleep(0.5)
+            await channel_layer.group_send(groupe, {'type': 'bench.fin'})
+            return duree
+
+        duree = asyncio.run(envoyer())
+
+        latences = []
+        for _ in processus:
+            try:
+                latences.extend(resultats.get(timeout=delai + 5))
+            except queue.Empty:
+                break
+        for p in processus:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+
+        attendus = options['messages'] * sockets * nombre_workers
+        if not latences:
+            self.stdout.write(self.style.ERROR(f"{nombre_workers} workers: aucun message reçu sur {attendus}"))
+            return
+        ms = [latence * 1000 for latence in latences]
+        self.stdout.write(self.style.SUCCESS(
+            f"{nombre_workers:>3} workers x {sockets} sockets: {len(ms)}/{attendus} reçus, "
+            f"p50 {_centile(ms, 50):.2f} ms, p95 {_centile(ms, 95):.2f} ms, p99 {_centile(ms, 99):.2f} ms, "
+            f"max {max(ms):.2f} ms, moyenne {statistics.mean(ms):.2f} ms "
+            f"({options['messages'] / duree:.0f} group_send/s)"
+        ))
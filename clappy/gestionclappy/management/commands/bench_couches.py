@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gestionclappy.management.commands.bench_channels import _centile
+from gestionclappy.reglages import parametre
+
+
+def _fabriquer(nom):
+    if nom == 'memoire':
+        return InMemoryChannelLayer(capacity=100000)
+    if nom == 'postgres':
+        from gestionclappy.couche_postgres import PostgresChannelLayer
+        return PostgresChannelLayer(alias='default', prefix='bench', capacity=100000)
+    if nom in ('redis', 'redis_pubsub'):
+        if not parametre('REDIS_URL', None):
+            raise CommandError(f"REDIS_URL requis pour la couche {nom}")
+        from django.utils.module_loading import import_string
+        classe = import_string(settings.CHANNELS_BACKENDS[nom])
+        return classe(hosts=[settings.REDIS_URL], prefix='bench')
+    raise CommandError(f"Couche inconnue: {nom}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare débit et latence des couches channels dans un seul processus "
+        "(aller-retour send/receive, débit d'envoi, diffusion de groupe, gros messages). "
+        "Les couches partagées envoient depuis une seconde instance, comme un autre worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--couches', default='memoire,postgres', help="memoire, postgres, redis, redis_pubsub")
+        parser.add_argument('--messages', type=int, default=2000)
+        parser.add_argument('--membres', type=int, default=100, help="Canaux abonnés au groupe")
+        parser.add_argument('--taille-payload', type=int, default=300)
+        parser.add_argument('--taille-gros', type=int, default=20000, help="Octets des gros messages (> limite NOTIFY)")
+
+    def handle(self, *args, **options):
+        for nom in [n.strip() for n in options['couches'].split(',') if n.strip()]:
+            couche = _fabriquer(nom)
+            # La couche en mémoire ne relie que ses propres canaux
+            emetteur = couche if nom == 'memoire' else _fabriquer(nom)
+            resultats = asyncio.run(self.mesurer(couche, emetteur, options))
+            self.stdout.write(self.style.SUCCESS(nom))
+            for ligne in resultats:
+                self.stdout.write(f"  {ligne}")
+
+    async def mesurer(self, couche, emetteur, options):
+        resultats = []
+        messages = options['messages']
+        payload = 'x' * options['taille_payload']
+
+        # Aller-retour: latence d'un message isolé
+        canal = await couche.new_channel()
+        latences = []
+        for numero in range(min(messages, 500)):
+            debut = time.perf_counter()
+            await emetteur.send(canal, {'type': 'bench', 'numero': numero, 'payload': payload})
+            await couche.receive(canal)
+            latences.append((time.perf_counter() - debut) * 1000)
+        resultats.append(
+            f"aller-retour: p50 {_centile(latences, 50):.3f} ms, p95 {_centile(latences, 95):.3f} ms"
+        )
+
+        # Débit: envois concurrents vers un canal vidé par un récepteur
+        async def vider(canal, nombre):
+            for _ in range(nombre):
+                await couche.receive(canal)
+
+        debut = time.perf_counter()
+        recepteur = asyncio.create_task(vider(canal, messages))
+        for debut_lot in range(0, messages, 100):
+            await asyncio.gather(*(
+                emetteur.send(canal, {'type': 'bench', 'numero': numero, 'payload': payload})
+                for numero in range(debut_lot, min(debut_lot + 100, messages))
+            ))
+        await recepteur
+        duree = time.perf_counter() - debut
+        resultats.append(f"débit send/receive: {messages / duree:.0f} messages/s")
+
+        # Diffusion: group_send vers `membres` canaux
+        groupe = f"bench_{int(time.time())}"
+        membres = [await couche.new_channel() for _ in range(options['membres'])]
+        for membre in membres:
+            await couche.group_add(groupe, membre)
+        diffusions = max(messages // options['membres'], 10)
+        latences = []
+        for numero in range(diffusions):
+            debut = time.perf_counter()
+            await emetteur.group_send(groupe, {'type': 'bench', 'numero': numero, 'payload': payload})
+            await asyncio.gather(*(couche.receive(membre) for membre in membres))
+            latences.append((time.perf_counter() - debut) * 1000)
+        resultats.append(
+            f"group_send vers {len(membres)} canaux: p50 {_centile(latences, 50):.3f} ms, "
+            f"p95 {_centile(latences, 95):.3f} ms"
+        )
+
+        # Gros messages (au-delà de la limite NOTIFY pour la couche PostgreSQL)
+        gros = 'x' * options['taille_gros']
+        latences = []
+        for numero in range(50):
+            debut = time.perf_counter()
+            await emetteur.group_send(groupe, {'type': 'bench', 'numero': numero, 'payload': gros})
+            await asyncio.gather(*(couche.receive(membre) for membre in membres[:10]))
+            latences.append((time.perf_counter() - debut) * 1000)
+            for membre in membres[10:]:
+                await couche.receive(membre)
+        resultats.append(
+            f"group_send {options['taille_gros']} octets: p50 {_centile(latences, 50):.3f} ms, "
+            f"p95 {_centile(latences, 95):.3f} ms"
+        )
+
+        for membre in membres:
+            await couche.group_discard(groupe, membre)
+        await couche.flush()
+        if emetteur is not couche:
+            await emetteur.flush()
+        return resultats
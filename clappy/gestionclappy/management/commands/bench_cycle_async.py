@@ -0,0 +1,110 @@
+import asyncio
+import time
+import uuid
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from channels.layers import DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer, channel_layers
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from gestionclappy.dispatch import groupes_autour
+from gestionclappy.management.commands.bench_channels import _centile
+from gestionclappy.models import Chauffeur, Client, Course, CustomUser, NotificationSortante, Vehicule
+from gestionclappy.notifications import attendre_taches
+
+
+class CoucheLente(InMemoryChannelLayer):
+    """Couche en mémoire dont chaque group_send coûte `delai` secondes (couche distante chargée)"""
+
+    def __init__(self, delai, **kwargs):
+        super().__init__(**kwargs)
+        self.delai = delai
+
+    async def group_send(self, group, message):
+        await asyncio.sleep(self.delai)
+        await super().group_send(group, message)
+
+
+class Command(BaseCommand):
+    help = (
+        "Latence du cycle accepter/démarrer/terminer par les vues DRF synchrones et par les vues async, "
+        "quand chaque group_send de la diffusion coûte --delais-ms. La réponse async ne doit pas dépendre "
+        "de la diffusion, faite en tâche de fond. Crée des données temporaires, supprimées à la fin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--delais-ms', default='0,50,200', help="Coût simulé d'un group_send")
+        parser.add_argument('--rayon-km', type=float, default=None,
+                            help="Rayon de diffusion (plus de groupes = plus de group_send)")
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            raise CommandError("Lancer ce benchmark sur PostgreSQL")
+        marque = uuid.uuid4().hex[:8]
+        utilisateur, client, chauffeur = self.creer_donnees(marque)
+        groupes = groupes_autour('economique', 9.6412, -13.5784, options['rayon_km'])
+        self.stdout.write(f"Diffusion de la confirmation vers {len(groupes)} groupe(s)")
+        try:
+            for delai_ms in [int(d) for d in options['delais_ms'].split(',') if d.strip()]:
+                channel_layers.backends[DEFAULT_CHANNEL_LAYER] = CoucheLente(delai_ms / 1000)
+                for mode in ('sync', 'async'):
+                    resultats = asyncio.run(self.mesurer(mode, utilisateur, client, chauffeur, options))
+                    self.stdout.write(self.style.SUCCESS(
+                        f"  group_send {delai_ms} ms, vues {mode}: " + ", ".join(
+                            f"{etape} p50 {_centile(latences, 50):.1f} ms / p95 {_centile(latences, 95):.1f} ms"
+                            for etape, latences in resultats.items()
+                        )
+                    ))
+        finally:
+            channel_layers.backends.pop(DEFAULT_CHANNEL_LAYER, None)
+            courses = Course.objects.filter(client=client)
+            NotificationSortante.objects.filter(course__in=courses).delete()
+            courses.delete()
+            CustomUser.objects.filter(username__in=[f"bench_client_{marque}", f"bench_chauffeur_{marque}"]).delete()
+
+    def creer_donnees(self, marque):
+        utilisateur = CustomUser.objects.create_user(username=f"bench_client_{marque}", password=marque, is_client=True)
+        client = Client.objects.create(utilisateur=utilisateur, telephone="620000000")
+        chauffeur = Chauffeur.objects.create(
+            utilisateur=CustomUser.objects.create_user(
+                username=f"bench_chauffeur_{marque}", password=marque, is_chauffeur=True
+            ),
+            telephone="620000001", numero_permis=f"BC{marque}", statut='disponible', est_approuve=True,
+        )
+        Vehicule.objects.create(
+            chauffeur=chauffeur, marque="Toyota", modele="Corolla", annee=2018,
+            immatriculation=f"BC{marque}", couleur="Blanc", type_vehicule='economique',
+        )
+        return utilisateur, client, chauffeur
+
+    async def mesurer(self, mode, utilisateur, client, chauffeur, options):
+        api = AsyncClient()
+        entetes = {'authorization': f"Bearer {RefreshToken.for_user(utilisateur).access_token}"}
+        resultats = {'accepter': [], 'demarrer': [], 'terminer': [], 'diffusion': []}
+        prefixe = 'course' if mode == 'sync' else 'course-async'
+        for _ in range(options['iterations']):
+            course = await sync_to_async(Course.objects.create)(
+                client=client, type_vehicule_demande='economique',
+                adresse_depart="Kaloum", adresse_destination="Ratoma",
+                latitude_depart=9.6412, longitude_depart=-13.5784,
+                tarif_estime=Decimal('25000'), methode_paiement='especes',
+            )
+            for etape, corps in (('accepter', {'chauffeur_id': chauffeur.id}),
+                                 ('demarrer', {}), ('terminer', {'tarif_final': '27000'})):
+                url = reverse(f'{prefixe}-{etape}', args=[course.id])
+                debut = time.perf_counter()
+                reponse = await api.post(url, corps, content_type='application/json', headers=entetes)
+                resultats[etape].append((time.perf_counter() - debut) * 1000)
+                if reponse.status_code != 200:
+                    raise CommandError(f"{mode} {etape}: HTTP {reponse.status_code} {reponse.content[:200]}")
+                if etape == 'accepter' and mode == 'async':
+                    await attendre_taches()
+                    resultats['diffusion'].append((time.perf_counter() - debut) * 1000)
+        if not resultats['diffusion']:
+            del resultats['diffusion']
+        return resultats
@@ -0,0 +1,101 @@
+import asyncio
+import time
+import zlib
+from decimal import Decimal
+from types import SimpleNamespace
+
+import msgpack
+from channels.layers import channel_layers
+from django.core.management.base import BaseCommand
+
+from gestionclappy.canaux import evenement_trame
+from gestionclappy.dispatch import trame_alerte_course
+from gestionclappy.views import ChauffeurConsumer
+
+
+class Command(BaseCommand):
+    help = (
+        "Coût CPU d'une alerte de course diffusée à N chauffeurs connectés: événement "
+        "ré-encodé par chaque consommateur (send_course_alert) contre trame encodée une fois "
+        "(relayer_trame), avec en option le coût d'une compression permessage-deflate par socket."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chauffeurs', type=int, default=1000)
+        parser.add_argument('--alertes', type=int, default=50)
+        parser.add_argument('--alias', default=None,
+                            help="Passer par une couche CHANNEL_LAYERS (défaut: décodage msgpack par socket, "
+                                 "comme les couches partagées, sans le coût propre à la couche)")
+        parser.add_argument('--deflate', action='store_true',
+                            help="Ajouter la compression par socket (un contexte zlib par connexion)")
+
+    def handle(self, *args, **options):
+        course = SimpleNamespace(
+            id=123456, adresse_depart="Carrefour Bambeto, Ratoma, Conakry",
+            adresse_destination="Aéroport international Ahmed Sékou Touré, Gbessia",
+            tarif_estime=Decimal('45000.00'), type_vehicule_demande='economique',
+        )
+        ancien = {
+            "type": "send_course_alert",
+            "message": "Nouvelle course disponible!",
+            "course_id": course.id,
+            "depart": course.adresse_depart,
+            "destination": course.adresse_destination,
+            "tarif_estime": str(course.tarif_estime),
+            "type_vehicule": course.type_vehicule_demande,
+        }
+        self.stdout.write(f"{options['chauffeurs']} chauffeurs, {options['alertes']} alertes")
+        for nom, fabriquer in (
+            ("ré-encodage par socket", lambda: dict(ancien)),
+            ("trame encodée une fois", lambda: evenement_trame(trame_alerte_course(course))),
+        ):
+            cpu, octets = asyncio.run(self.mesurer(fabriquer, options))
+            self.stdout.write(self.style.SUCCESS(
+                f"  {nom}: {cpu * 1000 / options['alertes']:.2f} ms CPU par alerte "
+                f"({cpu * 1e6 / options['alertes'] / options['chauffeurs']:.2f} µs par chauffeur), "
+                f"{octets} octets par trame en moyenne"
+            ))
+
+    async def mesurer(self, fabriquer, options):
+        couche = channel_layers.make_backend(options['alias']) if options['alias'] else None
+        groupe = f"bench_diffusion_{int(time.time())}"
+
+        envoyes = []
+        compresseurs = {}
+
+        def envoi_socket(canal):
+            async def base_send(message):
+                donnees = message.get('text', '')
+                if options['deflate']:
+                    # permessage-deflate: un contexte de compression par connexion
+                    compresseur = compresseurs.setdefault(canal, zlib.compressobj(wbits=-15))
+                    donnees = compresseur.compress(donnees.encode()) + compresseur.flush(zlib.Z_SYNC_FLUSH)
+                envoyes.append(len(donnees))
+            return base_send
+
+        consommateurs = []
+        for numero in range(options['chauffeurs']):
+            canal = await couche.new_channel() if couche else f"socket{numero}"
+            if couche:
+                await couche.group_add(groupe, canal)
+            consommateur = ChauffeurConsumer()
+            consommateur.base_send = envoi_socket(canal)
+            consommateurs.append((canal, consommateur))
+
+        debut = time.process_time()
+        for _ in range(options['alertes']):
+            if couche:
+                await couche.group_send(groupe, fabriquer())
+                for canal, consommateur in consommateurs:
+                    await consommateur.dispatch(await couche.receive(canal))
+            else:
+                # Un encodage à l'envoi, un décodage par socket à la réception
+                donnees = msgpack.packb(fabriquer(), use_bin_type=True)
+                for canal, consommateur in consommateurs:
+                    await consommateur.dispatch(msgpack.unpackb(donnees, raw=False))
+        cpu = time.process_time() - debut
+
+        if couche:
+            for canal, _ in consommateurs:
+                await couche.group_discard(groupe, canal)
+        return cpu, sum(envoyes) // len(envoyes) if envoyes else 0
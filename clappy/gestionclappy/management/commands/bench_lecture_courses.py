@@ -0,0 +1,93 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from gestionclappy.management.commands.bench_channels import _centile
+from gestionclappy.models import Chauffeur, Client, Course, CustomUser
+
+MARQUE = 'bench_lecture'
+
+
+class Command(BaseCommand):
+    help = (
+        "Débit de GET /api/courses/ avec CourseSerializer puis avec le chemin rapide CourseLecture "
+        "(COURSES_LECTURE_RAPIDE); la parité des deux sorties est couverte par les tests. "
+        "Crée des courses variées de test, supprimées à la fin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=2000)
+        parser.add_argument('--tailles-page', default='10,100')
+        parser.add_argument('--repetitions', type=int, default=20)
+
+    def handle(self, *args, **options):
+        client = self.creer_donnees(options['courses'])
+        try:
+            api = APIClient()
+            for taille in [int(t) for t in options['tailles_page'].split(',') if t.strip()]:
+                for rapide in (False, True):
+                    with override_settings(COURSES_LECTURE_RAPIDE=rapide):
+                        latences, requetes = self.mesurer(api, {'page_size': taille, 'client_id': client.id},
+                                                          options['repetitions'])
+                    nom = "CourseLecture  " if rapide else "CourseSerializer"
+                    self.stdout.write(
+                        f"  page de {taille:>3}, {nom}: p50 {_centile(latences, 50):6.1f} ms, "
+                        f"p95 {_centile(latences, 95):6.1f} ms, {requetes} requêtes, "
+                        f"{taille * 1000 / _centile(latences, 50):,.0f} courses/s"
+                    )
+        finally:
+            Course.objects.filter(client=client).delete()
+            CustomUser.objects.filter(username__startswith=f"{MARQUE}_").delete()
+
+    def mesurer(self, api, parametres, repetitions):
+        latences = []
+        for _ in range(repetitions):
+            with CaptureQueriesContext(connection) as requetes:
+                debut = time.perf_counter()
+                reponse = api.get('/api/courses/', parametres)
+                latences.append((time.perf_counter() - debut) * 1000)
+            if reponse.status_code != 200:
+                raise CommandError(f"HTTP {reponse.status_code}")
+        return latences, len(requetes.captured_queries)
+
+    def creer_donnees(self, nombre):
+        aleatoire = random.Random(23)
+        utilisateur = CustomUser.objects.create(username=f"{MARQUE}_client", is_client=True)
+        client = Client.objects.create(utilisateur=utilisateur, telephone="620000000")
+        chauffeurs = [
+            Chauffeur.objects.create(
+                utilisateur=CustomUser.objects.create(username=f"{MARQUE}_chauffeur_{numero}", is_chauffeur=True),
+                telephone="620000001", numero_permis=f"BL{numero}{aleatoire.randrange(10 ** 8)}",
+            )
+            for numero in range(20)
+        ]
+        maintenant = timezone.now()
+        courses = []
+        for numero in range(nombre):
+            chauffeur = aleatoire.choice(chauffeurs) if numero % 3 else None
+            debut = maintenant - timedelta(minutes=aleatoire.randrange(10, 100000)) if chauffeur else None
+            localisee = numero % 4 != 0
+            courses.append(Course(
+                client=client, chauffeur=chauffeur,
+                type_vehicule_demande=aleatoire.choice(['climatiser', 'economique', 'vip', 'moto']),
+                adresse_depart=f"{MARQUE} départ {numero}", adresse_destination=f"Arrivée « {numero} »",
+                latitude_depart=round(aleatoire.uniform(9.4, 9.8), 6) if localisee else None,
+                longitude_depart=round(aleatoire.uniform(-13.8, -13.5), 6) if localisee else None,
+                latitude_destination=round(aleatoire.uniform(-90, 90), 6) if localisee else None,
+                longitude_destination=round(aleatoire.uniform(-180, 180), 6) if localisee else None,
+                tarif_estime=Decimal(aleatoire.randrange(5000, 200000)) / 100,
+                tarif_final=Decimal(aleatoire.randrange(5000, 200000)) if chauffeur and numero % 2 else None,
+                date_debut=debut,
+                date_fin=debut + timedelta(seconds=aleatoire.randrange(60, 7200)) if debut and numero % 2 else None,
+                statut='terminee' if chauffeur else 'demandee',
+                methode_paiement=aleatoire.choice(['especes', 'mobile_money', 'carte_bancaire']),
+            ))
+        Course.objects.bulk_create(courses, batch_size=1000)
+        return client
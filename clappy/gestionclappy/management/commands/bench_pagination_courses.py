@@ -0,0 +1,152 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.test import APIClient
+
+from gestionclappy.courses import courses_visibles
+from gestionclappy.management.commands.bench_channels import _centile
+from gestionclappy.models import Chauffeur, Client, Course, CustomUser, Vehicule
+from gestionclappy.pagination import PaginationCurseur, apres_curseur, decoder_curseur, encoder_curseur
+
+MARQUE = 'bench_pagination'
+TYPES = ['climatiser', 'economique', 'vip', 'moto']
+
+
+class Command(BaseCommand):
+    help = (
+        "Latence des pages de /api/courses/ par numéro de page et par curseur (?pagination=curseur) "
+        "à différentes profondeurs, pour la liste complète, le flux d'un chauffeur et l'historique "
+        "d'un client. Génère --courses courses de test (PostgreSQL), supprimées à la fin sauf --garder."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=1_000_000)
+        parser.add_argument('--clients', type=int, default=100)
+        parser.add_argument('--chauffeurs', type=int, default=50)
+        parser.add_argument('--repetitions', type=int, default=5)
+        parser.add_argument('--profondeurs', default='1,10,1000,50000',
+                            help="Numéros de page mesurés (10 courses par page)")
+        parser.add_argument('--explain', action='store_true', help="Afficher les plans des requêtes par curseur")
+        parser.add_argument('--garder', action='store_true', help="Garder les courses générées pour un autre passage")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Ce benchmark génère les courses avec generate_series (PostgreSQL)")
+        clients, chauffeurs = self.preparer(options)
+        try:
+            api = APIClient()
+            conducteur = Chauffeur.objects.select_related('utilisateur').get(id=chauffeurs[1])
+            scenarios = [
+                ("liste complète", None, {}),
+                ("flux chauffeur", conducteur.utilisateur, {}),
+                ("historique client", None, {'client_id': clients[0]}),
+            ]
+            profondeurs = [int(p) for p in options['profondeurs'].split(',') if p.strip()]
+            for nom, utilisateur, parametres in scenarios:
+                api.force_authenticate(user=utilisateur)
+                base = self.queryset_vue(utilisateur, parametres)
+                total = base.count()
+                self.stdout.write(self.style.SUCCESS(f"{nom}: {total} courses"))
+                mesurees = [page for page in profondeurs if (page - 1) * PaginationCurseur.page_size < total]
+                for page in mesurees:
+                    numero = self.mesurer(api, {**parametres, 'page': page}, options['repetitions'])
+                    curseur = self.curseur_page(base, page)
+                    keyset = self.mesurer(
+                        api, {**parametres, 'pagination': 'curseur', **({'curseur': curseur} if curseur else {})},
+                        options['repetitions']
+                    )
+                    self.stdout.write(
+                        f"  page {page:>6}: numéro p50 {_centile(numero, 50):7.1f} ms | "
+                        f"curseur p50 {_centile(keyset, 50):6.1f} ms"
+                    )
+                if options['explain']:
+                    requete = base.order_by('-date_demande', '-id')
+                    curseur = self.curseur_page(base, mesurees[-1])
+                    if curseur:
+                        requete = apres_curseur(requete, *decoder_curseur(curseur))
+                    self.stdout.write(requete[:11].explain(analyze=True))
+        finally:
+            if not options['garder']:
+                self.nettoyer()
+
+    def queryset_vue(self, utilisateur, parametres):
+        if utilisateur is not None:
+            return courses_visibles(utilisateur)
+        courses = Course.objects.all()
+        if 'client_id' in parametres:
+            courses = courses.filter(client_id=parametres['client_id'])
+        return courses
+
+    def curseur_page(self, queryset, page):
+        """Curseur qui mène à la page `page` (calculé hors chronométrage)"""
+        if page <= 1:
+            return None
+        date, identifiant = queryset.order_by('-date_demande', '-id').values_list('date_demande', 'id')[
+            (page - 1) * PaginationCurseur.page_size - 1
+        ]
+        return encoder_curseur(date, identifiant)
+
+    def mesurer(self, api, parametres, repetitions):
+        latences = []
+        for _ in range(repetitions):
+            debut = time.perf_counter()
+            reponse = api.get('/api/courses/', parametres)
+            latences.append((time.perf_counter() - debut) * 1000)
+            if reponse.status_code != 200:
+                raise CommandError(f"HTTP {reponse.status_code} pour {parametres}")
+        return latences
+
+    def preparer(self, options):
+        clients = list(Client.objects.filter(utilisateur__username__startswith=f"{MARQUE}_client_")
+                       .order_by('id').values_list('id', flat=True))
+        chauffeurs = list(Chauffeur.objects.filter(utilisateur__username__startswith=f"{MARQUE}_chauffeur_")
+                          .order_by('id').values_list('id', flat=True))
+        if not clients:
+            for numero in range(options['clients']):
+                utilisateur = CustomUser.objects.create(username=f"{MARQUE}_client_{numero}", is_client=True)
+                clients.append(Client.objects.create(utilisateur=utilisateur, telephone="620000000").id)
+            for numero in range(options['chauffeurs']):
+                utilisateur = CustomUser.objects.create(username=f"{MARQUE}_chauffeur_{numero}", is_chauffeur=True)
+                chauffeur = Chauffeur.objects.create(
+                    utilisateur=utilisateur, telephone="620000001",
+                    numero_permis=f"BP{uuid.uuid4().hex[:10]}", statut='disponible', est_approuve=True,
+                )
+                Vehicule.objects.create(
+                    chauffeur=chauffeur, marque="Toyota", modele="Corolla", annee=2018,
+                    immatriculation=f"BP{uuid.uuid4().hex[:10]}", couleur="Blanc",
+                    type_vehicule=TYPES[numero % len(TYPES)],
+                )
+                chauffeurs.append(chauffeur.id)
+
+        existantes = Course.objects.filter(adresse_depart=MARQUE).count()
+        if existantes < options['courses']:
+            self.stdout.write(f"Génération de {options['courses'] - existantes} courses...")
+            debut = time.perf_counter()
+            with connection.cursor() as curseur:
+                for lot in range(existantes, options['courses'], 100_000):
+                    # Une course sur 49 reste libre ('demandee', sans chauffeur), les autres sont terminées
+                    curseur.execute(f"""
+                        INSERT INTO {Course._meta.db_table}
+                            (type_vehicule_demande, client_id, chauffeur_id, adresse_depart, adresse_destination,
+                             type_course, date_demande, date_reservation, tarif_estime, statut, methode_paiement,
+                             notes_client, date_modification)
+                        SELECT (%s::varchar[])[1 + g %% 4], (%s::bigint[])[1 + g %% %s],
+                               CASE WHEN g %% 49 = 0 THEN NULL ELSE (%s::bigint[])[1 + g %% %s] END,
+                               %s, %s, 'immediate', now() - g * interval '30 seconds',
+                               now() - g * interval '30 seconds', 25000,
+                               CASE WHEN g %% 49 = 0 THEN 'demandee' ELSE 'terminee' END, 'especes', '',
+                               now() - g * interval '30 seconds'
+                        FROM generate_series(%s, %s) AS g
+                    """, [TYPES, clients, len(clients), chauffeurs, len(chauffeurs), MARQUE, MARQUE,
+                          lot, min(lot + 100_000, options['courses']) - 1])
+                curseur.execute(f"ANALYZE {Course._meta.db_table}")
+            self.stdout.write(f"  {time.perf_counter() - debut:.0f} s")
+        return clients, chauffeurs
+
+    def nettoyer(self):
+        with connection.cursor() as curseur:
+            # Pas de paiements ni d'évaluations sur ces courses: suppression directe, sans collecteur
+            curseur.execute(f"DELETE FROM {Course._meta.db_table} WHERE adresse_depart = %s", [MARQUE])
+        CustomUser.objects.filter(username__startswith=f"{MARQUE}_").delete()
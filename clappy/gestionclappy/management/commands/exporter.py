@@ -0,0 +1,61 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestionclappy.exports import EXPORTS, SORTIES
+from gestionclappy.flux import lots, morceaux
+from gestionclappy.reglages import parametre
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporte les courses, les paiements (avec leur course) ou les positions en CSV ou NDJSON, "
+        "avec les mêmes colonnes et filtres que les actions /exporter/ de l'API. Les lignes sont "
+        "lues par lots avec un curseur côté serveur: mémoire constante quel que soit le volume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=sorted(EXPORTS))
+        parser.add_argument('--sortie', choices=SORTIES, default='csv')
+        parser.add_argument('--du', help="Date ou date-heure ISO de début (incluse)")
+        parser.add_argument('--au', help="Date ou date-heure ISO de fin (incluse, une date couvre la journée)")
+        parser.add_argument('--statut', help="Statut de la course ou du paiement")
+        parser.add_argument('--client-id')
+        parser.add_argument('--chauffeur-id')
+        parser.add_argument('--methode-paiement')
+        parser.add_argument('--operateur', help="Opérateur Mobile Money (paiements)")
+        parser.add_argument('--fichier', '-o', help="Fichier de destination (sortie standard par défaut)")
+        parser.add_argument('--taille-lot', type=int, default=parametre('FLUX_TAILLE_LOT', 2000))
+
+    def handle(self, *args, **options):
+        export = EXPORTS[options['export']]
+        filtres = {filtre: options.get(filtre) for filtre in export.filtres}
+        ignores = [filtre for filtre in ('statut', 'client_id', 'chauffeur_id', 'methode_paiement', 'operateur')
+                   if options.get(filtre) and filtre not in export.filtres]
+        if ignores:
+            raise CommandError(f"Filtre(s) sans objet pour l'export {export.nom}: {', '.join(ignores)}")
+        try:
+            lignes = export.lignes(options['du'], options['au'], **filtres)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        encoder, debut = export.encodeur(options['sortie'])
+        compteur = {'lignes': 0}
+
+        def encoder_et_compter(lot):
+            compteur['lignes'] += len(lot)
+            return encoder(lot)
+
+        depart = time.perf_counter()
+        destination = open(options['fichier'], 'w', encoding='utf-8', newline='') if options['fichier'] else sys.stdout
+        try:
+            for morceau in morceaux(lots(lignes, options['taille_lot']), encoder_et_compter, debut=debut):
+                destination.write(morceau)
+        finally:
+            if options['fichier']:
+                destination.close()
+        # Sur stderr: la sortie standard peut être l'export lui-même
+        self.stderr.write(
+            f"✅ {compteur['lignes']} ligne(s) {export.nom} exportée(s) en {time.perf_counter() - depart:.1f} s"
+        )
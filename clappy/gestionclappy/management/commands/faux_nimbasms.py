@@ -0,0 +1,91 @@
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Serveur NimbaSMS factice (HTTP, keep-alive) pour les tests: répond 201 à "
+        "POST /v1/messages. Lancer avec NIMBASMS_HOTE=127.0.0.1 NIMBASMS_PORT=<port> NIMBASMS_HTTPS=0."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8089)
+        parser.add_argument('--latence-ms', type=int, default=0, help="Délai ajouté à chaque réponse")
+        parser.add_argument('--taux-erreur', type=float, default=0.0, help="Part des requêtes en erreur 503 (0 à 1)")
+        parser.add_argument('--max-destinataires', type=int, default=0,
+                            help="Refuser (400) les requêtes avec plus de destinataires (0: pas de limite)")
+
+    def handle(self, *args, **options):
+        commande = self
+        statistiques = {'requetes': 0, 'messages': 0, 'erreurs': 0, 'connexions': 0}
+        verrou = threading.Lock()
+
+        class Gestionnaire(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                # En-têtes et corps sont écrits séparément: sans TCP_NODELAY, Nagle retarde chaque réponse
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with verrou:
+                    statistiques['connexions'] += 1
+
+            def do_POST(self):
+                corps = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if options['latence_ms']:
+                    time.sleep(options['latence_ms'] / 1000)
+                try:
+                    payload = json.loads(corps)
+                    destinataires = list(payload['to'])
+                except (ValueError, KeyError, TypeError):
+                    return self.repondre(400, {'detail': 'Payload invalide'})
+                if self.path != '/v1/messages':
+                    return self.repondre(404, {'detail': 'Not found'})
+                if options['max_destinataires'] and len(destinataires) > options['max_destinataires']:
+                    return self.repondre(400, {'detail': 'Trop de destinataires'})
+                if random.random() < options['taux_erreur']:
+                    with verrou:
+                        statistiques['erreurs'] += 1
+                    return self.repondre(503, {'detail': 'Service indisponible'})
+
+                with verrou:
+                    statistiques['requetes'] += 1
+                    statistiques['messages'] += len(destinataires)
+                    numero = statistiques['requetes']
+                self.repondre(201, {
+                    'messageid': f'faux-{numero}',
+                    'url': f'/v1/messages/faux-{numero}',
+                    'to': destinataires,
+                })
+
+            def repondre(self, statut, donnees):
+                corps = json.dumps(donnees).encode()
+                self.send_response(statut)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(corps)))
+                self.end_headers()
+                self.wfile.write(corps)
+
+            def log_message(self, format, *args):
+                if commande.verbosity > 1:
+                    commande.stdout.write(format % args)
+
+        self.verbosity = options['verbosity']
+        serveur = ThreadingHTTPServer(('127.0.0.1', options['port']), Gestionnaire)
+        self.stdout.write(self.style.SUCCESS(f"Faux NimbaSMS sur http://127.0.0.1:{options['port']}"))
+        try:
+            serveur.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            serveur.server_close()
+            self.stdout.write(
+                f"{statistiques['requetes']} requêtes, {statistiques['messages']} messages, "
+                f"{statistiques['erreurs']} erreurs simulées, {statistiques['connexions']} connexions"
+            )
@@ -0,0 +1,147 @@
+import asyncio
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Serveur Redis factice (protocole RESP, PUBLISH/SUBSCRIBE) pour les tests multi-workers "
+        "de la couche channels. Lancer les workers avec CHANNELS_BACKEND=redis_pubsub "
+        "REDIS_URL=redis://127.0.0.1:<port>/0. Le backend 'redis' (scripts Lua) n'est pas pris en charge."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=6390)
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        self.abonnes = defaultdict(set)  # canal -> {StreamWriter}
+        self.protocoles = {}  # StreamWriter -> 2 ou 3 (HELLO)
+        self.statistiques = {'connexions': 0, 'publications': 0, 'livraisons': 0}
+        try:
+            asyncio.run(self.servir(options['port']))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stdout.write(
+                f"{self.statistiques['connexions']} connexions, {self.statistiques['publications']} publications, "
+                f"{self.statistiques['livraisons']} livraisons"
+            )
+
+    async def servir(self, port):
+        serveur = await asyncio.start_server(self.client, '127.0.0.1', port)
+        self.stdout.write(self.style.SUCCESS(f"Faux Redis sur redis://127.0.0.1:{port}/0"))
+        async with serveur:
+            await serveur.serve_forever()
+
+    # ---------- Protocole RESP (2, et 3 après HELLO 3 comme redis-py >= 8) ----------
+
+    @staticmethod
+    def encoder(valeur):
+        if valeur is None:
+            return b'$-1\r\n'
+        if isinstance(valeur, int):
+            return b':%d\r\n' % valeur
+        if isinstance(valeur, str):
+            valeur = valeur.encode()
+        if isinstance(valeur, bytes):
+            return b'$%d\r\n%s\r\n' % (len(valeur), valeur)
+        if isinstance(valeur, dict):
+            return b'%%%d\r\n' % len(valeur) + b''.join(
+                Command.encoder(cle) + Command.encoder(element) for cle, element in valeur.items()
+            )
+        return b'*%d\r\n' % len(valeur) + b''.join(Command.encoder(element) for element in valeur)
+
+    def pousser(self, writer, elements):
+        """Trame pub/sub: tableau en RESP2, type « push » en RESP3"""
+        trame = self.encoder(elements)
+        if self.protocoles.get(writer) == 3:
+            trame = b'>' + trame[1:]
+        writer.write(trame)
+
+    @staticmethod
+    async def lire_commande(reader):
+        ligne = await reader.readline()
+        if not ligne:
+            return None
+        if not ligne.startswith(b'*'):
+            # Commande "inline" (redis-cli, telnet)
+            return ligne.split()
+        arguments = []
+        for _ in range(int(ligne[1:])):
+            entete = await reader.readline()
+            taille = int(entete[1:])
+            arguments.append((await reader.readexactly(taille + 2))[:-2])
+        return arguments
+
+    async def client(self, reader, writer):
+        self.statistiques['connexions'] += 1
+        abonnements = set()
+        self.protocoles[writer] = 2
+        try:
+            while True:
+                commande = await self.lire_commande(reader)
+                if commande is None:
+                    break
+                if not commande:
+                    continue
+                nom = commande[0].upper()
+                arguments = commande[1:]
+
+                if nom == b'HELLO':
+                    protocole = int(arguments[0]) if arguments else self.protocoles[writer]
+                    if protocole not in (2, 3):
+                        writer.write(b'-NOPROTO unsupported protocol version\r\n')
+                    else:
+                        self.protocoles[writer] = protocole
+                        infos = {b'server': b'redis', b'version': b'7.2.0', b'proto': protocole, b'id': id(writer),
+                                 b'mode': b'standalone', b'role': b'master', b'modules': []}
+                        if protocole == 2:
+                            infos = [element for paire in infos.items() for element in paire]
+                        writer.write(self.encoder(infos))
+                elif nom == b'PING':
+                    if abonnements:
+                        self.pousser(writer, [b'pong', arguments[0] if arguments else b''])
+                    else:
+                        writer.write(b'+PONG\r\n')
+                elif nom in (b'SELECT', b'AUTH', b'CLIENT', b'FLUSHALL', b'FLUSHDB'):
+                    writer.write(b'+OK\r\n')
+                elif nom == b'PUBLISH':
+                    canal, message = arguments
+                    destinataires = list(self.abonnes.get(canal, ()))
+                    for destinataire in destinataires:
+                        self.pousser(destinataire, [b'message', canal, message])
+                    self.statistiques['publications'] += 1
+                    self.statistiques['livraisons'] += len(destinataires)
+                    writer.write(self.encoder(len(destinataires)))
+                elif nom == b'SUBSCRIBE':
+                    for canal in arguments:
+                        abonnements.add(canal)
+                        self.abonnes[canal].add(writer)
+                        self.pousser(writer, [b'subscribe', canal, len(abonnements)])
+                elif nom == b'UNSUBSCRIBE':
+                    for canal in arguments or list(abonnements):
+                        abonnements.discard(canal)
+                        self._desabonner(canal, writer)
+                        self.pousser(writer, [b'unsubscribe', canal, len(abonnements)])
+                elif nom == b'QUIT':
+                    writer.write(b'+OK\r\n')
+                    break
+                else:
+                    writer.write(b"-ERR unknown command '%s'\r\n" % nom.lower())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for canal in abonnements:
+                self._desabonner(canal, writer)
+            self.protocoles.pop(writer, None)
+            writer.close()
+
+    def _desabonner(self, canal, writer):
+        abonnes = self.abonnes.get(canal)
+        if abonnes is not None:
+            abonnes.discard(writer)
+            if not abonnes:
+                del self.abonnes[canal]
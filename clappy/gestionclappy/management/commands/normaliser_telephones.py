@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from gestionclappy.models import Chauffeur, Client, CustomUser
+from gestionclappy.telephones import normaliser_telephone
+
+
+class Command(BaseCommand):
+    help = (
+        "Renseigne telephone_e164 pour les clients, chauffeurs et utilisateurs existants "
+        "(les nouveaux enregistrements le sont à l'écriture)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taille-lot', type=int, default=1000)
+        parser.add_argument('--tous', action='store_true',
+                            help="Recalculer aussi les numéros déjà normalisés")
+
+    def handle(self, *args, **options):
+        for modele in (Client, Chauffeur, CustomUser):
+            queryset = modele.objects.exclude(telephone__isnull=True).exclude(telephone='')
+            if not options['tous']:
+                queryset = queryset.filter(telephone_e164__isnull=True)
+
+            modifies, invalides, lot = 0, [], []
+            for instance in queryset.only('id', 'telephone', 'telephone_e164').iterator(chunk_size=options['taille_lot']):
+                e164 = normaliser_telephone(instance.telephone)
+                if e164 is None:
+                    invalides.append(instance.telephone)
+                if e164 != instance.telephone_e164:
+                    instance.telephone_e164 = e164
+                    lot.append(instance)
+                if len(lot) >= options['taille_lot']:
+                    modifies += modele.objects.bulk_update(lot, ['telephone_e164'])
+                    lot = []
+            if lot:
+                modifies += modele.objects.bulk_update(lot, ['telephone_e164'])
+
+            self.stdout.write(self.style.SUCCESS(
+                f"{modele._meta.verbose_name_plural}: {modifies} numéros normalisés"
+            ))
+            for telephone in invalides:
+                self.stdout.write(self.style.WARNING(f"  Numéro invalide, laissé sans forme E.164: {telephone}"))
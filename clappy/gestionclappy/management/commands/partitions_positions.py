@@ -0,0 +1,186 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from gestionclappy.models import HistoriquePosition, TracePosition
+from gestionclappy.reglages import parametre
+
+TABLE = 'gestionclappy_historiqueposition'
+DEFAUT = f'{TABLE}_defaut'
+COLONNES = 'id, chauffeur_id, latitude, longitude, date_position'
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintient les partitions de HistoriquePosition (PostgreSQL): crée les partitions "
+        "à venir, résume puis supprime (ou archive) celles au-delà de la rétention."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--granularite', choices=['jour', 'semaine'],
+            default=parametre('POSITIONS_PARTITION_GRANULARITE', 'jour'),
+            help="Taille d'une partition"
+        )
+        parser.add_argument(
+            '--avance', type=int, default=3,
+            help="Nombre de partitions futures à créer à l'avance"
+        )
+        parser.add_argument(
+            '--retention-jours', type=int,
+            default=parametre('POSITIONS_RETENTION_JOURS', 30),
+            help="Âge au-delà duquel l'historique détaillé est résumé puis supprimé"
+        )
+        parser.add_argument(
+            '--resume-minutes', type=int,
+            default=parametre('POSITIONS_TRACE_RESUME_MINUTES', 5),
+            help="Intervalle des positions moyennes conservées dans TracePosition"
+        )
+        parser.add_argument(
+            '--archiver', action='store_true',
+            help="Détacher les anciennes partitions (tables *_archive_*) au lieu de les supprimer"
+        )
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(days=options['retention_jours'])
+        pas = 1 if options['granularite'] == 'jour' else 7
+
+        if connection.vendor != 'postgresql':
+            # Sans partitionnement: résumé puis suppression ligne à ligne
+            self.resumer(None, limite, options['resume_minutes'])
+            supprimees, _ = HistoriquePosition.objects.filter(date_position__lt=limite).delete()
+            self.stdout.write(self.style.SUCCESS(f"{supprimees} positions supprimées (avant {limite:%Y-%m-%d})"))
+            return
+
+        # 1. Partitions de la plus ancienne donnée non partitionnée jusqu'à maintenant + avance
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT MIN(date_position) FROM {DEFAUT}")
+            plus_ancienne = cursor.fetchone()[0]
+        debut = self.debut_periode(min(plus_ancienne or timezone.now(), timezone.now()), pas)
+        fin = self.debut_periode(timezone.now(), pas) + timedelta(days=pas * (options['avance'] + 1))
+        existantes = {nom for nom, _, _ in self.partitions()}
+        while debut < fin:
+            nom = self.nom_partition(debut)
+            if nom not in existantes:
+                self.creer_partition(nom, debut, debut + timedelta(days=pas))
+                self.stdout.write(f"Partition créée: {nom}")
+            debut += timedelta(days=pas)
+
+        # 2. Partitions entièrement plus anciennes que la rétention
+        for nom, borne_basse, borne_haute in self.partitions():
+            if borne_haute > limite:
+                continue
+            self.resumer(borne_basse, borne_haute, options['resume_minutes'])
+            with connection.cursor() as cursor:
+                cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {nom}")
+                if options['archiver']:
+                    cursor.execute(f"ALTER TABLE {nom} RENAME TO {nom.replace('_p', '_archive_', 1)}")
+                    self.stdout.write(f"Partition archivée: {nom}")
+                else:
+                    cursor.execute(f"DROP TABLE {nom}")
+                    self.stdout.write(f"Partition supprimée: {nom}")
+
+        self.stdout.write(self.style.SUCCESS("Maintenance des partitions terminée"))
+
+    @staticmethod
+    def debut_periode(moment, pas):
+        jour = moment.astimezone(dt_timezone.utc).date()
+        if pas == 7:
+            jour -= timedelta(days=jour.weekday())
+        return datetime.combine(jour, time.min, tzinfo=dt_timezone.utc)
+
+    @staticmethod
+    def nom_partition(debut):
+        return f"{TABLE}_p{debut:%Y%m%d}"
+
+    @staticmethod
+    def partitions():
+        """Partitions datées existantes: [(nom, borne_basse, borne_haute)]"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT enfant.relname
+                FROM pg_inherits
+                JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                JOIN pg_class enfant ON enfant.oid = pg_inherits.inhrelid
+                WHERE parent.relname = %s AND enfant.relname LIKE %s
+                ORDER BY enfant.relname
+                """,
+                [TABLE, f'{TABLE}\\_p%']
+            )
+            noms = [ligne[0] for ligne in cursor.fetchall()]
+        resultat = []
+        for nom in noms:
+            jour = datetime.strptime(nom.rsplit('_p', 1)[1], '%Y%m%d').replace(tzinfo=dt_timezone.utc)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_get_expr(relpartbound, oid) FROM pg_class WHERE relname = %s", [nom]
+                )
+                # FOR VALUES FROM ('2026-01-01 00:00:00+00') TO ('2026-01-02 00:00:00+00')
+                borne = cursor.fetchone()[0]
+            haute = borne.split("TO ('", 1)[1].split("'", 1)[0]
+            resultat.append((nom, jour, datetime.fromisoformat(haute.replace('+00', '+00:00'))))
+        return resultat
+
+    @staticmethod
+    def creer_partition(nom, debut, fin):
+        """
+        Créer une partition; les lignes déjà tombées dans la partition par défaut
+        pour cette plage y sont déplacées (sinon PostgreSQL refuse la création).
+        """
+        bornes = f"FOR VALUES FROM ('{debut.isoformat()}') TO ('{fin.isoformat()}')"
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT EXISTS (SELECT 1 FROM {DEFAUT} WHERE date_position >= %s AND date_position < %s)",
+                [debut, fin]
+            )
+            if not cursor.fetchone()[0]:
+                cursor.execute(f"CREATE TABLE {nom} PARTITION OF {TABLE} {bornes}")
+                return
+            cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {DEFAUT}")
+            cursor.execute(f"CREATE TABLE {nom} PARTITION OF {TABLE} {bornes}")
+            cursor.execute(
+                f"INSERT INTO {TABLE} ({COLONNES}) SELECT {COLONNES} FROM {DEFAUT} "
+                "WHERE date_position >= %s AND date_position < %s",
+                [debut, fin]
+            )
+            cursor.execute(
+                f"DELETE FROM {DEFAUT} WHERE date_position >= %s AND date_position < %s", [debut, fin]
+            )
+            cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {DEFAUT} DEFAULT")
+
+    def resumer(self, debut, fin, minutes):
+        """Une position moyenne par chauffeur et par intervalle de `minutes` dans TracePosition"""
+        positions = HistoriquePosition.objects.filter(date_position__lt=fin)
+        if debut is not None:
+            positions = positions.filter(date_position__gte=debut)
+
+        intervalle = timedelta(minutes=minutes)
+        origine = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+        traces = {}
+        for chauffeur_id, latitude, longitude, date_position in positions.order_by().values_list(
+                'chauffeur_id', 'latitude', 'longitude', 'date_position').iterator(chunk_size=5000):
+            tranche = origine + intervalle * ((date_position - origine) // intervalle)
+            cumul = traces.setdefault((chauffeur_id, tranche), [0, 0.0, 0.0])
+            cumul[0] += 1
+            cumul[1] += float(latitude)
+            cumul[2] += float(longitude)
+
+        TracePosition.objects.bulk_create(
+            [
+                TracePosition(
+                    chauffeur_id=chauffeur_id,
+                    date_debut=tranche,
+                    latitude=round(somme_lat / nombre, 6),
+                    longitude=round(somme_lon / nombre, 6),
+                    nombre_points=nombre
+                )
+                for (chauffeur_id, tranche), (nombre, somme_lat, somme_lon) in traces.items()
+            ],
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+        if traces:
+            self.stdout.write(f"{len(traces)} traces résumées")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from gestionclappy.positions import get_index
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index des positions en direct des chauffeurs depuis HistoriquePosition"
+
+    def handle(self, *args, **options):
+        nombre = get_index().reconstruire()
+        self.stdout.write(self.style.SUCCESS(f"Index reconstruit: {nombre} chauffeurs positionnés"))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gestionclappy.reglages import parametre
+
+
+class Command(BaseCommand):
+    help = (
+        "Lance l'application ASGI (HTTP + WebSocket) avec uvicorn. La compression "
+        "permessage-deflate se négocie au niveau du serveur: WEBSOCKET_PERMESSAGE_DEFLATE "
+        "ou --deflate / --sans-deflate."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hote', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8000)
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Processus workers (au-delà de 1, une couche channels partagée est nécessaire)")
+        compression = parser.add_mutually_exclusive_group()
+        compression.add_argument('--deflate', dest='deflate', action='store_true', default=None)
+        compression.add_argument('--sans-deflate', dest='deflate', action='store_false')
+
+    def handle(self, *args, **options):
+        try:
+            import uvicorn
+        except ImportError:
+            raise CommandError("uvicorn n'est pas installé (pip install uvicorn websockets)")
+
+        from gestionclappy.canaux import couche_partagee
+
+        if options['workers'] > 1 and not couche_partagee():
+            self.stdout.write(self.style.WARNING(
+                "Couche channels en mémoire: les groupes ne seront pas partagés entre workers "
+                "(définir REDIS_URL ou CHANNELS_BACKEND)"
+            ))
+
+        deflate = options['deflate']
+        if deflate is None:
+            deflate = parametre('WEBSOCKET_PERMESSAGE_DEFLATE', False)
+        self.stdout.write(
+            f"ASGI sur http://{options['hote']}:{options['port']} ({options['workers']} worker(s), "
+            f"permessage-deflate {'activé' if deflate else 'désactivé'})"
+        )
+        uvicorn.run(
+            'clappy.asgi:application',
+            host=options['hote'],
+            port=options['port'],
+            workers=options['workers'],
+            ws='websockets-sansio',
+            ws_per_message_deflate=deflate,
+        )
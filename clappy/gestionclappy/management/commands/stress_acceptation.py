@@ -0,0 +1,118 @@
+import threading
+import time
+import uuid
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from gestionclappy.courses import accepter_course
+from gestionclappy.management.commands.bench_channels import _centile
+from gestionclappy.models import Chauffeur, Client, Course, CustomUser, NotificationSortante
+
+
+class Command(BaseCommand):
+    help = (
+        "Test de concurrence de l'acceptation: N chauffeurs acceptent la même course au même instant, "
+        "depuis N threads (une connexion à la base chacun). Vérifie qu'il y a exactement un gagnant "
+        "par course et que les autres reçoivent 409. Crée des données temporaires, supprimées à la fin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chauffeurs', type=int, default=20, help="Chauffeurs concurrents par course")
+        parser.add_argument('--tours', type=int, default=10, help="Nombre de courses disputées")
+        parser.add_argument('--via', choices=['api', 'service'], default='api',
+                            help="POST /api/courses/<id>/accepter/ ou appel direct de accepter_course")
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            raise CommandError("SQLite sérialise les écritures: lancer ce test sur PostgreSQL")
+        marque = uuid.uuid4().hex[:8]
+        client, chauffeurs = self.creer_donnees(marque, options['chauffeurs'])
+        anomalies = 0
+        latences = []
+        try:
+            for _ in range(options['tours']):
+                Chauffeur.objects.filter(id__in=[c.id for c in chauffeurs]).update(statut='disponible')
+                course = Course.objects.create(
+                    client=client, type_vehicule_demande='economique',
+                    adresse_depart=f"stress {marque}", adresse_destination=f"stress {marque}",
+                    tarif_estime=Decimal('25000'), methode_paiement='especes',
+                )
+                reponses = self.disputer(course.id, chauffeurs, client.utilisateur, options['via'])
+                latences.extend(duree for _, duree in reponses)
+                codes = Counter(code for code, _ in reponses)
+
+                course.refresh_from_db()
+                en_course = Chauffeur.objects.filter(id__in=[c.id for c in chauffeurs], statut='en_course').count()
+                correct = (
+                    codes.get(200) == 1 and codes.get(409, 0) == len(chauffeurs) - 1
+                    and course.statut == 'acceptee' and course.chauffeur_id is not None and en_course == 1
+                )
+                anomalies += not correct
+                ligne = (f"course {course.id}: {dict(codes)}, gagnant {course.chauffeur_id}, "
+                         f"{en_course} chauffeur(s) en course")
+                self.stdout.write(self.style.SUCCESS(f"  ✅ {ligne}") if correct else self.style.ERROR(f"  ❌ {ligne}"))
+        finally:
+            self.nettoyer(marque, client)
+
+        self.stdout.write(
+            f"{options['tours']} courses x {options['chauffeurs']} chauffeurs: "
+            f"p50 {_centile(latences, 50):.1f} ms, p95 {_centile(latences, 95):.1f} ms, "
+            f"max {max(latences):.1f} ms"
+        )
+        if anomalies:
+            raise CommandError(f"{anomalies} course(s) sans gagnant unique")
+        self.stdout.write(self.style.SUCCESS("Un seul gagnant par course"))
+
+    def creer_donnees(self, marque, nombre):
+        utilisateur = CustomUser.objects.create_user(username=f"stress_client_{marque}", password=marque, is_client=True)
+        client = Client.objects.create(utilisateur=utilisateur, telephone="620000000")
+        chauffeurs = []
+        for numero in range(nombre):
+            utilisateur = CustomUser.objects.create_user(
+                username=f"stress_chauffeur_{marque}_{numero}", password=marque, is_chauffeur=True
+            )
+            chauffeurs.append(Chauffeur.objects.create(
+                utilisateur=utilisateur, telephone="620000000", numero_permis=f"ST{marque}{numero}",
+                statut='disponible', est_approuve=True,
+            ))
+        return client, chauffeurs
+
+    def disputer(self, course_id, chauffeurs, utilisateur, via):
+        """Tous les threads partent ensemble; retourne [(code HTTP, durée ms)]"""
+        depart = threading.Barrier(len(chauffeurs))
+        reponses = []
+        verrou = threading.Lock()
+        url = reverse('course-accepter', args=[course_id])
+
+        def accepter(chauffeur_id):
+            try:
+                api = APIClient()
+                api.force_authenticate(user=utilisateur)
+                depart.wait()
+                debut = time.perf_counter()
+                if via == 'api':
+                    code = api.post(url, {'chauffeur_id': chauffeur_id}, format='json').status_code
+                else:
+                    code = {'acceptee': 200, 'deja_prise': 409}.get(accepter_course(course_id, chauffeur_id), 404)
+                with verrou:
+                    reponses.append((code, (time.perf_counter() - debut) * 1000))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=accepter, args=(c.id,)) for c in chauffeurs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return reponses
+
+    def nettoyer(self, marque, client):
+        courses = Course.objects.filter(client=client)
+        NotificationSortante.objects.filter(course__in=courses).delete()
+        courses.delete()
+        CustomUser.objects.filter(username__startswith="stress_").filter(username__contains=marque).delete()
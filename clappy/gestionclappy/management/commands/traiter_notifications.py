@@ -0,0 +1,77 @@
+import signal
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from gestionclappy.models import NotificationSortante
+from gestionclappy.notifications import traiter_lot, websocket_traitable
+from gestionclappy.reglages import parametre
+
+
+class Command(BaseCommand):
+    help = (
+        "Envoie les notifications en file (NotificationSortante): reprises avec backoff "
+        "exponentiel, passage en 'abandonnee' après NOTIFICATIONS_MAX_TENTATIVES échecs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--boucle', action='store_true', help="Tourner en continu au lieu d'un seul passage")
+        parser.add_argument(
+            '--intervalle', type=float, default=parametre('NOTIFICATIONS_INTERVALLE_SECONDES', 2),
+            help="Pause entre deux passages quand la file est vide (avec --boucle)"
+        )
+        parser.add_argument(
+            '--concurrence', type=int, default=parametre('NOTIFICATIONS_TAILLE_LOT', 100),
+            help="Nombre maximal de notifications envoyées simultanément"
+        )
+        parser.add_argument(
+            '--types', default=None,
+            help="Types traités, séparés par des virgules (défaut: sms et dispatch, plus websocket si la couche "
+                 "channels est partagée)"
+        )
+        parser.add_argument(
+            '--purger-jours', type=int, default=None,
+            help="Supprimer les notifications envoyées depuis plus de N jours"
+        )
+
+    def handle(self, *args, **options):
+        if options['types']:
+            types = [t.strip() for t in options['types'].split(',') if t.strip()]
+        else:
+            types = ['sms', 'websocket', 'dispatch'] if websocket_traitable() else ['sms', 'dispatch']
+
+        if options['purger_jours'] is not None:
+            limite = timezone.now() - timedelta(days=options['purger_jours'])
+            supprimees, _ = NotificationSortante.objects.filter(statut='envoyee', date_envoi__lt=limite).delete()
+            self.stdout.write(f"{supprimees} notifications envoyées purgées")
+
+        self.arret = False
+        if options['boucle']:
+            signal.signal(signal.SIGTERM, self.arreter)
+            signal.signal(signal.SIGINT, self.arreter)
+
+        self.stdout.write(f"Traitement des notifications: {', '.join(types)}")
+        total = 0
+        while True:
+            traitees = traiter_lot(options['concurrence'], types)
+            total += traitees
+            if traitees:
+                continue
+            if not options['boucle'] or self.arret:
+                break
+            close_old_connections()
+            time.sleep(options['intervalle'])
+            if self.arret:
+                break
+
+        restantes = NotificationSortante.objects.filter(statut__in=['en_attente', 'en_cours']).count()
+        abandonnees = NotificationSortante.objects.filter(statut='abandonnee').count()
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} notifications traitées; {restantes} en file, {abandonnees} abandonnées"
+        ))
+
+    def arreter(self, *args):
+        self.arret = True
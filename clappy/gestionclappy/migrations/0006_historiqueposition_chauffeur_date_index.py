@@ -0,0 +1,17 @@
+# Generated by Django 5.1 on 2026-10-18 00:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionclappy', '0005_alter_course_date_reservation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historiqueposition',
+            index=models.Index(fields=['chauffeur', '-date_position'], name='histpos_chauffeur_date_idx'),
+        ),
+    ]
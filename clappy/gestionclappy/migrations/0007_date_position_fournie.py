@@ -0,0 +1,19 @@
+# Generated by Django 5.1 on 2026-10-18 01:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionclappy', '0006_historiqueposition_chauffeur_date_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='historiqueposition',
+            name='date_position',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Date de position'),
+        ),
+    ]
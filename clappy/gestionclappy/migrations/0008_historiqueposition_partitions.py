@@ -0,0 +1,95 @@
+# Generated by Django 5.1 on 2026-10-18 00:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TABLE = 'gestionclappy_historiqueposition'
+
+# Sur PostgreSQL, HistoriquePosition devient une table partitionnée par plage
+# de date_position. La clé primaire doit inclure la clé de partition: (id, date_position).
+# Les partitions journalières/hebdomadaires sont gérées par la commande partitions_positions.
+PARTITIONNER = [
+    f"ALTER TABLE {TABLE} RENAME TO {TABLE}_ancienne",
+    "ALTER INDEX histpos_chauffeur_date_idx RENAME TO histpos_chauffeur_date_idx_ancien",
+    f"CREATE SEQUENCE {TABLE}_part_id_seq",
+    f"""CREATE TABLE {TABLE} (
+        id bigint NOT NULL DEFAULT nextval('{TABLE}_part_id_seq'),
+        latitude numeric(9, 6) NOT NULL,
+        longitude numeric(9, 6) NOT NULL,
+        date_position timestamp with time zone NOT NULL,
+        chauffeur_id bigint NOT NULL REFERENCES gestionclappy_chauffeur (id) DEFERRABLE INITIALLY DEFERRED,
+        PRIMARY KEY (id, date_position)
+    ) PARTITION BY RANGE (date_position)""",
+    f"CREATE TABLE {TABLE}_defaut PARTITION OF {TABLE} DEFAULT",
+    f"CREATE INDEX histpos_chauffeur_date_idx ON {TABLE} (chauffeur_id, date_position DESC)",
+    f"""INSERT INTO {TABLE} (id, latitude, longitude, date_position, chauffeur_id)
+        SELECT id, latitude, longitude, date_position, chauffeur_id FROM {TABLE}_ancienne""",
+    f"SELECT setval('{TABLE}_part_id_seq', COALESCE((SELECT MAX(id) FROM {TABLE}), 0) + 1, false)",
+    f"ALTER SEQUENCE {TABLE}_part_id_seq OWNED BY {TABLE}.id",
+    f"DROP TABLE {TABLE}_ancienne",
+]
+
+DEPARTITIONNER = [
+    f"ALTER TABLE {TABLE} RENAME TO {TABLE}_partitionnee",
+    "ALTER INDEX histpos_chauffeur_date_idx RENAME TO histpos_chauffeur_date_idx_partitionne",
+    f"""CREATE TABLE {TABLE} (
+        id bigint NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+        latitude numeric(9, 6) NOT NULL,
+        longitude numeric(9, 6) NOT NULL,
+        date_position timestamp with time zone NOT NULL,
+        chauffeur_id bigint NOT NULL REFERENCES gestionclappy_chauffeur (id) DEFERRABLE INITIALLY DEFERRED
+    )""",
+    f"CREATE INDEX {TABLE}_chauffeur_id ON {TABLE} (chauffeur_id)",
+    f"CREATE INDEX histpos_chauffeur_date_idx ON {TABLE} (chauffeur_id, date_position DESC)",
+    f"""INSERT INTO {TABLE} (id, latitude, longitude, date_position, chauffeur_id)
+        OVERRIDING SYSTEM VALUE
+        SELECT id, latitude, longitude, date_position, chauffeur_id FROM {TABLE}_partitionnee""",
+    f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), COALESCE((SELECT MAX(id) FROM {TABLE}), 0) + 1, false)",
+    f"DROP TABLE {TABLE}_partitionnee CASCADE",
+]
+
+
+def partitionner(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for requete in PARTITIONNER:
+        schema_editor.execute(requete)
+
+
+def departitionner(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for requete in DEPARTITIONNER:
+        schema_editor.execute(requete)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionclappy', '0007_date_position_fournie'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TracePosition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_debut', models.DateTimeField(verbose_name="Début de l'intervalle")),
+                ('latitude', models.DecimalField(decimal_places=6, max_digits=9, verbose_name='Latitude moyenne')),
+                ('longitude', models.DecimalField(decimal_places=6, max_digits=9, verbose_name='Longitude moyenne')),
+                ('nombre_points', models.IntegerField(default=1, verbose_name='Nombre de points résumés')),
+                ('chauffeur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='gestionclappy.chauffeur', verbose_name='Chauffeur')),
+            ],
+            options={
+                'verbose_name': 'Trace de position',
+                'verbose_name_plural': 'Traces de position',
+                'ordering': ['chauffeur', 'date_debut'],
+                'constraints': [models.UniqueConstraint(fields=('chauffeur', 'date_debut'), name='traceposition_chauffeur_debut_uniq')],
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='historiqueposition',
+            options={'verbose_name': 'Historique de position', 'verbose_name_plural': 'Historiques de position'},
+        ),
+        migrations.RunPython(partitionner, departitionner),
+    ]
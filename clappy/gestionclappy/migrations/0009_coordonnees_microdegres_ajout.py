@@ -0,0 +1,42 @@
+# Coordonnées en microdegrés (1/3): nouvelles colonnes entières à côté des DecimalField
+
+from django.db import migrations, models
+
+import gestionclappy.fields
+
+# (modèle, champ, nullable, verbose_name, max_digits, decimal_places)
+CHAMPS = [
+    ('historiqueposition', 'latitude', False, 'Latitude', 9, 6),
+    ('historiqueposition', 'longitude', False, 'Longitude', 9, 6),
+    ('traceposition', 'latitude', False, 'Latitude moyenne', 9, 6),
+    ('traceposition', 'longitude', False, 'Longitude moyenne', 9, 6),
+]
+
+
+def _operations():
+    operations = []
+    for modele, champ, nullable, verbose_name, max_digits, decimal_places in CHAMPS:
+        # L'ancienne colonne devient nullable pour que la conversion soit réversible
+        operations.append(migrations.AlterField(
+            model_name=modele,
+            name=champ,
+            field=models.DecimalField(
+                max_digits=max_digits, decimal_places=decimal_places,
+                null=True, blank=nullable, verbose_name=verbose_name
+            ),
+        ))
+        operations.append(migrations.AddField(
+            model_name=modele,
+            name=f'{champ}_micro',
+            field=gestionclappy.fields.CoordonneeField(null=True, blank=nullable, verbose_name=verbose_name),
+        ))
+    return operations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionclappy', '0008_historiqueposition_partitions'),
+    ]
+
+    operations = _operations()
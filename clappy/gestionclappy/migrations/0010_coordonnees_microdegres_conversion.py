@@ -0,0 +1,45 @@
+# Coordonnées en microdegrés (2/3): copie des valeurs existantes, directement en SQL
+
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Cast, Round
+
+ECHELLE = 1_000_000
+
+# (modèle, champ, max_digits, decimal_places)
+CHAMPS = [
+    ('historiqueposition', 'latitude', 9, 6),
+    ('historiqueposition', 'longitude', 9, 6),
+    ('traceposition', 'latitude', 9, 6),
+    ('traceposition', 'longitude', 9, 6),
+]
+
+
+def vers_microdegres(apps, schema_editor):
+    for modele, champ, _, _ in CHAMPS:
+        Modele = apps.get_model('gestionclappy', modele)
+        Modele.objects.update(**{
+            f'{champ}_micro': Cast(Round(F(champ) * ECHELLE), models.IntegerField())
+        })
+
+
+def vers_degres(apps, schema_editor):
+    for modele, champ, max_digits, decimal_places in CHAMPS:
+        Modele = apps.get_model('gestionclappy', modele)
+        Modele.objects.update(**{
+            champ: Cast(
+                Cast(F(f'{champ}_micro'), models.DecimalField(max_digits=15, decimal_places=6)) / ECHELLE,
+                models.DecimalField(max_digits=max_digits, decimal_places=decimal_places)
+            )
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionclappy', '0009_coordonnees_microdegres_ajout'),
+    ]
+
+    operations = [
+        migrations.RunPython(vers_microdegres, vers_degres),
+    ]
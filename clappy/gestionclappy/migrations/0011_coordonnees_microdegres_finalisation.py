@@ -0,0 +1,35 @@
+# Coordonnées en microdegrés (3/3): les colonnes entières remplacent les DecimalField
+
+from django.db import migrations
+
+import gestionclappy.fields
+
+# (modèle, champ, nullable, verbose_name)
+CHAMPS = [
+    ('historiqueposition', 'latitude', False, 'Latitude'),
+    ('historiqueposition', 'longitude', False, 'Longitude'),
+    ('traceposition', 'latitude', False, 'Latitude moyenne'),
+    ('traceposition', 'longitude', False, 'Longitude moyenne'),
+]
+
+
+def _operations():
+    operations = []
+    for modele, champ, nullable, verbose_name in CHAMPS:
+        operations.append(migrations.RemoveField(model_name=modele, name=champ))
+        operations.append(migrations.RenameField(model_name=modele, old_name=f'{champ}_micro', new_name=champ))
+        operations.append(migrations.AlterField(
+            model_name=modele,
+            name=champ,
+            field=gestionclappy.fields.CoordonneeField(null=nullable, blank=nullable, verbose_name=verbose_name),
+        ))
+    return operations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionclappy', '0010_coordonnees_microdegres_conversion'),
+    ]
+
+    operations = _operations()
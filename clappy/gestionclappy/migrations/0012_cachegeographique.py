@@ -0,0 +1,29 @@
+# Generated by Django 5.1 on 2026-10-18 00:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionclappy', '0011_coordonnees_microdegres_finalisation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheGeographique',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cle', models.CharField(max_length=255, unique=True, verbose_name='Clé')),
+                ('type_requete', models.CharField(choices=[('geocodage', 'Géocodage'), ('itineraire', 'Itinéraire')], max_length=15, verbose_name='Type de requête')),
+                ('valeur', models.JSONField(verbose_name='Valeur')),
+                ('nombre_hits', models.PositiveIntegerField(default=0, verbose_name="Nombre d'utilisations")),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('date_expiration', models.DateTimeField(db_index=True, verbose_name="Date d'expiration")),
+            ],
+            options={
+                'verbose_name': 'Cache géographique',
+                'verbose_name_plural': 'Cache géographique',
+            },
+        ),
+    ]
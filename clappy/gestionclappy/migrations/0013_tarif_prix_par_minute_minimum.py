@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-18 00:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionclappy', '0012_cachegeographique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarif',
+            name='prix_par_minute',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8, verbose_name='Prix par minute (GNF)'),
+        ),
+        migrations.AddField(
+            model_name='tarif',
+            name='tarif_minimum',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Tarif minimum (GNF)'),
+        ),
+    ]
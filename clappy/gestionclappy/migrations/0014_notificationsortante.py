@@ -0,0 +1,36 @@
+# Generated by Django 5.1 on 2026-10-18 00:57
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionclappy', '0013_tarif_prix_par_minute_minimum'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationSortante',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_notification', models.CharField(choices=[('sms', 'SMS'), ('websocket', 'WebSocket'), ('dispatch', 'Vague de dispatch')], max_length=15, verbose_name='Type de notification')),
+                ('destinataire', models.CharField(max_length=255, verbose_name='Destinataire')),
+                ('payload', models.JSONField(verbose_name='Contenu')),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('envoyee', 'Envoyée'), ('abandonnee', 'Abandonnée')], default='en_attente', max_length=15, verbose_name='Statut')),
+                ('tentatives', models.PositiveSmallIntegerField(default=0, verbose_name='Tentatives')),
+                ('prochaine_tentative', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Prochaine tentative')),
+                ('derniere_erreur', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('date_envoi', models.DateTimeField(blank=True, null=True, verbose_name="Date d'envoi")),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='gestionclappy.course', verbose_name='Course')),
+            ],
+            options={
+                'verbose_name': 'Notification sortante',
+                'verbose_name_plural': 'Notifications sortantes',
+                'indexes': [models.Index(fields=['statut', 'prochaine_tentative'], name='notif_statut_prochaine_idx')],
+            },
+        ),
+    ]
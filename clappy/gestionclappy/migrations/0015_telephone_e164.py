@@ -0,0 +1,28 @@
+# Generated by Django 5.1 on 2026-10-18 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionclappy', '0014_notificationsortante'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chauffeur',
+            name='telephone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16, null=True, verbose_name='Téléphone (E.164)'),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='telephone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16, null=True, verbose_name='Téléphone (E.164)'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='telephone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16, null=True),
+        ),
+    ]
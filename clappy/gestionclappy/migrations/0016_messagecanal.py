@@ -0,0 +1,25 @@
+# Generated by Django 5.1 on 2026-10-18 01:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionclappy', '0015_telephone_e164'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageCanal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contenu', models.BinaryField(verbose_name='Contenu')),
+                ('expire_le', models.DateTimeField(db_index=True, verbose_name='Expire le')),
+            ],
+            options={
+                'verbose_name': 'Message de canal',
+                'verbose_name_plural': 'Messages de canal',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1 on 2026-10-18 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionclappy', '0016_messagecanal'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-date_demande', '-id'], name='course_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['client', '-date_demande', '-id'], name='course_client_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['chauffeur', '-date_demande', '-id'], name='course_chauffeur_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(condition=models.Q(('chauffeur__isnull', True), ('statut', 'demandee')), fields=['type_vehicule_demande', '-date_demande', '-id'], name='course_libre_type_date_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1 on 2026-10-18 01:27
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def dater_modifications(apps, schema_editor):
+    """Dernière étape connue de chaque course existante plutôt que la date de la migration"""
+    Course = apps.get_model('gestionclappy', 'course')
+    Course.objects.update(
+        date_modification=Coalesce('date_fin', 'date_debut', 'date_acceptation', 'date_demande')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionclappy', '0017_index_courses'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseSupprimee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('course_id', models.BigIntegerField(verbose_name='Course')),
+                ('client_id', models.BigIntegerField(null=True, verbose_name='Client')),
+                ('chauffeur_id', models.BigIntegerField(null=True, verbose_name='Chauffeur')),
+                ('type_vehicule_demande', models.CharField(max_length=15, verbose_name='Type de véhicule demandé')),
+                ('date_suppression', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Date de suppression')),
+            ],
+            options={
+                'verbose_name': 'Course supprimée',
+                'verbose_name_plural': 'Courses supprimées',
+            },
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True, verbose_name='Date de modification'),
+        ),
+        migrations.RunPython(dater_modifications, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['date_modification', 'id'], name='course_modif_id_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1 on 2026-10-18 01:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestionclappy', '0018_synchronisation_courses'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paiement',
+            index=models.Index(fields=['date_paiement', 'id'], name='paiement_date_id_idx'),
+        ),
+    ]
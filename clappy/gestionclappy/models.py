@@ -1,21 +1,38 @@
 # models.py
-from django.db import models
+from django.db import connections, models
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
+from datetime import timedelta
+
+from .fields import CoordonneeField
+from .telephones import normaliser_telephone
+
+
+class TelephoneNormaliseMixin:
+    """Renseigne telephone_e164 (indexé) à chaque enregistrement du numéro brut"""
+
+    def save(self, *args, **kwargs):
+        self.telephone_e164 = normaliser_telephone(self.telephone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'telephone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'telephone_e164'}
+        super().save(*args, **kwargs)
 
 # --------- CustomUser ---------
-class CustomUser(AbstractUser):
+class CustomUser(TelephoneNormaliseMixin, AbstractUser):
     telephone = models.CharField(max_length=15, unique=True, null=True, blank=True)
+    telephone_e164 = models.CharField(max_length=16, null=True, blank=True, db_index=True, editable=False)
     is_client = models.BooleanField(default=False)
     is_chauffeur = models.BooleanField(default=False)
 
 # --------- Client ---------
-class Client(models.Model):
+class Client(TelephoneNormaliseMixin, models.Model):
     """Modèle pour les clients qui utilisent l'application"""
     utilisateur = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name="Utilisateur")
     telephone = models.CharField(max_length=15, verbose_name="Téléphone")
+    telephone_e164 = models.CharField(max_length=16, null=True, blank=True, db_index=True, editable=False, verbose_name="Téléphone (E.164)")
     date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
     date_modification = models.DateTimeField(auto_now=True, verbose_name="Date de modification")
     
@@ -27,7 +44,7 @@ class Client(models.Model):
         return f"{self.utilisateur.get_full_name() or self.utilisateur.username}"
 
 # --------- Chauffeur ---------
-class Chauffeur(models.Model):
+class Chauffeur(TelephoneNormaliseMixin, models.Model):
     """Modèle pour les chauffeurs de taxi"""
     
     STATUT_CHOIX = [
@@ -39,6 +56,7 @@ class Chauffeur(models.Model):
     
     utilisateur = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name="Utilisateur")
     telephone = models.CharField(max_length=15, verbose_name="Téléphone")
+    telephone_e164 = models.CharField(max_length=16, null=True, blank=True, db_index=True, editable=False, verbose_name="Téléphone (E.164)")
     numero_permis = models.CharField(max_length=20, unique=True, verbose_name="Numéro de permis")
     statut = models.CharField(max_length=15, choices=STATUT_CHOIX, default='hors_ligne', verbose_name="Statut")
     est_approuve = models.BooleanField(default=False, verbose_name="Est approuvé")
@@ -127,15 +145,48 @@ class Course(models.Model):
     statut = models.CharField(max_length=15, choices=STATUT_CHOIX, default='demandee', verbose_name="Statut")
     methode_paiement = models.CharField(max_length=15, choices=METHODE_PAIEMENT_CHOIX, verbose_name="Méthode de paiement")
     notes_client = models.TextField(blank=True, verbose_name="Notes du client")
+    # auto_now ne couvre pas QuerySet.update(): les mises à jour directes le renseignent elles-mêmes
+    date_modification = models.DateTimeField(auto_now=True, verbose_name="Date de modification")
     
     class Meta:
         verbose_name = "Course"
         verbose_name_plural = "Courses"
         ordering = ['-date_demande']
+        indexes = [
+            # Listes et pagination par curseur (date_demande, id)
+            models.Index(fields=['-date_demande', '-id'], name='course_date_id_idx'),
+            # Synchronisation par delta (courses modifiées depuis un jeton)
+            models.Index(fields=['date_modification', 'id'], name='course_modif_id_idx'),
+            # Historique d'un client, d'un chauffeur
+            models.Index(fields=['client', '-date_demande', '-id'], name='course_client_date_idx'),
+            models.Index(fields=['chauffeur', '-date_demande', '-id'], name='course_chauffeur_date_idx'),
+            # Flux des chauffeurs: courses libres d'un type de véhicule (petite partie de la table)
+            models.Index(
+                fields=['type_vehicule_demande', '-date_demande', '-id'],
+                condition=models.Q(statut='demandee', chauffeur__isnull=True),
+                name='course_libre_type_date_idx',
+            ),
+        ]
     
     def _str_(self):
         return f"Course #{self.id} - {self.client}"
 
+# --------- CourseSupprimee ---------
+class CourseSupprimee(models.Model):
+    """Trace d'une course supprimée, pour que la synchronisation par delta la retire des appareils"""
+    course_id = models.BigIntegerField(verbose_name="Course")
+    client_id = models.BigIntegerField(null=True, verbose_name="Client")
+    chauffeur_id = models.BigIntegerField(null=True, verbose_name="Chauffeur")
+    type_vehicule_demande = models.CharField(max_length=15, verbose_name="Type de véhicule demandé")
+    date_suppression = models.DateTimeField(default=timezone.now, db_index=True, verbose_name="Date de suppression")
+
+    class Meta:
+        verbose_name = "Course supprimée"
+        verbose_name_plural = "Courses supprimées"
+
+    def _str_(self):
+        return f"Course #{self.course_id} supprimée le {self.date_suppression}"
+
 # --------- Paiement ---------
 class Paiement(models.Model):
     STATUT_PAIEMENT_CHOIX = [
@@ -157,6 +208,10 @@ class Paiement(models.Model):
     class Meta:
         verbose_name = "Paiement"
         verbose_name_plural = "Paiements"
+        indexes = [
+            # Exports et rapprochements par période
+            models.Index(fields=['date_paiement', 'id'], name='paiement_date_id_idx'),
+        ]
     
     def _str_(self):
         return f"Paiement #{self.id} - {self.montant} GNF - {self.course}"
@@ -179,25 +234,88 @@ class Evaluation(models.Model):
         return f"Évaluation #{self.id} - {self.note_chauffeur}/5"
 
 # --------- HistoriquePosition ---------
+class HistoriquePositionQuerySet(models.QuerySet):
+    """
+    Requêtes bornées dans le temps pour ne toucher que les partitions utiles.
+    Pas d'ordre par défaut sur le modèle: chaque lecture trie ce dont elle a besoin.
+    """
+
+    def derniere_position(self, chauffeur_id, fenetre=timedelta(hours=1)):
+        return self.filter(
+            chauffeur_id=chauffeur_id,
+            date_position__gte=timezone.now() - fenetre
+        ).order_by('-date_position').first()
+
+    def trajet_course(self, course):
+        debut = course.date_acceptation or course.date_debut or course.date_demande
+        fin = course.date_fin or timezone.now()
+        return self.filter(
+            chauffeur_id=course.chauffeur_id,
+            date_position__gte=debut,
+            date_position__lte=fin
+        ).order_by('date_position')
+
+    def dernieres_positions(self, fenetre):
+        """
+        Dernier point de chaque chauffeur dans la fenêtre:
+        (chauffeur_id, latitude, longitude, date_position).
+        """
+        recentes = self.filter(date_position__gte=timezone.now() - fenetre)
+        colonnes = ('chauffeur_id', 'latitude', 'longitude', 'date_position')
+        if connections[self.db].vendor == 'postgresql':
+            # DISTINCT ON suit l'index (chauffeur, -date_position) de chaque partition
+            return recentes.order_by('chauffeur_id', '-date_position').distinct('chauffeur_id').values_list(*colonnes)
+        derniere = recentes.filter(chauffeur_id=models.OuterRef('chauffeur_id')).order_by('-date_position', '-id')
+        return recentes.filter(id=models.Subquery(derniere.values('id')[:1])).values_list(*colonnes)
+
+
 class HistoriquePosition(models.Model):
     chauffeur = models.ForeignKey(Chauffeur, on_delete=models.CASCADE, verbose_name="Chauffeur")
-    latitude = models.DecimalField(max_digits=9, decimal_places=6, verbose_name="Latitude")
-    longitude = models.DecimalField(max_digits=9, decimal_places=6, verbose_name="Longitude")
-    date_position = models.DateTimeField(auto_now_add=True, verbose_name="Date de position")
+    latitude = CoordonneeField(verbose_name="Latitude")
+    longitude = CoordonneeField(verbose_name="Longitude")
+    # Date du relevé GPS (envoyée par le téléphone), heure de réception à défaut
+    date_position = models.DateTimeField(default=timezone.now, editable=False, verbose_name="Date de position")
+
+    objects = HistoriquePositionQuerySet.as_manager()
     
     class Meta:
         verbose_name = "Historique de position"
         verbose_name_plural = "Historiques de position"
-        ordering = ['-date_position']
+        indexes = [
+            # Dernière position d'un chauffeur sans tri de toute la table
+            models.Index(fields=['chauffeur', '-date_position'], name='histpos_chauffeur_date_idx'),
+        ]
     
     def _str_(self):
         return f"Position {self.chauffeur} - {self.date_position}"
 
+# --------- TracePosition ---------
+class TracePosition(models.Model):
+    """Historique résumé (une position moyenne par intervalle) au-delà de la rétention"""
+    chauffeur = models.ForeignKey(Chauffeur, on_delete=models.CASCADE, verbose_name="Chauffeur")
+    date_debut = models.DateTimeField(verbose_name="Début de l'intervalle")
+    latitude = CoordonneeField(verbose_name="Latitude moyenne")
+    longitude = CoordonneeField(verbose_name="Longitude moyenne")
+    nombre_points = models.IntegerField(default=1, verbose_name="Nombre de points résumés")
+
+    class Meta:
+        verbose_name = "Trace de position"
+        verbose_name_plural = "Traces de position"
+        ordering = ['chauffeur', 'date_debut']
+        constraints = [
+            models.UniqueConstraint(fields=['chauffeur', 'date_debut'], name='traceposition_chauffeur_debut_uniq'),
+        ]
+
+    def _str_(self):
+        return f"Trace {self.chauffeur} - {self.date_debut}"
+
 # --------- Tarif ---------
 class Tarif(models.Model):
     type_vehicule = models.CharField(max_length=15, choices=Vehicule.TYPE_VEHICULE_CHOIX, verbose_name="Type de véhicule")
     prix_base = models.DecimalField(max_digits=8, decimal_places=2, verbose_name="Prix de base (GNF)")
     prix_par_km = models.DecimalField(max_digits=8, decimal_places=2, verbose_name="Prix par km (GNF)")
+    prix_par_minute = models.DecimalField(max_digits=8, decimal_places=2, default=0, verbose_name="Prix par minute (GNF)")
+    tarif_minimum = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Tarif minimum (GNF)")
     est_actif = models.BooleanField(default=True, verbose_name="Est actif")
     date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
     
@@ -206,4 +324,83 @@ class Tarif(models.Model):
         verbose_name_plural = "Tarifs"
     
     def _str_(self):
-        return f"Tarif {self.type_vehicule} - {self.prix_par_km} GNF/km"
\ No newline at end of file
+        return f"Tarif {self.type_vehicule} - {self.prix_par_km} GNF/km"
+
+# --------- CacheGeographique ---------
+class CacheGeographique(models.Model):
+    """Résultats Google Maps (géocodage, itinéraires) conservés entre les processus"""
+    TYPE_CHOIX = [
+        ('geocodage', 'Géocodage'),
+        ('itineraire', 'Itinéraire'),
+    ]
+
+    cle = models.CharField(max_length=255, unique=True, verbose_name="Clé")
+    type_requete = models.CharField(max_length=15, choices=TYPE_CHOIX, verbose_name="Type de requête")
+    valeur = models.JSONField(verbose_name="Valeur")
+    nombre_hits = models.PositiveIntegerField(default=0, verbose_name="Nombre d'utilisations")
+    date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    date_expiration = models.DateTimeField(db_index=True, verbose_name="Date d'expiration")
+
+    class Meta:
+        verbose_name = "Cache géographique"
+        verbose_name_plural = "Cache géographique"
+
+    def _str_(self):
+        return f"{self.type_requete} - {self.cle}"
+
+# --------- NotificationSortante ---------
+class NotificationSortante(models.Model):
+    """
+    File d'envoi durable (outbox): écrite dans la même transaction que la course,
+    puis envoyée par le worker traiter_notifications avec reprises. Les vagues
+    suivantes du dispatch y sont aussi programmées (type 'dispatch', à
+    prochaine_tentative), pour survivre à un redémarrage du processus.
+    """
+    TYPE_CHOIX = [
+        ('sms', 'SMS'),
+        ('websocket', 'WebSocket'),
+        ('dispatch', 'Vague de dispatch'),
+    ]
+    STATUT_CHOIX = [
+        ('en_attente', 'En attente'),
+        ('en_cours', 'En cours'),
+        ('envoyee', 'Envoyée'),
+        ('abandonnee', 'Abandonnée'),
+    ]
+
+    type_notification = models.CharField(max_length=15, choices=TYPE_CHOIX, verbose_name="Type de notification")
+    destinataire = models.CharField(max_length=255, verbose_name="Destinataire")
+    payload = models.JSONField(verbose_name="Contenu")
+    course = models.ForeignKey(Course, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Course")
+    statut = models.CharField(max_length=15, choices=STATUT_CHOIX, default='en_attente', verbose_name="Statut")
+    tentatives = models.PositiveSmallIntegerField(default=0, verbose_name="Tentatives")
+    prochaine_tentative = models.DateTimeField(default=timezone.now, verbose_name="Prochaine tentative")
+    derniere_erreur = models.TextField(blank=True, verbose_name="Dernière erreur")
+    date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    date_envoi = models.DateTimeField(null=True, blank=True, verbose_name="Date d'envoi")
+
+    class Meta:
+        verbose_name = "Notification sortante"
+        verbose_name_plural = "Notifications sortantes"
+        indexes = [
+            models.Index(fields=['statut', 'prochaine_tentative'], name='notif_statut_prochaine_idx'),
+        ]
+
+    def _str_(self):
+        return f"{self.type_notification} → {self.destinataire} ({self.statut})"
+
+# --------- MessageCanal ---------
+class MessageCanal(models.Model):
+    """
+    Message channels trop grand pour un NOTIFY PostgreSQL (couche_postgres):
+    la notification ne porte que l'id, chaque worker abonné relit le contenu ici.
+    """
+    contenu = models.BinaryField(verbose_name="Contenu")
+    expire_le = models.DateTimeField(db_index=True, verbose_name="Expire le")
+
+    class Meta:
+        verbose_name = "Message de canal"
+        verbose_name_plural = "Messages de canal"
+
+    def _str_(self):
+        return f"Message {self.id} ({len(self.contenu)} octets)"
@@ -0,0 +1,293 @@
+# notifications.py
+"""
+File d'envoi durable des notifications (SMS, WebSocket).
+
+Les notifications sont d'abord écrites dans NotificationSortante, dans la
+transaction en cours: si la course n'est pas enregistrée, rien ne part; si le
+processus redémarre ou si NimbaSMS répond 5xx, le message reste en base.
+Elles sont ensuite envoyées par traiter_lot(), appelé par la commande
+traiter_notifications et, juste après le commit, par un thread du processus.
+Les vagues suivantes du dispatch passent par la même file (type 'dispatch',
+exécutées à leur prochaine_tentative).
+
+Les vues async diffusent les trames WebSocket (éphémères) directement, par un
+group_send natif lancé en tâche de fond avec planifier().
+"""
+import asyncio
+import logging
+import random
+import threading
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import close_old_connections, transaction
+from django.db.models import F, Min
+from django.utils import timezone
+
+from .canaux import couche_partagee
+from .models import NotificationSortante
+from .reglages import parametre
+from .sms import dispatcheur_sms
+
+logger = logging.getLogger(__name__)
+
+
+TYPES = ('sms', 'websocket', 'dispatch')
+
+
+# ---------- Écriture ----------
+
+def ajouter_sms(telephones, message, course=None):
+    """Mettre en file un même SMS pour plusieurs numéros"""
+    notifications = NotificationSortante.objects.bulk_create([
+        NotificationSortante(
+            type_notification='sms',
+            destinataire=telephone,
+            payload={'message': message},
+            course=course,
+        )
+        for telephone in dict.fromkeys(telephones) if telephone
+    ])
+    _reveiller_apres_commit()
+    return notifications
+
+
+def ajouter_websocket(envois, course=None):
+    """Mettre en file des événements channels: `envois` = [(groupe, evenement)]"""
+    notifications = NotificationSortante.objects.bulk_create([
+        NotificationSortante(
+            type_notification='websocket',
+            destinataire=groupe,
+            payload=evenement,
+            course=course,
+        )
+        for groupe, evenement in envois
+    ])
+    _reveiller_apres_commit()
+    return notifications
+
+
+def ajouter_vague(course, index, deja_notifies, delai):
+    """Programmer la vague `index` du dispatch de `course` dans `delai` secondes"""
+    notification = NotificationSortante.objects.create(
+        type_notification='dispatch',
+        destinataire=f"course_{course.id}",
+        payload={'vague': index, 'deja_notifies': sorted(deja_notifies)},
+        course=course,
+        prochaine_tentative=timezone.now() + timedelta(seconds=delai),
+    )
+    _reveiller_apres_commit()
+    return notification
+
+
+def _reveiller_apres_commit():
+    if parametre('NOTIFICATIONS_ENVOI_IMMEDIAT', True):
+        transaction.on_commit(traiteur_local.reveiller)
+
+
+# ---------- Tâches de fond (vues async) ----------
+
+_taches = set()
+
+
+def planifier(coroutine):
+    """
+    Lancer une coroutine sur la boucle du serveur ASGI sans la faire attendre
+    par la requête. Pas de reprise: réservé aux envois qui peuvent se perdre.
+    """
+    tache = asyncio.get_running_loop().create_task(coroutine)
+    # La boucle ne garde qu'une référence faible sur ses tâches
+    _taches.add(tache)
+    tache.add_done_callback(_tache_terminee)
+    return tache
+
+
+def _tache_terminee(tache):
+    _taches.discard(tache)
+    if not tache.cancelled() and tache.exception() is not None:
+        logger.error(f"Tâche de fond en échec: {tache.exception()}", exc_info=tache.exception())
+
+
+async def attendre_taches():
+    """Attendre les tâches de fond en cours (arrêt du serveur, benchmarks)"""
+    while _taches:
+        await asyncio.gather(*list(_taches), return_exceptions=True)
+
+
+# ---------- Envoi ----------
+
+def websocket_traitable():
+    """Un worker séparé ne peut pas joindre les sockets d'une couche en mémoire (propre au processus)"""
+    return couche_partagee()
+
+
+def reclamer(taille, types):
+    """
+    Réserver jusqu'à `taille` notifications dues (SKIP LOCKED: plusieurs workers
+    ne prennent jamais la même). Une réservation non terminée expire après
+    NOTIFICATIONS_BAIL_SECONDES et la notification redevient disponible.
+    """
+    maintenant = timezone.now()
+    bail = maintenant + timedelta(seconds=parametre('NOTIFICATIONS_BAIL_SECONDES', 120))
+    with transaction.atomic():
+        ids = list(
+            NotificationSortante.objects
+            .filter(statut__in=['en_attente', 'en_cours'], prochaine_tentative__lte=maintenant,
+                    type_notification__in=types)
+            .order_by('prochaine_tentative')
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:taille]
+        )
+        NotificationSortante.objects.filter(id__in=ids).update(
+            statut='en_cours', prochaine_tentative=bail, tentatives=F('tentatives') + 1
+        )
+    return list(NotificationSortante.objects.filter(id__in=ids))
+
+
+def prochaine_echeance(types=TYPES):
+    """Secondes avant la prochaine notification programmée (vague de dispatch, reprise), None si aucune"""
+    prochaine = (
+        NotificationSortante.objects
+        .filter(statut='en_attente', type_notification__in=types)
+        .aggregate(prochaine=Min('prochaine_tentative'))['prochaine']
+    )
+    if prochaine is None:
+        return None
+    return max((prochaine - timezone.now()).total_seconds(), 0)
+
+
+def traiter_lot(taille=None, types=TYPES):
+    """Envoyer un lot de notifications dues; retourne le nombre traité"""
+    from .dispatch import DispatchService
+
+    taille = taille or parametre('NOTIFICATIONS_TAILLE_LOT', 100)
+    notifications = reclamer(taille, types)
+    if not notifications:
+        return 0
+
+    resultats = {}  # id -> message d'erreur ('' si envoyée)
+
+    # Vagues de dispatch dues: chacune écrit ses alertes et la vague suivante d'un bloc
+    for notification in notifications:
+        if notification.type_notification != 'dispatch':
+            continue
+        try:
+            with transaction.atomic():
+                DispatchService.vague_programmee(notification)
+            resultats[notification.id] = ''
+        except Exception as e:
+            resultats[notification.id] = f"{type(e).__name__}: {e}"
+
+    # SMS: un envoi groupé par message identique (voir DispatcheurSMS.soumettre_groupe)
+    par_message = {}
+    for notification in notifications:
+        if notification.type_notification == 'sms':
+            par_message.setdefault(notification.payload.get('message', ''), []).append(notification)
+    attentes = []
+    for message, groupe in par_message.items():
+        futures = dispatcheur_sms.soumettre_groupe([n.destinataire for n in groupe], message)
+        attentes.extend((notification, futures.get(notification.destinataire)) for notification in groupe)
+
+    # WebSocket
+    channel_layer = get_channel_layer()
+    for notification in notifications:
+        if notification.type_notification != 'websocket':
+            continue
+        if channel_layer is None:
+            resultats[notification.id] = "Channel layer non disponible"
+            continue
+        try:
+            async_to_sync(channel_layer.group_send)(notification.destinataire, notification.payload)
+            resultats[notification.id] = ''
+        except Exception as e:
+            resultats[notification.id] = f"{type(e).__name__}: {e}"
+
+    delai = parametre('SMS_TIMEOUT_SECONDES', 30) * 2
+    for notification, future in attentes:
+        try:
+            envoye = future is not None and future.result(timeout=delai)
+            resultats[notification.id] = '' if envoye else "Refusé par NimbaSMS ou numéro invalide"
+        except Exception as e:
+            resultats[notification.id] = f"{type(e).__name__}: {e}"
+
+    _enregistrer_resultats(notifications, resultats)
+    return len(notifications)
+
+
+def _enregistrer_resultats(notifications, resultats):
+    maintenant = timezone.now()
+    max_tentatives = parametre('NOTIFICATIONS_MAX_TENTATIVES', 6)
+    base = parametre('NOTIFICATIONS_DELAI_BASE_SECONDES', 30)
+    plafond = parametre('NOTIFICATIONS_DELAI_MAX_SECONDES', 3600)
+
+    envoyees = [n.id for n in notifications if resultats.get(n.id) == '']
+    if envoyees:
+        NotificationSortante.objects.filter(id__in=envoyees).update(
+            statut='envoyee', date_envoi=maintenant, derniere_erreur=''
+        )
+
+    for notification in notifications:
+        erreur = resultats.get(notification.id, "Aucun résultat")
+        if erreur == '':
+            continue
+        if notification.tentatives >= max_tentatives:
+            # Lettre morte: visible dans l'admin, remise en file à la main
+            logger.error(f"Notification {notification.id} abandonnée après {notification.tentatives} tentatives: {erreur}")
+            NotificationSortante.objects.filter(id=notification.id).update(
+                statut='abandonnee', derniere_erreur=erreur
+            )
+            continue
+        # Backoff exponentiel avec gigue (±20 %) pour ne pas relancer tout le monde en même temps
+        secondes = min(base * 2 ** (notification.tentatives - 1), plafond) * random.uniform(0.8, 1.2)
+        NotificationSortante.objects.filter(id=notification.id).update(
+            statut='en_attente',
+            prochaine_tentative=maintenant + timedelta(seconds=secondes),
+            derniere_erreur=erreur,
+        )
+
+
+def remettre_en_file(queryset):
+    """Relancer des notifications abandonnées (action d'administration)"""
+    return queryset.filter(statut__in=['abandonnee', 'en_attente']).update(
+        statut='en_attente', tentatives=0, prochaine_tentative=timezone.now()
+    )
+
+
+class TraiteurLocal:
+    """
+    Thread du processus web qui vide la file juste après chaque commit, puis se
+    réveille à l'échéance de la prochaine notification programmée. Après un
+    redémarrage, les vagues en attente repartent au premier réveil ou avec
+    `traiter_notifications --boucle`.
+    """
+
+    def __init__(self):
+        self._evenement = threading.Event()
+        self._thread = None
+        self._verrou = threading.Lock()
+        self._attente = None
+
+    def reveiller(self):
+        with self._verrou:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._boucle, name="notifications", daemon=True)
+                self._thread.start()
+        self._evenement.set()
+
+    def _boucle(self):
+        while True:
+            self._evenement.wait(self._attente)
+            self._evenement.clear()
+            try:
+                while traiter_lot():
+                    pass
+                self._attente = prochaine_echeance()
+            except Exception as e:
+                self._attente = parametre('NOTIFICATIONS_INTERVALLE_SECONDES', 2)
+                logger.error(f"Erreur traitement des notifications: {e}", exc_info=True)
+            finally:
+                close_old_connections()
+
+
+traiteur_local = TraiteurLocal()
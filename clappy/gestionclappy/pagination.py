@@ -0,0 +1,121 @@
+# pagination.py
+"""
+Pagination par curseur (keyset) sur (date_demande, id).
+
+La pagination par numéro de page fait un COUNT(*) à chaque page et un OFFSET
+qui relit toutes les lignes précédentes: son coût grandit avec la table et la
+profondeur. Ici la page suivante repart de la dernière ligne vue
+(date_demande < d, ou = d et id < i), ce qui est une simple plage de l'index
+(date_demande, id): le coût d'une page ne dépend ni de la profondeur ni du
+nombre total de courses.
+"""
+import base64
+import binascii
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encoder_curseur(date, identifiant=None):
+    """Jeton opaque (date, id); sans id, le jeton ne porte que la date"""
+    texte = f"{date.isoformat()}|{'' if identifiant is None else identifiant}"
+    return base64.urlsafe_b64encode(texte.encode()).decode().rstrip('=')
+
+
+def decoder_curseur(curseur):
+    """(date, id ou None) ou ValueError"""
+    try:
+        texte = base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4)).decode()
+        date, identifiant = texte.split('|')
+        return datetime.fromisoformat(date), int(identifiant) if identifiant else None
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(str(e))
+
+
+def apres_curseur(queryset, date, identifiant, champ='date_demande'):
+    """
+    Lignes strictement après (date, id) dans l'ordre décroissant. Le premier
+    filtre borne le parcours de l'index, le second écarte les égalités déjà vues.
+    """
+    return queryset.filter(**{f'{champ}__lte': date}).filter(
+        Q(**{f'{champ}__lt': date}) | Q(id__lt=identifiant)
+    )
+
+
+class PaginationCurseur(BasePagination):
+    """
+    ?pagination=curseur&curseur=<jeton>: pages de courses de la plus récente à la
+    plus ancienne, sans total. `next` porte le curseur de la page suivante.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'curseur'
+    champ_date = 'date_demande'
+
+    def get_page_size(self, request):
+        try:
+            taille = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(max(taille, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        taille = self.get_page_size(request)
+        queryset = queryset.order_by(f'-{self.champ_date}', '-id')
+
+        curseur = request.query_params.get(self.cursor_query_param)
+        if curseur:
+            try:
+                date, identifiant = decoder_curseur(curseur)
+            except ValueError:
+                raise NotFound("Curseur invalide")
+            if identifiant is None:
+                raise NotFound("Curseur invalide")
+            queryset = apres_curseur(queryset, date, identifiant, self.champ_date)
+
+        # Une ligne de plus pour savoir s'il reste une page, sans COUNT(*)
+        lignes = list(queryset[:taille + 1])
+        self.page_suivante = None
+        if len(lignes) > taille:
+            lignes = lignes[:taille]
+            derniere = lignes[-1]
+            if isinstance(derniere, dict):
+                # Queryset values() (CourseLecture)
+                self.page_suivante = encoder_curseur(derniere[self.champ_date], derniere['id'])
+            else:
+                self.page_suivante = encoder_curseur(getattr(derniere, self.champ_date), derniere.id)
+        return lignes
+
+    def get_next_link(self):
+        if self.page_suivante is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.page_suivante
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    @classmethod
+    def demandee(cls, request):
+        return request is not None and request.query_params.get('pagination') == 'curseur'
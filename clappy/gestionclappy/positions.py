@@ -0,0 +1,265 @@
+# positions.py
+"""
+Index en mémoire des positions en direct des chauffeurs.
+
+Seule la dernière position de chaque chauffeur est conservée, rangée dans une
+grille de cellules (en degrés) pour répondre aux requêtes "dans un rayon" et
+"K plus proches" sans parcourir HistoriquePosition.
+"""
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+import numpy as np
+
+from .geo import distances_haversine_km
+from .reglages import parametre
+
+logger = logging.getLogger(__name__)
+
+KM_PAR_DEGRE = 111.32
+
+
+def cellule_de(lat, lon, taille):
+    """Cellule de la grille (ligne, colonne) contenant le point"""
+    return (math.floor(lat / taille), math.floor(lon / taille))
+
+
+class BackendMemoire:
+    """Positions stockées dans la mémoire du processus (un index par worker)"""
+
+    def __init__(self, **options):
+        self._positions = {}  # chauffeur_id -> (lat, lon, horodatage, cellule)
+        self._cellules = defaultdict(dict)  # cellule -> {chauffeur_id: (lat, lon, horodatage)}
+        self._verrou = threading.Lock()
+
+    def enregistrer(self, chauffeur_id, lat, lon, horodatage, cellule):
+        with self._verrou:
+            ancienne = self._positions.get(chauffeur_id)
+            if ancienne is not None and ancienne[3] != cellule:
+                self._cellules[ancienne[3]].pop(chauffeur_id, None)
+                if not self._cellules[ancienne[3]]:
+                    del self._cellules[ancienne[3]]
+            self._positions[chauffeur_id] = (lat, lon, horodatage, cellule)
+            self._cellules[cellule][chauffeur_id] = (lat, lon, horodatage)
+
+    def retirer(self, chauffeur_id):
+        with self._verrou:
+            ancienne = self._positions.pop(chauffeur_id, None)
+            if ancienne is not None:
+                self._cellules[ancienne[3]].pop(chauffeur_id, None)
+                if not self._cellules[ancienne[3]]:
+                    del self._cellules[ancienne[3]]
+
+    def position(self, chauffeur_id):
+        return self._positions.get(chauffeur_id)
+
+    def positions_cellules(self, cellules):
+        resultat = []
+        with self._verrou:
+            for cellule in cellules:
+                occupants = self._cellules.get(cellule)
+                if occupants:
+                    resultat.extend((cid, *valeur) for cid, valeur in occupants.items())
+        return resultat
+
+    def vider(self):
+        with self._verrou:
+            self._positions.clear()
+            self._cellules.clear()
+
+    def __len__(self):
+        return len(self._positions)
+
+
+class BackendCache:
+    """
+    Positions stockées dans un cache Django (Redis, Memcached...) partagé entre
+    les workers ASGI. Les écritures concurrentes sur une même cellule peuvent
+    perdre une mise à jour; elle est rattrapée au point GPS suivant.
+    """
+
+    def __init__(self, alias='default', prefixe='positions', timeout=None, **options):
+        self._cache = caches[alias]
+        self._prefixe = prefixe
+        self._timeout = timeout
+
+    def _cle_chauffeur(self, chauffeur_id):
+        return f"{self._prefixe}:chauffeur:{chauffeur_id}"
+
+    def _cle_cellule(self, cellule):
+        return f"{self._prefixe}:cellule:{cellule[0]}:{cellule[1]}"
+
+    def enregistrer(self, chauffeur_id, lat, lon, horodatage, cellule):
+        ancienne = self._cache.get(self._cle_chauffeur(chauffeur_id))
+        if ancienne is not None and tuple(ancienne[3]) != cellule:
+            cle = self._cle_cellule(tuple(ancienne[3]))
+            occupants = self._cache.get(cle) or {}
+            occupants.pop(chauffeur_id, None)
+            self._cache.set(cle, occupants, self._timeout)
+        cle = self._cle_cellule(cellule)
+        occupants = self._cache.get(cle) or {}
+        occupants[chauffeur_id] = (lat, lon, horodatage)
+        self._cache.set_many({
+            cle: occupants,
+            self._cle_chauffeur(chauffeur_id): (lat, lon, horodatage, cellule),
+        }, self._timeout)
+
+    def retirer(self, chauffeur_id):
+        ancienne = self._cache.get(self._cle_chauffeur(chauffeur_id))
+        if ancienne is not None:
+            cle = self._cle_cellule(tuple(ancienne[3]))
+            occupants = self._cache.get(cle) or {}
+            occupants.pop(chauffeur_id, None)
+            self._cache.set(cle, occupants, self._timeout)
+            self._cache.delete(self._cle_chauffeur(chauffeur_id))
+
+    def position(self, chauffeur_id):
+        return self._cache.get(self._cle_chauffeur(chauffeur_id))
+
+    def positions_cellules(self, cellules):
+        resultat = []
+        for occupants in self._cache.get_many([self._cle_cellule(c) for c in cellules]).values():
+            resultat.extend((cid, *valeur) for cid, valeur in occupants.items())
+        return resultat
+
+    def vider(self):
+        # Les entrées expirent d'elles-mêmes; une reconstruction les réécrit toutes
+        pass
+
+
+class IndexPositions:
+    """Grille des dernières positions connues, indexée par chauffeur"""
+
+    def __init__(self, backend=None, taille_cellule=None):
+        self.backend = backend if backend is not None else BackendMemoire()
+        self.taille_cellule = taille_cellule or parametre('POSITIONS_TAILLE_CELLULE_DEG', 0.01)
+        self.est_charge = False
+
+    def mettre_a_jour(self, chauffeur_id, lat, lon, horodatage=None):
+        """Enregistrer un point GPS; ignoré s'il est plus ancien que celui connu"""
+        lat, lon = float(lat), float(lon)
+        horodatage = horodatage.timestamp() if hasattr(horodatage, 'timestamp') else (horodatage or time.time())
+        connue = self.backend.position(chauffeur_id)
+        if connue is not None and connue[2] > horodatage:
+            return
+        self.backend.enregistrer(chauffeur_id, lat, lon, horodatage, cellule_de(lat, lon, self.taille_cellule))
+
+    def retirer(self, chauffeur_id):
+        self.backend.retirer(chauffeur_id)
+
+    def position(self, chauffeur_id):
+        """(lat, lon, horodatage) du chauffeur, ou None"""
+        connue = self.backend.position(chauffeur_id)
+        return connue[:3] if connue is not None else None
+
+    def _anneau(self, centre, rang):
+        """Cellules situées exactement à `rang` cellules du centre"""
+        ligne, colonne = centre
+        if rang == 0:
+            return [centre]
+        cellules = []
+        for dc in range(-rang, rang + 1):
+            cellules.append((ligne - rang, colonne + dc))
+            cellules.append((ligne + rang, colonne + dc))
+        for dl in range(-rang + 1, rang):
+            cellules.append((ligne + dl, colonne - rang))
+            cellules.append((ligne + dl, colonne + rang))
+        return cellules
+
+    def _km_par_cellule(self, lat):
+        """Plus petite dimension (km) d'une cellule à cette latitude"""
+        return self.taille_cellule * KM_PAR_DEGRE * max(math.cos(math.radians(abs(lat) + self.taille_cellule)), 0.01)
+
+    def _candidats(self, lat, lon, cellules, filtre, fraicheur):
+        limite = time.time() - fraicheur if fraicheur else None
+        positions = [
+            position for position in self.backend.positions_cellules(cellules)
+            if (filtre is None or position[0] in filtre) and (limite is None or position[3] >= limite)
+        ]
+        if not positions:
+            return []
+        tableau = np.array([position[1:3] for position in positions], dtype=np.float64)
+        distances = distances_haversine_km(tableau[:, 0], tableau[:, 1], lat, lon)
+        return [(position[0], distance) for position, distance in zip(positions, distances.tolist())]
+
+    def dans_rayon(self, lat, lon, rayon_km, filtre=None, fraicheur=None):
+        """
+        Chauffeurs à moins de `rayon_km` du point, triés par distance:
+        liste de (chauffeur_id, distance_km). `filtre` restreint aux ids donnés,
+        `fraicheur` (secondes) écarte les positions trop anciennes.
+        """
+        lat, lon = float(lat), float(lon)
+        rangs = math.ceil(rayon_km / self._km_par_cellule(lat))
+        centre = cellule_de(lat, lon, self.taille_cellule)
+        cellules = [c for rang in range(rangs + 1) for c in self._anneau(centre, rang)]
+        resultat = [c for c in self._candidats(lat, lon, cellules, filtre, fraicheur) if c[1] <= rayon_km]
+        resultat.sort(key=lambda candidat: candidat[1])
+        return resultat
+
+    def plus_proches(self, lat, lon, k, rayon_max_km=None, filtre=None, fraicheur=None):
+        """Les `k` chauffeurs les plus proches (anneaux de cellules élargis progressivement)"""
+        lat, lon = float(lat), float(lon)
+        rayon_max_km = rayon_max_km or parametre('POSITIONS_RAYON_MAX_KM', 50)
+        km_cellule = self._km_par_cellule(lat)
+        centre = cellule_de(lat, lon, self.taille_cellule)
+
+        trouves = []
+        rang = 0
+        while True:
+            trouves.extend(self._candidats(lat, lon, self._anneau(centre, rang), filtre, fraicheur))
+            # Tout point hors des anneaux déjà parcourus est à plus de `couvert` km
+            couvert = rang * km_cellule
+            trouves.sort(key=lambda candidat: candidat[1])
+            if len(trouves) >= k and trouves[k - 1][1] <= couvert:
+                break
+            if couvert >= rayon_max_km:
+                break
+            rang += 1
+        return [c for c in trouves if c[1] <= rayon_max_km][:k]
+
+    def reconstruire(self):
+        """Recharger la dernière position récente de chaque chauffeur depuis la base"""
+        from .models import HistoriquePosition
+
+        fraicheur = parametre('POSITIONS_FRAICHEUR_MINUTES', 30)
+        lignes = HistoriquePosition.objects.dernieres_positions(timedelta(minutes=fraicheur))
+
+        self.backend.vider()
+        nombre = 0
+        for chauffeur_id, lat, lon, date_position in lignes.iterator():
+            self.mettre_a_jour(chauffeur_id, lat, lon, date_position)
+            nombre += 1
+        self.est_charge = True
+        logger.info(f"Index des positions reconstruit: {nombre} chauffeurs")
+        return nombre
+
+
+_index = None
+_verrou_index = threading.Lock()
+
+
+def get_index():
+    """Index partagé du processus, construit depuis la base au premier appel"""
+    global _index
+    if _index is None:
+        with _verrou_index:
+            if _index is None:
+                config = parametre('POSITIONS_BACKEND', {})
+                classe = import_string(config.get('BACKEND', 'gestionclappy.positions.BackendMemoire'))
+                _index = IndexPositions(backend=classe(**config.get('OPTIONS', {})))
+    if not _index.est_charge:
+        with _verrou_index:
+            if not _index.est_charge:
+                try:
+                    _index.reconstruire()
+                except Exception as e:
+                    logger.error(f"Reconstruction de l'index des positions impossible: {e}")
+                    _index.est_charge = True
+    return _index
@@ -0,0 +1,7 @@
+# reglages.py
+"""Lecture des réglages optionnels de l'application (valeur par défaut si absents de settings)."""
+from django.conf import settings
+
+
+def parametre(nom, defaut):
+    return getattr(settings, nom, defaut)
@@ -0,0 +1,278 @@
+# routage.py
+"""
+Backends de calcul d'itinéraire (distance, durée) derrière
+services.calculate_route_distance_duration.
+
+BackendGoogle interroge la Distance Matrix (avec cache); BackendOSM calcule
+l'itinéraire localement (A*) sur un graphe routier chargé depuis un extrait
+OpenStreetMap (.osm XML), avec Google en repli optionnel.
+"""
+import heapq
+import json
+import logging
+import math
+import os
+import threading
+import xml.etree.ElementTree as ET
+
+from django.utils.module_loading import import_string
+
+from .geo import haversine_km
+from .reglages import parametre
+
+logger = logging.getLogger(__name__)
+
+# Vitesses moyennes (km/h) par type de voie OSM
+VITESSES_KMH = {
+    'motorway': 80, 'motorway_link': 50,
+    'trunk': 60, 'trunk_link': 40,
+    'primary': 45, 'primary_link': 35,
+    'secondary': 35, 'secondary_link': 30,
+    'tertiary': 30, 'tertiary_link': 25,
+    'unclassified': 25, 'residential': 20,
+    'living_street': 10, 'service': 15, 'road': 20, 'track': 10,
+}
+
+
+class BackendRoutage:
+    """Interface: itineraire() retourne (distance_km, duree_min) en float, ou None"""
+
+    def itineraire(self, origin_lat, origin_lng, dest_lat, dest_lng):
+        raise NotImplementedError
+
+
+class BackendGoogle(BackendRoutage):
+    """Google Distance Matrix (résultats mis en cache, voir services.py)"""
+
+    def __init__(self, **options):
+        pass
+
+    def itineraire(self, origin_lat, origin_lng, dest_lat, dest_lng):
+        from .services import itineraire_google
+        return itineraire_google(origin_lat, origin_lng, dest_lat, dest_lng)
+
+
+class GrapheRoutier:
+    """Graphe routier compact: listes d'adjacence sur des indices de noeuds"""
+
+    TAILLE_CELLULE_DEG = 0.005
+
+    def __init__(self, latitudes, longitudes, voisins):
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.voisins = voisins  # indice -> [(indice_voisin, distance_km, duree_h)]
+        # Vitesse la plus élevée du graphe: heuristique A* admissible et aussi serrée que possible
+        self.vitesse_max = max(
+            (distance / duree for aretes in voisins for _, distance, duree in aretes if duree > 0),
+            default=max(VITESSES_KMH.values())
+        )
+        self._grille = {}
+        for indice, (lat, lon) in enumerate(zip(latitudes, longitudes)):
+            if voisins[indice]:
+                self._grille.setdefault(self._cellule(lat, lon), []).append(indice)
+
+    def _cellule(self, lat, lon):
+        return (math.floor(lat / self.TAILLE_CELLULE_DEG), math.floor(lon / self.TAILLE_CELLULE_DEG))
+
+    @classmethod
+    def depuis_osm(cls, fichier):
+        """Construire le graphe depuis un extrait .osm (XML), en ne gardant que les voies carrossables"""
+        noeuds = {}
+        voies = []
+        for _, element in ET.iterparse(fichier, events=('end',)):
+            if element.tag == 'node':
+                noeuds[element.get('id')] = (float(element.get('lat')), float(element.get('lon')))
+                element.clear()
+            elif element.tag == 'way':
+                tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+                vitesse = VITESSES_KMH.get(tags.get('highway'))
+                if vitesse:
+                    maxspeed = tags.get('maxspeed', '')
+                    if maxspeed.isdigit():
+                        vitesse = min(vitesse, int(maxspeed))
+                    sens = tags.get('oneway')
+                    if sens is None and tags.get('junction') == 'roundabout':
+                        sens = 'yes'
+                    refs = [nd.get('ref') for nd in element.iter('nd')]
+                    voies.append((refs, vitesse, sens))
+                element.clear()
+
+        indices = {}
+        latitudes, longitudes, voisins = [], [], []
+
+        def indice(ref):
+            if ref not in indices:
+                indices[ref] = len(latitudes)
+                lat, lon = noeuds[ref]
+                latitudes.append(lat)
+                longitudes.append(lon)
+                voisins.append([])
+            return indices[ref]
+
+        for refs, vitesse, sens in voies:
+            refs = [ref for ref in refs if ref in noeuds]
+            if sens == '-1':
+                refs.reverse()
+            for depart, arrivee in zip(refs, refs[1:]):
+                a, b = indice(depart), indice(arrivee)
+                distance = haversine_km(latitudes[a], longitudes[a], latitudes[b], longitudes[b])
+                duree = distance / vitesse
+                voisins[a].append((b, distance, duree))
+                if sens not in ('yes', 'true', '1', '-1'):
+                    voisins[b].append((a, distance, duree))
+
+        return cls(latitudes, longitudes, voisins)
+
+    def noeud_proche(self, lat, lon, rayon_max_km=2):
+        """Noeud routier le plus proche du point (recherche par anneaux de cellules)"""
+        ligne, colonne = self._cellule(lat, lon)
+        km_cellule = self.TAILLE_CELLULE_DEG * 111.32 * max(math.cos(math.radians(abs(lat))), 0.01)
+        meilleur, meilleure_distance = None, float('inf')
+        rang = 0
+        while rang * km_cellule <= rayon_max_km + km_cellule:
+            for dl in range(-rang, rang + 1):
+                for dc in range(-rang, rang + 1):
+                    if max(abs(dl), abs(dc)) != rang:
+                        continue
+                    for candidat in self._grille.get((ligne + dl, colonne + dc), ()):
+                        distance = haversine_km(lat, lon, self.latitudes[candidat], self.longitudes[candidat])
+                        if distance < meilleure_distance:
+                            meilleur, meilleure_distance = candidat, distance
+            # Les cellules non visitées sont à plus de rang * km_cellule
+            if meilleur is not None and meilleure_distance <= rang * km_cellule:
+                break
+            rang += 1
+        return meilleur if meilleure_distance <= rayon_max_km else None
+
+    def plus_court_chemin(self, source, cible):
+        """A* sur la durée; retourne (distance_km, duree_h) ou None"""
+        latitudes, longitudes = self.latitudes, self.longitudes
+        lat_cible, lon_cible = latitudes[cible], longitudes[cible]
+        vitesse_max = self.vitesse_max
+
+        def heuristique(noeud):
+            return haversine_km(latitudes[noeud], longitudes[noeud], lat_cible, lon_cible) / vitesse_max
+
+        durees = {source: 0.0}
+        distances = {source: 0.0}
+        file = [(heuristique(source), source)]
+        fermes = set()
+        while file:
+            _, noeud = heapq.heappop(file)
+            if noeud == cible:
+                return distances[noeud], durees[noeud]
+            if noeud in fermes:
+                continue
+            fermes.add(noeud)
+            for voisin, distance, duree in self.voisins[noeud]:
+                nouvelle_duree = durees[noeud] + duree
+                if nouvelle_duree < durees.get(voisin, float('inf')):
+                    durees[voisin] = nouvelle_duree
+                    distances[voisin] = distances[noeud] + distance
+                    heapq.heappush(file, (nouvelle_duree + heuristique(voisin), voisin))
+        return None
+
+
+class BackendOSM(BackendRoutage):
+    """Itinéraires calculés localement sur un extrait OpenStreetMap"""
+
+    VERSION_COMPILE = 1
+
+    def __init__(self, fichier=None, repli_google=True, taille_cache=10000, **options):
+        from .services import CacheLRU
+
+        self.fichier = fichier
+        self.repli = BackendGoogle() if repli_google else None
+        self._graphe = None
+        self._verrou = threading.Lock()
+        # Trajets déjà calculés, par couple de noeuds (le graphe ne change pas en cours d'exécution)
+        self._trajets = CacheLRU(taille_cache)
+
+    @property
+    def graphe(self):
+        if self._graphe is None:
+            with self._verrou:
+                if self._graphe is None:
+                    self._graphe = self._charger()
+        return self._graphe
+
+    def _charger(self):
+        # Le graphe compilé est conservé à côté de l'extrait pour accélérer les démarrages.
+        # JSON plutôt que pickle: relire ce fichier ne peut pas exécuter de code.
+        compile = f"{self.fichier}.graphe.json"
+        if os.path.exists(compile) and os.path.getmtime(compile) >= os.path.getmtime(self.fichier):
+            try:
+                return self._lire_compile(compile)
+            except (OSError, ValueError, TypeError, KeyError) as e:
+                logger.warning(f"Graphe routier compilé illisible ({compile}), reconstruit: {e}")
+
+        graphe = GrapheRoutier.depuis_osm(self.fichier)
+        try:
+            temporaire = f"{compile}.{os.getpid()}.tmp"
+            with open(temporaire, 'w') as f:
+                json.dump({
+                    'version': self.VERSION_COMPILE,
+                    'latitudes': graphe.latitudes,
+                    'longitudes': graphe.longitudes,
+                    'voisins': graphe.voisins,
+                }, f, separators=(',', ':'))
+            os.replace(temporaire, compile)
+        except OSError as e:
+            logger.warning(f"Graphe routier non sauvegardé ({compile}): {e}")
+        logger.info(f"Graphe routier chargé: {len(graphe.latitudes)} noeuds")
+        return graphe
+
+    def _lire_compile(self, compile):
+        """Graphe du fichier compilé; ValueError si son contenu n'a pas la forme attendue"""
+        with open(compile) as f:
+            donnees = json.load(f)
+        if donnees.get('version') != self.VERSION_COMPILE:
+            raise ValueError("version du format")
+        latitudes = [float(lat) for lat in donnees['latitudes']]
+        longitudes = [float(lon) for lon in donnees['longitudes']]
+        voisins = [
+            [(int(b), float(distance), float(duree)) for b, distance, duree in aretes]
+            for aretes in donnees['voisins']
+        ]
+        if not len(latitudes) == len(longitudes) == len(voisins):
+            raise ValueError("tailles incohérentes")
+        if any(not 0 <= b < len(voisins) for aretes in voisins for b, _, _ in aretes):
+            raise ValueError("indice de noeud hors du graphe")
+        return GrapheRoutier(latitudes, longitudes, voisins)
+
+    def itineraire(self, origin_lat, origin_lng, dest_lat, dest_lng):
+        try:
+            graphe = self.graphe
+            source = graphe.noeud_proche(float(origin_lat), float(origin_lng))
+            cible = graphe.noeud_proche(float(dest_lat), float(dest_lng))
+            resultat = None
+            if source is not None and cible is not None:
+                trouve, resultat = self._trajets.get((source, cible))
+                if not trouve:
+                    resultat = graphe.plus_court_chemin(source, cible)
+                    self._trajets.set((source, cible), resultat, float('inf'))
+            if resultat is not None:
+                distance_km, duree_h = resultat
+                return distance_km, duree_h * 60
+        except Exception as e:
+            logger.error(f"Erreur routage OSM: {e}", exc_info=True)
+
+        if self.repli is not None:
+            return self.repli.itineraire(origin_lat, origin_lng, dest_lat, dest_lng)
+        return None
+
+
+_backend = None
+_verrou_backend = threading.Lock()
+
+
+def get_backend_routage():
+    """Backend configuré par ROUTAGE_BACKEND (Google par défaut)"""
+    global _backend
+    if _backend is None:
+        with _verrou_backend:
+            if _backend is None:
+                config = parametre('ROUTAGE_BACKEND', {})
+                classe = import_string(config.get('BACKEND', 'gestionclappy.routage.BackendGoogle'))
+                _backend = classe(**config.get('OPTIONS', {}))
+    return _backend
@@ -3,11 +3,15 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
 from .models import Client, Chauffeur, Vehicule, Course, Paiement, Evaluation, HistoriquePosition, Tarif
+from .telephones import filtre_telephone
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth.password_validation import validate_password
 import secrets
 import string
+from decimal import Context, Decimal
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import viewsets, permissions, status
 
 # ✅ Récupère le modèle utilisateur personnalisé
@@ -104,7 +108,7 @@ class ClientCreateSerializer(serializers.Serializer):
         return value
 
     def validate_telephone(self, value):
-        if Client.objects.filter(telephone=value).exists():
+        if Client.objects.filter(**filtre_telephone(value)).exists():
             raise serializers.ValidationError("Un client avec ce téléphone existe déjà.")
         return value
 
@@ -253,7 +257,8 @@ class CourseSerializer(serializers.ModelSerializer):
             'latitude_destination',
             'longitude_destination',
             'date_reservation',
-            'type_vehicule_demande'
+            'type_vehicule_demande',
+            'date_modification'
         ]
         read_only_fields = ['date_demande']
 
@@ -263,6 +268,92 @@ class CourseSerializer(serializers.ModelSerializer):
         return None
 
 
+
+class CourseLecture:
+    """
+    Chemin rapide des listes de courses: mêmes clés, même ordre et mêmes valeurs
+    JSON que CourseSerializer, construits depuis values() (une requête, jointures
+    sur les utilisateurs comprises) sans instancier de modèles ni de champs DRF.
+    Toute évolution de CourseSerializer doit être reportée ici: les tests de
+    l'application vérifient la parité.
+    """
+    COLONNES = (
+        'id', 'client_id', 'client__utilisateur__username', 'chauffeur_id', 'chauffeur__utilisateur__username',
+        'adresse_depart', 'adresse_destination', 'type_course', 'statut', 'methode_paiement',
+        'tarif_estime', 'tarif_final', 'date_debut', 'date_fin',
+        'latitude_depart', 'longitude_depart', 'latitude_destination', 'longitude_destination',
+        'date_reservation', 'type_vehicule_demande', 'date_modification', 'date_demande',
+    )
+    _CENTIMES = Decimal('0.01')
+    _COORDONNEE = Decimal('.1') ** 20
+    _CONTEXTE_COORDONNEE = Context(prec=25)
+    _CONTEXTE_TARIF = Context(prec=10)
+
+    @staticmethod
+    def projeter(queryset):
+        return queryset.values(*CourseLecture.COLONNES)
+
+    @staticmethod
+    def _tarif(valeur):
+        if valeur is None:
+            return None
+        return format(valeur.quantize(CourseLecture._CENTIMES, context=CourseLecture._CONTEXTE_TARIF), 'f')
+
+    @staticmethod
+    def _coordonnee(valeur):
+        # Comme serializers.DecimalField: Decimal(str(valeur)) puis 20 décimales
+        if valeur is None:
+            return None
+        return format(Decimal(str(valeur)).quantize(
+            CourseLecture._COORDONNEE, context=CourseLecture._CONTEXTE_COORDONNEE), 'f')
+
+    @staticmethod
+    def _date(valeur, fuseau):
+        if valeur is None:
+            return None
+        if fuseau is not None:
+            valeur = valeur.astimezone(fuseau)
+        texte = valeur.isoformat()
+        return texte[:-6] + 'Z' if texte.endswith('+00:00') else texte
+
+    @staticmethod
+    def representer(lignes):
+        """Liste de dicts prêts pour Response, à partir de lignes de projeter()"""
+        fuseau = timezone.get_current_timezone() if settings.USE_TZ else None
+        tarif, coordonnee, date = CourseLecture._tarif, CourseLecture._coordonnee, CourseLecture._date
+        resultats = []
+        for ligne in lignes:
+            course = {
+                'id': ligne['id'],
+                'client': ligne['client_id'],
+                'client_nom_complet': ligne['client__utilisateur__username'],
+            }
+            # CourseSerializer omet le nom quand la course n'a pas de chauffeur
+            if ligne['chauffeur_id'] is not None:
+                course['chauffeur_nom_complet'] = ligne['chauffeur__utilisateur__username']
+            debut, fin = ligne['date_debut'], ligne['date_fin']
+            course.update({
+                'chauffeur_id': ligne['chauffeur_id'],
+                'adresse_depart': ligne['adresse_depart'],
+                'adresse_destination': ligne['adresse_destination'],
+                'type_course': ligne['type_course'],
+                'statut': ligne['statut'],
+                'methode_paiement': ligne['methode_paiement'],
+                'tarif_estime': tarif(ligne['tarif_estime']),
+                'tarif_final': tarif(ligne['tarif_final']),
+                'duree_totale': (fin - debut).total_seconds() / 60 if debut and fin else None,
+                'latitude_depart': coordonnee(ligne['latitude_depart']),
+                'longitude_depart': coordonnee(ligne['longitude_depart']),
+                'latitude_destination': coordonnee(ligne['latitude_destination']),
+                'longitude_destination': coordonnee(ligne['longitude_destination']),
+                'date_reservation': date(ligne['date_reservation'], fuseau),
+                'type_vehicule_demande': ligne['type_vehicule_demande'],
+                'date_modification': date(ligne['date_modification'], fuseau),
+            })
+            resultats.append(course)
+        return resultats
+
+
 # ================= AUTRES =================
 class PaiementSerializer(serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(view_name='paiement-detail')
@@ -278,6 +369,8 @@ class EvaluationSerializer(serializers.ModelSerializer):
 
 class HistoriquePositionSerializer(serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(view_name='historiqueposition-detail')
+    latitude = serializers.DecimalField(max_digits=9, decimal_places=6)
+    longitude = serializers.DecimalField(max_digits=9, decimal_places=6)
     class Meta:
         model = HistoriquePosition
         fields = '__all__'  # ✅ correction
@@ -852,7 +945,7 @@ class EvaluationViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
 class HistoriquePositionViewSet(viewsets.ModelViewSet):
-    queryset = HistoriquePosition.objects.all().select_related('chauffeur__utilisateur')
+    queryset = HistoriquePosition.objects.select_related('chauffeur__utilisateur').order_by('-date_position')
     serializer_class = HistoriquePositionSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -1062,11 +1155,13 @@ class CheckPhoneView(APIView):
                 'error': 'Le numéro de téléphone est requis'
             }, status=400)
         
+        critere = filtre_telephone(telephone)
+
         # Vérifier si le téléphone existe dans Client
-        client_exists = Client.objects.filter(telephone=telephone).exists()
+        client_exists = Client.objects.filter(**critere).exists()
         
         # Vérifier si le téléphone existe dans Chauffeur (si applicable)
-        chauffeur_exists = Chauffeur.objects.filter(telephone=telephone).exists()
+        chauffeur_exists = Chauffeur.objects.filter(**critere).exists()
         
         exists = client_exists or chauffeur_exists
         
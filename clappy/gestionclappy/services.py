@@ -1,67 +1,191 @@
 # services.py
 import googlemaps
 import json
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import timedelta
 from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
 from decimal import Decimal
 
+from .reglages import parametre
+
+# ================= CACHE GOOGLE MAPS =================
+# Deux niveaux: LRU en mémoire du processus, puis table CacheGeographique partagée
+
+class CacheLRU:
+    """Cache LRU en mémoire avec durée de vie par entrée"""
+
+    def __init__(self, taille_max=5000):
+        self.taille_max = taille_max
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def get(self, cle):
+        """Retourne (trouve, valeur)"""
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is None:
+                return False, None
+            valeur, expiration = entree
+            if expiration < time.monotonic():
+                del self._entrees[cle]
+                return False, None
+            self._entrees.move_to_end(cle)
+            return True, valeur
+
+    def set(self, cle, valeur, ttl):
+        with self._verrou:
+            self._entrees[cle] = (valeur, time.monotonic() + ttl)
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+
+
+cache_memoire = CacheLRU(parametre('GOOGLE_MAPS_CACHE_TAILLE_MEMOIRE', 5000))
+statistiques_cache = Counter()
+
+_client = None
+_verrou_client = threading.Lock()
+
+
+def get_client_google():
+    """Client Google Maps réutilisé (GOOGLE_MAPS_BASE_URL permet de viser un serveur local de test)"""
+    global _client
+    if _client is None:
+        with _verrou_client:
+            if _client is None:
+                _client = googlemaps.Client(
+                    key=settings.GOOGLE_MAPS_API_KEY,
+                    base_url=parametre('GOOGLE_MAPS_BASE_URL', 'https://maps.googleapis.com')
+                )
+    return _client
+
+
+def normaliser_adresse(address):
+    """Minuscules, ponctuation et espaces multiples retirés"""
+    return ' '.join(re.sub(r'[^\w]+', ' ', str(address).lower()).split())
+
+
+def _depuis_cache(cle, type_requete, ttl, calculer):
+    """
+    Valeur en cache pour `cle`, sinon calculée par `calculer()` puis mémorisée.
+    Les résultats None (erreur, adresse introuvable) ne sont pas mis en cache.
+    """
+    from .models import CacheGeographique
+
+    trouve, valeur = cache_memoire.get(cle)
+    if trouve:
+        statistiques_cache[f'{type_requete}_memoire'] += 1
+        return valeur
+
+    maintenant = timezone.now()
+    entree = CacheGeographique.objects.filter(cle=cle, date_expiration__gt=maintenant).first()
+    if entree is not None:
+        statistiques_cache[f'{type_requete}_base'] += 1
+        CacheGeographique.objects.filter(pk=entree.pk).update(nombre_hits=F('nombre_hits') + 1)
+        restant = (entree.date_expiration - maintenant).total_seconds()
+        cache_memoire.set(cle, entree.valeur, restant)
+        return entree.valeur
+
+    statistiques_cache[f'{type_requete}_manque'] += 1
+    valeur = calculer()
+    if valeur is not None:
+        CacheGeographique.objects.update_or_create(
+            cle=cle,
+            defaults={
+                'type_requete': type_requete,
+                'valeur': valeur,
+                'date_expiration': maintenant + timedelta(seconds=ttl),
+            }
+        )
+        cache_memoire.set(cle, valeur, ttl)
+    return valeur
+
+
 def geocode_address(address):
     """
     Convertit une adresse en coordonnées géographiques
     """
     try:
-        gmaps = googlemaps.Client(key=settings.GOOGLE_MAPS_API_KEY)
-        result = gmaps.geocode(str(address))
-        
-        if result:
-            latitude = result[0]['geometry']['location']['lat']
-            longitude = result[0]['geometry']['location']['lng']
+        def calculer():
+            result = get_client_google().geocode(str(address))
+            if result:
+                location = result[0]['geometry']['location']
+                return [location['lat'], location['lng']]
+            return None
+
+        cle = f"geocodage:{normaliser_adresse(address)}"[:255]
+        ttl = parametre('GOOGLE_MAPS_CACHE_TTL_GEOCODAGE', 30 * 24 * 3600)
+        coordonnees = _depuis_cache(cle, 'geocodage', ttl, calculer)
+
+        if coordonnees:
+            latitude, longitude = coordonnees
             return Decimal(str(latitude)), Decimal(str(longitude))
         return None, None
     except Exception as e:
         print(f"Erreur de géocodage: {e}")
         return None, None
 
-def calculate_route_distance_duration(origin_lat, origin_lng, dest_lat, dest_lng):
+def itineraire_google(origin_lat, origin_lng, dest_lat, dest_lng):
     """
-    Calcule la distance et la durée entre deux points
-    Retourne (distance_km, durée_minutes)
+    Distance Matrix Google, avec cache
+    Retourne (distance_km, durée_minutes) en float, ou None
     """
-    try:
-        gmaps = googlemaps.Client(key=settings.GOOGLE_MAPS_API_KEY)
-        result = gmaps.distance_matrix(
+    def calculer():
+        result = get_client_google().distance_matrix(
             origins=(origin_lat, origin_lng),
             destinations=(dest_lat, dest_lng),
             mode="driving",
             units="metric"
         )
-        
         if result['rows'][0]['elements'][0]['status'] == 'OK':
             element = result['rows'][0]['elements'][0]
             distance_km = element['distance']['value'] / 1000  # Convertir en km
             duration_min = element['duration']['value'] / 60   # Convertir en minutes
+            return [distance_km, duration_min]
+        return None
+
+    # Points arrondis (~11 m à 4 décimales) pour partager les trajets fréquents
+    precision = parametre('GOOGLE_MAPS_CACHE_PRECISION', 4)
+    points = ','.join(f"{round(float(valeur), precision)}" for valeur in (origin_lat, origin_lng, dest_lat, dest_lng))
+    ttl = parametre('GOOGLE_MAPS_CACHE_TTL_ITINERAIRE', 7 * 24 * 3600)
+    trajet = _depuis_cache(f"itineraire:{points}", 'itineraire', ttl, calculer)
+    return tuple(trajet) if trajet else None
+
+def calculate_route_distance_duration(origin_lat, origin_lng, dest_lat, dest_lng):
+    """
+    Calcule la distance et la durée entre deux points (backend ROUTAGE_BACKEND)
+    Retourne (distance_km, durée_minutes)
+    """
+    from .routage import get_backend_routage
+    try:
+        trajet = get_backend_routage().itineraire(origin_lat, origin_lng, dest_lat, dest_lng)
+
+        if trajet:
+            distance_km, duration_min = trajet
             return Decimal(str(distance_km)), Decimal(str(duration_min))
         return None, None
     except Exception as e:
         print(f"Erreur calcul itinéraire: {e}")
         return None, None
 
-def estimate_fare(distance_km, duration_min, vehicle_type='berline'):
+def estimate_fare(distance_km, duration_min, vehicle_type='berline', latitude=None, longitude=None):
     """
     Estime le tarif basé sur la distance, durée et type de véhicule
+    (table des tarifs en mémoire, voir tarification.py). Le point de départ
+    optionnel applique la majoration dynamique de sa zone.
     """
     try:
-        # Récupérer les tarifs depuis la base de données
-        from .models import Tarif
-        tarif = Tarif.objects.filter(type_vehicule=vehicle_type, est_actif=True).first()
-        
-        if tarif:
-            fare = (tarif.prix_base + 
-                   (distance_km * tarif.prix_par_km) + 
-                   (duration_min * tarif.prix_par_minute))
-            return Decimal(str(fare))
-        
-        # Tarif par défaut si aucun tarif trouvé
-        return Decimal(str(5000 + (distance_km * 1500) + (duration_min * 200)))
+        from .tarification import moteur_tarifaire
+        return moteur_tarifaire.devis(distance_km, duration_min, vehicle_type, latitude, longitude)
     except Exception as e:
         print(f"Erreur estimation tarif: {e}")
-        return Decimal('10000')  # Tarif minimum
\ No newline at end of file
+        return Decimal('10000')  # Tarif minimum
@@ -0,0 +1,103 @@
+# signals.py
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .majoration import moteur_majoration
+from .models import Chauffeur, Course, CourseSupprimee, HistoriquePosition, Tarif, Vehicule
+from .positions import get_index
+from .tarification import moteur_tarifaire
+
+# Champs de Course dont dépend le décompte des demandes
+CHAMPS_MAJORATION_COURSE = {'statut', 'latitude_depart', 'longitude_depart', 'type_vehicule_demande'}
+
+
+@receiver(post_save, sender=HistoriquePosition)
+def indexer_position(sender, instance, created, **kwargs):
+    """Garder l'index des positions en direct synchronisé avec chaque point GPS enregistré"""
+    get_index().mettre_a_jour(instance.chauffeur_id, instance.latitude, instance.longitude, instance.date_position)
+    moteur_majoration.chauffeur_deplace(instance.chauffeur_id, instance.latitude, instance.longitude)
+
+
+@receiver(post_save, sender=Tarif)
+@receiver(post_delete, sender=Tarif)
+def invalider_tarifs(sender, **kwargs):
+    """Recharger la table des tarifs au prochain devis, une fois la modification validée"""
+    transaction.on_commit(moteur_tarifaire.invalider)
+
+
+@receiver(pre_save, sender=Chauffeur)
+def memoriser_statut(sender, instance, update_fields=None, **kwargs):
+    """Statut en base avant l'enregistrement, lu seulement quand il peut changer"""
+    if update_fields is not None and 'statut' not in update_fields:
+        return
+    if instance._state.adding:
+        instance._statut_precedent = None
+    else:
+        instance._statut_precedent = Chauffeur.objects.filter(pk=instance.pk).values_list('statut', flat=True).first()
+
+
+@receiver(post_save, sender=Course)
+def majoration_course(sender, instance, created, update_fields=None, **kwargs):
+    """Demande ouverte par zone pour la majoration dynamique, appliquée après commit"""
+    if update_fields is not None and not CHAMPS_MAJORATION_COURSE.intersection(update_fields):
+        return
+    if instance.statut == 'demandee':
+        transaction.on_commit(partial(
+            moteur_majoration.course_ouverte, instance.id, instance.latitude_depart, instance.longitude_depart,
+            instance.type_vehicule_demande, instance.date_demande.timestamp()
+        ))
+    elif not created:
+        # Sans effet si la course n'était pas comptée
+        transaction.on_commit(partial(moteur_majoration.course_fermee, instance.id))
+
+
+@receiver(post_delete, sender=Course)
+def majoration_course_supprimee(sender, instance, **kwargs):
+    transaction.on_commit(partial(moteur_majoration.course_fermee, instance.id))
+
+
+@receiver(post_delete, sender=Course)
+def tracer_course_supprimee(sender, instance, **kwargs):
+    """Pierre tombale lue par la synchronisation par delta"""
+    CourseSupprimee.objects.create(
+        course_id=instance.id,
+        client_id=instance.client_id,
+        chauffeur_id=instance.chauffeur_id,
+        type_vehicule_demande=instance.type_vehicule_demande,
+    )
+
+
+@receiver(post_save, sender=Chauffeur)
+def majoration_chauffeur(sender, instance, created, update_fields=None, **kwargs):
+    """Offre disponible par zone pour la majoration dynamique, appliquée après commit"""
+    if update_fields is not None and 'statut' not in update_fields:
+        return
+    if instance.statut == getattr(instance, '_statut_precedent', None) and not created:
+        return
+    instance._statut_precedent = instance.statut
+    chauffeur_id = instance.id
+    if instance.statut == 'disponible':
+        type_vehicule = Vehicule.objects.filter(chauffeur_id=chauffeur_id).values_list('type_vehicule', flat=True).first()
+        if type_vehicule is not None:
+            transaction.on_commit(partial(_chauffeur_disponible, chauffeur_id, type_vehicule))
+    else:
+        transaction.on_commit(partial(moteur_majoration.chauffeur_indisponible, chauffeur_id))
+
+
+@receiver(post_save, sender=Vehicule)
+def majoration_vehicule(sender, instance, **kwargs):
+    """Changement de type de véhicule d'un chauffeur disponible"""
+    if instance.chauffeur.statut == 'disponible':
+        transaction.on_commit(partial(_chauffeur_disponible, instance.chauffeur_id, instance.type_vehicule))
+
+
+def _chauffeur_disponible(chauffeur_id, type_vehicule):
+    """(Re)compter le chauffeur avec sa dernière position connue"""
+    position = get_index().position(chauffeur_id)
+    moteur_majoration.chauffeur_indisponible(chauffeur_id)
+    moteur_majoration.chauffeur_disponible(
+        chauffeur_id, type_vehicule, *(position[:2] if position is not None else (None, None))
+    )
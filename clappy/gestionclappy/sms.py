@@ -0,0 +1,229 @@
+# sms.py
+"""
+Envoi des SMS NimbaSMS par un pool borné de workers.
+
+Les appelants déposent un message dans la file (soumettre) et reprennent la
+main aussitôt; chaque worker garde sa propre connexion HTTP(S) ouverte
+(keep-alive), ce qui évite une poignée de main TLS par SMS. Un même message
+destiné à plusieurs numéros (soumettre_groupe) part en quelques requêtes
+grâce au champ "to" de NimbaSMS.
+"""
+import atexit
+import http.client
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from .reglages import parametre
+from .telephones import normaliser_telephone
+
+logger = logging.getLogger(__name__)
+
+_E164 = re.compile(r'^\+[1-9]\d{6,14}$')
+
+
+def formater_e164(telephone):
+    """Numéro au format E.164 (région GN par défaut), ou None s'il est invalide"""
+    if _E164.match(telephone or ''):
+        # Déjà normalisé (colonne telephone_e164): pas de nouvelle analyse
+        return telephone
+    phone_e164 = normaliser_telephone(telephone)
+    if phone_e164 is None:
+        logger.error(f"Numéro invalide: {telephone}")
+    return phone_e164
+
+
+class ConnexionNimbaSMS:
+    """Connexion persistante vers l'API NimbaSMS, rouverte si le serveur l'a fermée"""
+
+    def __init__(self):
+        self.hote = parametre('NIMBASMS_HOTE', 'api.nimbasms.com')
+        self.port = parametre('NIMBASMS_PORT', None)
+        self.https = parametre('NIMBASMS_HTTPS', True)
+        self.timeout = parametre('SMS_TIMEOUT_SECONDES', 30)
+        self._conn = None
+
+    def _ouvrir(self):
+        classe = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return classe(self.hote, self.port, timeout=self.timeout)
+
+    def fermer(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def envoyer(self, payload):
+        """POST /v1/messages; retourne (statut HTTP, corps)"""
+        headers = {
+            "Authorization": settings.NIMBASMS_API_KEY.strip(),
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+        corps = json.dumps(payload)
+        for tentative in range(2):
+            if self._conn is None:
+                self._conn = self._ouvrir()
+            try:
+                self._conn.request("POST", "/v1/messages", body=corps, headers=headers)
+                response = self._conn.getresponse()
+                response_body = response.read().decode()
+                if response.will_close:
+                    self.fermer()
+                return response.status, response_body
+            except (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                    http.client.BadStatusLine, BrokenPipeError, ConnectionResetError):
+                # Connexion keep-alive fermée côté serveur: une seule nouvelle tentative
+                self.fermer()
+                if tentative:
+                    raise
+            except Exception:
+                self.fermer()
+                raise
+
+
+class DispatcheurSMS:
+    """File d'envoi SMS servie par un nombre fixe de workers"""
+
+    def __init__(self, nombre_workers=None, taille_file=None):
+        self.nombre_workers = nombre_workers or parametre('SMS_NOMBRE_WORKERS', 4)
+        self._file = queue.Queue(maxsize=taille_file or parametre('SMS_TAILLE_FILE', 10000))
+        self._workers = []
+        self._verrou = threading.Lock()
+
+    def demarrer(self):
+        with self._verrou:
+            if self._workers:
+                return
+            for numero in range(self.nombre_workers):
+                worker = threading.Thread(target=self._travailler, name=f"sms-{numero}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def soumettre(self, telephone, message):
+        """
+        Mettre un SMS en file et rendre la main immédiatement.
+        Retourne un Future résolu à True/False une fois l'envoi tenté.
+        """
+        if not telephone:
+            print("❌ Aucun numéro de téléphone fourni")
+            resultat = Future()
+            resultat.set_result(False)
+            return resultat
+        return self.soumettre_groupe([telephone], message)[telephone]
+
+    def soumettre_groupe(self, telephones, message):
+        """
+        Même message pour plusieurs destinataires: regroupés par requêtes de
+        SMS_MAX_DESTINATAIRES numéros (champ "to" de NimbaSMS).
+        Retourne {telephone: Future} pour suivre chaque destinataire.
+        """
+        resultats = {}
+        for telephone in telephones:
+            if telephone and telephone not in resultats:
+                resultats[telephone] = Future()
+        if not resultats:
+            return resultats
+
+        self.demarrer()
+        taille = max(parametre('SMS_MAX_DESTINATAIRES', 100), 1)
+        destinataires = list(resultats.items())
+        for debut in range(0, len(destinataires), taille):
+            lot = destinataires[debut:debut + taille]
+            try:
+                self._file.put_nowait((lot, message))
+            except queue.Full:
+                logger.error(f"File SMS pleine, message pour {len(lot)} destinataires abandonné")
+                for _, resultat in lot:
+                    resultat.set_result(False)
+        return resultats
+
+    def envoyer(self, telephone, message, timeout=None):
+        """Envoi en attendant le résultat (True si NimbaSMS a accepté le message)"""
+        timeout = timeout or parametre('SMS_TIMEOUT_SECONDES', 30) * 2
+        try:
+            return self.soumettre(telephone, message).result(timeout=timeout)
+        except Exception as e:
+            logger.error(f"SMS pour {telephone} sans réponse: {e}")
+            return False
+
+    def en_attente(self):
+        return self._file.qsize()
+
+    def vider(self, timeout=10):
+        """Attendre (au plus `timeout` s) que la file soit traitée, par exemple à l'arrêt"""
+        limite = time.monotonic() + timeout
+        while self._file.unfinished_tasks and time.monotonic() < limite:
+            time.sleep(0.05)
+
+    def _travailler(self):
+        connexion = ConnexionNimbaSMS()
+        while True:
+            lot, message = self._file.get()
+            try:
+                self._envoyer_lot(connexion, lot, message)
+            except Exception as e:
+                logger.error(f"Erreur envoi SMS: {str(e)}", exc_info=True)
+                print(f"❌ Exception envoi SMS: {str(e)}")
+            finally:
+                for _, resultat in lot:
+                    if not resultat.done():
+                        resultat.set_result(False)
+                self._file.task_done()
+
+    def _envoyer_lot(self, connexion, lot, message):
+        """Un POST pour tout le lot; chaque Future reçoit le résultat de son destinataire"""
+        valides = []
+        deja_vus = set()
+        for telephone, resultat in lot:
+            phone_e164 = formater_e164(telephone)
+            if phone_e164 is None:
+                print(f"❌ Numéro invalide: {telephone}")
+                resultat.set_result(False)
+                continue
+            valides.append((telephone, phone_e164, resultat))
+            deja_vus.add(phone_e164)
+        if not valides:
+            return
+
+        if not parametre('NIMBASMS_API_KEY', None):
+            print("❌ Clé API NimbaSMS non configurée")
+            for _, _, resultat in valides:
+                resultat.set_result(False)
+            return
+
+        print(f"📱 Envoi SMS à {len(valides)} destinataire(s)")
+        payload = {
+            "to": sorted(deja_vus),
+            "sender_name": parametre('NIMBASMS_SENDER_NAME', 'CLAPPY'),
+            "message": message
+        }
+        statut, response_body = connexion.envoyer(payload)
+        logger.info(f"Réponse NimbaSMS: {statut} {response_body}")
+
+        if statut == 201:
+            logger.info(f"SMS envoyé avec succès à {len(valides)} destinataire(s)")
+            print(f"✅ SMS envoyé avec succès à {', '.join(telephone for telephone, _, _ in valides)}")
+            for _, _, resultat in valides:
+                resultat.set_result(True)
+            return
+
+        logger.error(f"Erreur SMS {statut}: {response_body}")
+        print(f"❌ Erreur SMS {statut}: {response_body}")
+        if 400 <= statut < 500 and len(valides) > 1:
+            # Lot refusé (numéro rejeté, lot trop grand...): un envoi par destinataire
+            # pour isoler les échecs
+            for telephone, _, resultat in valides:
+                self._envoyer_lot(connexion, [(telephone, resultat)], message)
+            return
+        for _, _, resultat in valides:
+            resultat.set_result(False)
+
+
+dispatcheur_sms = DispatcheurSMS()
+atexit.register(dispatcheur_sms.vider)
@@ -0,0 +1,89 @@
+# synchronisation.py
+"""
+Synchronisation par delta des courses (« qu'est-ce qui a changé depuis T »).
+
+L'appareil renvoie le jeton de sa dernière synchronisation et reçoit les
+courses créées ou modifiées depuis, plus les identifiants à retirer: courses
+supprimées (CourseSupprimee) et courses sorties de sa liste (acceptées par un
+autre chauffeur, statut qui ne correspond plus au filtre...).
+
+La fenêtre s'arrête à maintenant - SYNC_MARGE_SECONDES: une transaction plus
+lente que la marge, ou un serveur dont l'horloge retarde d'autant, écrit une
+date_modification déjà dépassée par un jeton. Une course modifiée apparaît donc
+avec jusqu'à la marge de retard, jamais perdue. Au-delà de SYNC_TAILLE_MAX
+courses, la réponse est partielle (complet: false) et le jeton reprend au
+couple (date_modification, id) suivant.
+"""
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Course, CourseSupprimee
+from .pagination import decoder_curseur, encoder_curseur
+from .reglages import parametre
+
+
+# Même codage que les curseurs de pagination; le jeton peut ne porter que la date
+encoder_jeton = encoder_curseur
+
+
+def decoder_jeton(jeton):
+    """(date, id ou None) ou ValueError"""
+    date, identifiant = decoder_curseur(jeton)
+    if timezone.is_naive(date):
+        raise ValueError("Date sans fuseau")
+    return date, identifiant
+
+
+def _apres(queryset, date, identifiant, champ):
+    """Strictement après le jeton: (date, id) > (d, i), ou date > d sans id"""
+    if identifiant is None:
+        return queryset.filter(**{f'{champ}__gt': date})
+    return queryset.filter(**{f'{champ}__gte': date}).filter(
+        Q(**{f'{champ}__gt': date}) | Q(id__gt=identifiant)
+    )
+
+
+def modifications(visibles, perimetre, jeton=None, taille_max=None):
+    """
+    `visibles`: courses que l'appareil doit avoir (queryset de la liste).
+    `perimetre`: filtres communs à Course et CourseSupprimee ({'client_id': ...})
+    désignant ce que l'appareil a pu recevoir.
+    Retourne {'courses': [Course], 'supprimees': [id], 'jeton': str, 'complet': bool}.
+    Sans jeton: toutes les courses visibles (première synchronisation).
+    """
+    taille_max = taille_max or parametre('SYNC_TAILLE_MAX', 500)
+    borne = timezone.now() - timedelta(seconds=parametre('SYNC_MARGE_SECONDES', 2))
+    depuis, dernier_id = decoder_jeton(jeton) if jeton else (None, None)
+
+    courses = visibles.filter(date_modification__lte=borne)
+    if depuis is not None:
+        courses = _apres(courses, depuis, dernier_id, 'date_modification')
+    courses = list(courses.order_by('date_modification', 'id')[:taille_max + 1])
+
+    complet = len(courses) <= taille_max
+    if complet:
+        fin, jeton_suivant = borne, encoder_jeton(borne)
+    else:
+        courses = courses[:taille_max]
+        fin = courses[-1].date_modification
+        jeton_suivant = encoder_jeton(fin, courses[-1].id)
+
+    supprimees = []
+    if depuis is not None:
+        # Quelques identifiants en double d'un appel à l'autre sont sans effet côté appareil
+        changees = list(
+            Course.objects.filter(**perimetre)
+            .filter(date_modification__gte=depuis, date_modification__lte=fin)
+            .values_list('id', flat=True)
+        )
+        encore_visibles = set(visibles.filter(pk__in=changees).values_list('id', flat=True)) if changees else set()
+        tombes = (
+            CourseSupprimee.objects.filter(**perimetre)
+            .filter(date_suppression__gte=depuis, date_suppression__lte=fin)
+            .values_list('course_id', flat=True)
+        )
+        supprimees = sorted((set(changees) - encore_visibles) | set(tombes))
+
+    return {'courses': courses, 'supprimees': supprimees, 'jeton': jeton_suivant, 'complet': complet}
@@ -0,0 +1,117 @@
+# tarification.py
+"""
+Moteur de tarification: les Tarif actifs sont chargés une fois dans une table
+immuable (un tarif compilé par type de véhicule), invalidée par les signaux
+post_save/post_delete de Tarif. Un devis ne fait alors aucune requête SQL.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from types import MappingProxyType
+
+from .majoration import moteur_majoration
+from .reglages import parametre
+
+logger = logging.getLogger(__name__)
+
+CENTIME = Decimal('0.01')
+
+
+@dataclass(frozen=True)
+class TarifCompile:
+    type_vehicule: str
+    prix_base: Decimal
+    prix_par_km: Decimal
+    prix_par_minute: Decimal
+    tarif_minimum: Decimal
+
+    def devis(self, distance_km, duree_min, multiplicateur=1.0):
+        """Prix de la course: (base + distance + durée) x majoration, jamais sous le minimum"""
+        prix = (
+            self.prix_base
+            + Decimal(str(distance_km)) * self.prix_par_km
+            + Decimal(str(duree_min)) * self.prix_par_minute
+        )
+        if multiplicateur != 1.0:
+            prix *= Decimal(str(multiplicateur))
+        return max(prix, self.tarif_minimum).quantize(CENTIME)
+
+
+# Tarif appliqué quand aucun Tarif actif n'existe pour le type de véhicule
+TARIF_PAR_DEFAUT = TarifCompile(
+    type_vehicule='defaut',
+    prix_base=Decimal('5000'),
+    prix_par_km=Decimal('1500'),
+    prix_par_minute=Decimal('200'),
+    tarif_minimum=Decimal('0'),
+)
+
+
+class MoteurTarifaire:
+    """Table des tarifs actifs, rechargée paresseusement après invalidation"""
+
+    def __init__(self, duree_validite=None):
+        # Filet de sécurité pour les autres processus, que les signaux n'atteignent pas
+        self.duree_validite = duree_validite or parametre('TARIFICATION_VALIDITE_SECONDES', 300)
+        self._table = None
+        self._charge_le = 0.0
+        self._verrou = threading.Lock()
+
+    def table(self):
+        """Mapping immuable type_vehicule -> TarifCompile"""
+        table = self._table
+        if table is None or time.monotonic() - self._charge_le > self.duree_validite:
+            with self._verrou:
+                if self._table is table:
+                    self._table = self._charger()
+                    self._charge_le = time.monotonic()
+                table = self._table
+        return table
+
+    @staticmethod
+    def _charger():
+        from .models import Tarif
+
+        table = {}
+        # Même choix que l'ancien filter(...).first(): le plus petit id par type
+        for tarif in Tarif.objects.filter(est_actif=True).order_by('-id'):
+            table[tarif.type_vehicule] = TarifCompile(
+                type_vehicule=tarif.type_vehicule,
+                prix_base=tarif.prix_base,
+                prix_par_km=tarif.prix_par_km,
+                prix_par_minute=tarif.prix_par_minute,
+                tarif_minimum=tarif.tarif_minimum,
+            )
+        logger.info(f"Table des tarifs chargée: {len(table)} types de véhicule")
+        return MappingProxyType(table)
+
+    def invalider(self):
+        with self._verrou:
+            self._table = None
+
+    def tarif(self, type_vehicule):
+        return self.table().get(type_vehicule, TARIF_PAR_DEFAUT)
+
+    def devis(self, distance_km, duree_min, type_vehicule='berline', latitude=None, longitude=None):
+        """Prix d'un trajet; le point de départ, s'il est connu, applique la majoration de sa zone"""
+        multiplicateur = moteur_majoration.multiplicateur(latitude, longitude, type_vehicule)
+        return self.tarif(type_vehicule).devis(distance_km, duree_min, multiplicateur)
+
+    def devis_lot(self, trajets):
+        """
+        Tarifer plusieurs trajets d'un coup: `trajets` est une séquence de
+        (distance_km, duree_min, type_vehicule[, latitude, longitude]);
+        retourne la liste des (prix, multiplicateur).
+        """
+        table = self.table()
+        resultat = []
+        for distance_km, duree_min, type_vehicule, *depart in trajets:
+            multiplicateur = moteur_majoration.multiplicateur(*(depart or (None, None)), type_vehicule)
+            tarif = table.get(type_vehicule, TARIF_PAR_DEFAUT)
+            resultat.append((tarif.devis(distance_km, duree_min, multiplicateur), multiplicateur))
+        return resultat
+
+
+moteur_tarifaire = MoteurTarifaire()
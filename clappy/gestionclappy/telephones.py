@@ -0,0 +1,38 @@
+# telephones.py
+"""
+Normalisation des numéros de téléphone au format E.164.
+
+Un même numéro saisi "622 00 00 00", "00224622000000" ou "+224622000000"
+donne toujours "+224622000000": c'est cette forme qui est stockée dans les
+colonnes indexées telephone_e164 et comparée lors des recherches.
+"""
+from functools import lru_cache
+
+import phonenumbers
+
+REGION_PAR_DEFAUT = "GN"
+
+
+@lru_cache(maxsize=4096)
+def normaliser_telephone(telephone, region=REGION_PAR_DEFAUT):
+    """Numéro au format E.164, ou None s'il est vide, illisible ou invalide"""
+    if not telephone:
+        return None
+    try:
+        parsed = phonenumbers.parse(str(telephone), region)
+    except phonenumbers.NumberParseException:
+        return None
+    if not phonenumbers.is_valid_number(parsed):
+        return None
+    return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+
+
+def filtre_telephone(telephone, champ='telephone'):
+    """
+    Critère de recherche d'un numéro: égalité sur la colonne E.164 indexée,
+    ou sur le texte brut si le numéro ne se normalise pas.
+    """
+    e164 = normaliser_telephone(telephone.strip()) if telephone else None
+    if e164 is not None:
+        return {f'{champ}_e164': e164}
+    return {champ: telephone}
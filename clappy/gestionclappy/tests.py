@@ -1,3 +1,548 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
 
-# Create your tests here.
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from gestionclappy import notifications, services
+from gestionclappy.courses import ACCEPTEE, DEJA_PRISE, accepter_course
+from gestionclappy.exports import EXPORTS
+from gestionclappy.models import CacheGeographique, Chauffeur, Client, Course, CustomUser, NotificationSortante, Paiement
+from gestionclappy.serializers import CourseLecture, CourseSerializer
+from gestionclappy.synchronisation import decoder_jeton, encoder_jeton, modifications
+from gestionclappy.views import notifier_sans_annuler
+
+
+class _FauxGoogleMaps(BaseHTTPRequestHandler):
+    """Réponses minimales des API Geocoding et Distance Matrix, appels comptés par chemin"""
+    appels = Counter()
+
+    def do_GET(self):
+        chemin = urlparse(self.path).path
+        self.appels[chemin] += 1
+        if chemin == '/maps/api/geocode/json':
+            if 'introuvable' in self.path:
+                corps = {'status': 'ZERO_RESULTS', 'results': []}
+            else:
+                corps = {'status': 'OK', 'results': [{'geometry': {'location': {'lat': 9.5092, 'lng': -13.7122}}}]}
+        elif chemin == '/maps/api/distancematrix/json':
+            corps = {'status': 'OK', 'rows': [{'elements': [
+                {'status': 'OK', 'distance': {'value': 5400}, 'duration': {'value': 900}}
+            ]}]}
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        contenu = json.dumps(corps).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(contenu)))
+        self.end_headers()
+        self.wfile.write(contenu)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CacheGoogleMapsTests(TestCase):
+    """Client Google Maps dirigé vers un serveur local (GOOGLE_MAPS_BASE_URL): LRU, puis base, puis API"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.serveur = ThreadingHTTPServer(('127.0.0.1', 0), _FauxGoogleMaps)
+        threading.Thread(target=cls.serveur.serve_forever, daemon=True).start()
+        cls.reglages = override_settings(
+            GOOGLE_MAPS_API_KEY='AIzaFauxCleDeTest',
+            GOOGLE_MAPS_BASE_URL=f'http://127.0.0.1:{cls.serveur.server_address[1]}',
+        )
+        cls.reglages.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.reglages.disable()
+        cls.serveur.shutdown()
+        cls.serveur.server_close()
+        services._client = None
+        super().tearDownClass()
+
+    def setUp(self):
+        services._client = None
+        services.cache_memoire.vider()
+        services.statistiques_cache.clear()
+        _FauxGoogleMaps.appels.clear()
+
+    def test_geocodage_lru_puis_base_puis_api(self):
+        attendu = services.geocode_address("Kaloum, Conakry")
+        self.assertEqual(attendu, (services.Decimal('9.5092'), services.Decimal('-13.7122')))
+        self.assertEqual(_FauxGoogleMaps.appels['/maps/api/geocode/json'], 1)
+
+        # Même adresse à la casse et à la ponctuation près: mémoire du processus
+        self.assertEqual(services.geocode_address("  KALOUM,   conakry! "), attendu)
+        self.assertEqual(_FauxGoogleMaps.appels['/maps/api/geocode/json'], 1)
+        self.assertEqual(services.statistiques_cache['geocodage_memoire'], 1)
+
+        # Autre processus (LRU vide): la table partagée répond
+        services.cache_memoire.vider()
+        self.assertEqual(services.geocode_address("Kaloum, Conakry"), attendu)
+        self.assertEqual(_FauxGoogleMaps.appels['/maps/api/geocode/json'], 1)
+        self.assertEqual(services.statistiques_cache['geocodage_base'], 1)
+        self.assertEqual(CacheGeographique.objects.get(cle='geocodage:kaloum conakry').nombre_hits, 1)
+
+    def test_adresse_introuvable_non_mise_en_cache(self):
+        self.assertEqual(services.geocode_address("introuvable"), (None, None))
+        self.assertEqual(services.geocode_address("introuvable"), (None, None))
+        self.assertEqual(_FauxGoogleMaps.appels['/maps/api/geocode/json'], 2)
+        self.assertFalse(CacheGeographique.objects.exists())
+
+    def test_itineraire_points_voisins_partages(self):
+        self.assertEqual(services.itineraire_google(9.50921, -13.71221, 9.6412, -13.5784), (5.4, 15.0))
+        # Moins de ~11 m d'écart: même clé arrondie, pas de second appel
+        self.assertEqual(services.itineraire_google(9.50919, -13.71224, 9.64121, -13.57838), (5.4, 15.0))
+        self.assertEqual(_FauxGoogleMaps.appels['/maps/api/distancematrix/json'], 1)
+        self.assertEqual(services.statistiques_cache['itineraire_memoire'], 1)
+
+
+def _client_et_chauffeur(suffixe):
+    client = Client.objects.create(
+        utilisateur=CustomUser.objects.create(username=f"client_{suffixe}", is_client=True), telephone="620000000"
+    )
+    chauffeur = Chauffeur.objects.create(
+        utilisateur=CustomUser.objects.create(username=f"chauffeur_{suffixe}", is_chauffeur=True),
+        telephone="620000001", numero_permis=f"PERMIS_{suffixe}",
+    )
+    return client, chauffeur
+
+
+def _creer_courses(client, dates, **champs):
+    """Courses aux dates de demande données (date_demande est auto_now_add)"""
+    valeurs = {'statut': 'terminee', 'type_vehicule_demande': 'economique', 'methode_paiement': 'especes',
+               'adresse_depart': "Kaloum", 'adresse_destination': "Ratoma", 'tarif_estime': Decimal('15000')}
+    valeurs.update(champs)
+    courses = []
+    for date in dates:
+        course = Course.objects.create(client=client, **valeurs)
+        Course.objects.filter(pk=course.pk).update(date_demande=date)
+        courses.append(course.pk)
+    return courses
+
+
+@override_settings(
+    NOTIFICATIONS_ENVOI_IMMEDIAT=False, NOTIFICATIONS_MAX_TENTATIVES=3, NOTIFICATIONS_DELAI_BASE_SECONDES=30,
+    NOTIFICATIONS_DELAI_MAX_SECONDES=100, NOTIFICATIONS_BAIL_SECONDES=120,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+)
+class FileNotificationsTests(TestCase):
+    """File d'envoi durable: réservation avec bail, reprise avec backoff, lettre morte"""
+
+    def ajouter(self, groupe, nombre=1):
+        return notifications.ajouter_websocket([(groupe, {'type': 'course_alert', 'message': "Test"})] * nombre)
+
+    def test_reservation_ignore_les_lignes_sous_bail(self):
+        self.ajouter('chauffeurs_economique', 3)
+        premieres = notifications.reclamer(2, notifications.TYPES)
+        self.assertEqual(len(premieres), 2)
+        self.assertTrue(all(n.statut == 'en_cours' and n.tentatives == 1 for n in premieres))
+
+        reste = notifications.reclamer(10, notifications.TYPES)
+        self.assertEqual(len(reste), 1)
+        self.assertNotIn(reste[0].id, [n.id for n in premieres])
+        self.assertEqual(notifications.reclamer(10, notifications.TYPES), [])
+
+        # Bail expiré (worker arrêté en cours d'envoi): la notification redevient disponible
+        NotificationSortante.objects.filter(id=premieres[0].id).update(
+            prochaine_tentative=timezone.now() - timedelta(seconds=1)
+        )
+        reprise, = notifications.reclamer(10, notifications.TYPES)
+        self.assertEqual((reprise.id, reprise.tentatives), (premieres[0].id, 2))
+
+    def test_backoff_puis_abandon(self):
+        notification, = self.ajouter('groupe invalide !')
+        delais = []
+        for tentative in range(1, 4):
+            NotificationSortante.objects.filter(id=notification.id).update(prochaine_tentative=timezone.now())
+            avant = timezone.now()
+            self.assertEqual(notifications.traiter_lot(), 1)
+            notification.refresh_from_db()
+            self.assertEqual(notification.tentatives, tentative)
+            self.assertTrue(notification.derniere_erreur)
+            if tentative < 3:
+                self.assertEqual(notification.statut, 'en_attente')
+                delais.append((notification.prochaine_tentative - avant).total_seconds())
+        self.assertEqual(notification.statut, 'abandonnee')
+        # 30 s puis 60 s, ±20 % de gigue
+        self.assertTrue(24 <= delais[0] <= 36.5, delais)
+        self.assertTrue(48 <= delais[1] <= 72.5, delais)
+
+        # Au-delà du plafond (100 s)
+        notification.tentatives = 2
+        with override_settings(NOTIFICATIONS_DELAI_BASE_SECONDES=90):
+            notifications._enregistrer_resultats([notification], {notification.id: "Erreur"})
+        notification.refresh_from_db()
+        self.assertLessEqual((notification.prochaine_tentative - timezone.now()).total_seconds(), 120)
+
+    def test_envoi_reussi(self):
+        notification, = self.ajouter('chauffeurs_economique')
+        self.assertEqual(notifications.traiter_lot(), 1)
+        notification.refresh_from_db()
+        self.assertEqual((notification.statut, notification.derniere_erreur), ('envoyee', ''))
+        self.assertIsNotNone(notification.date_envoi)
+
+    def test_notification_en_echec_garde_la_course(self):
+        client, _ = _client_et_chauffeur("outbox")
+
+        def notifier_puis_echouer(course_id):
+            notifications.ajouter_sms(["+224620000000"], "Votre course", course=Course.objects.get(pk=course_id))
+            raise RuntimeError("dispatch indisponible")
+
+        with transaction.atomic():
+            course, = _creer_courses(client, [timezone.now()], statut='demandee')
+            self.assertFalse(notifier_sans_annuler(notifier_puis_echouer, course))
+        self.assertTrue(Course.objects.filter(pk=course).exists())
+        self.assertFalse(NotificationSortante.objects.exists())
+
+
+
+
+class AcceptationConcurrenteTests(TransactionTestCase):
+    """Plusieurs chauffeurs acceptent la même course en même temps: la base désigne un seul gagnant"""
+
+    def test_un_seul_gagnant(self):
+        client = Client.objects.create(
+            utilisateur=CustomUser.objects.create(username="course_client", is_client=True), telephone="620000000"
+        )
+        chauffeurs = [
+            Chauffeur.objects.create(
+                utilisateur=CustomUser.objects.create(username=f"course_chauffeur_{i}", is_chauffeur=True),
+                telephone=f"62100000{i}", numero_permis=f"CONC00{i}", statut='disponible',
+            )
+            for i in range(6)
+        ]
+        course = Course.objects.create(
+            client=client, statut='demandee', type_vehicule_demande='economique', methode_paiement='especes',
+            adresse_depart="Kaloum", adresse_destination="Ratoma", tarif_estime=Decimal('15000'),
+        )
+
+        depart = threading.Barrier(len(chauffeurs))
+        resultats = {}
+
+        def accepter(chauffeur):
+            try:
+                depart.wait()
+                resultats[chauffeur.id] = accepter_course(course.id, chauffeur.id)
+            finally:
+                connection.close()
+
+        fils = [threading.Thread(target=accepter, args=(chauffeur,)) for chauffeur in chauffeurs]
+        for fil in fils:
+            fil.start()
+        for fil in fils:
+            fil.join()
+
+        self.assertEqual(Counter(resultats.values()), {ACCEPTEE: 1, DEJA_PRISE: len(chauffeurs) - 1})
+        gagnant = next(chauffeur_id for chauffeur_id, resultat in resultats.items() if resultat == ACCEPTEE)
+        course.refresh_from_db()
+        self.assertEqual((course.statut, course.chauffeur_id), ('acceptee', gagnant))
+        self.assertEqual(list(Chauffeur.objects.filter(statut='en_course').values_list('id', flat=True)), [gagnant])
+
+
+class PaginationCurseurTests(TestCase):
+    """?pagination=curseur: pages stables quand de nouvelles courses arrivent entre deux pages"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_course, _ = _client_et_chauffeur("curseur")
+        origine = timezone.now() - timedelta(days=1)
+        # Trois courses à la même date: l'id départage
+        dates = [origine + timedelta(minutes=i) for i in range(22)] + [origine + timedelta(minutes=10)] * 3
+        _creer_courses(cls.client_course, dates)
+        cls.ordre = list(Course.objects.order_by('-date_demande', '-id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.api = APIClient()
+
+    def pages(self, url):
+        ids = []
+        while url:
+            reponse = self.api.get(url)
+            self.assertEqual(reponse.status_code, 200)
+            self.assertNotIn('count', reponse.data)
+            ids.append([course['id'] for course in reponse.data['results']])
+            url = reponse.data['next']
+            if len(ids) == 1:
+                # Nouvelles courses entre la première page et la suite
+                _creer_courses(self.client_course, [timezone.now()] * 2)
+        return ids
+
+    def test_pages_stables_malgre_insertions(self):
+        pages = self.pages('/api/courses/?pagination=curseur&page_size=10')
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), self.ordre)
+
+    def test_historique_client(self):
+        pages = self.pages(f'/api/clients/{self.client_course.pk}/courses/?pagination=curseur&page_size=7')
+        self.assertEqual(sum(pages, []), self.ordre)
+
+    def test_curseur_invalide(self):
+        self.assertEqual(self.api.get('/api/courses/?pagination=curseur&curseur=pas-un-curseur').status_code, 404)
+
+
+@override_settings(SYNC_MARGE_SECONDES=0)
+class SynchronisationTests(TestCase):
+    """/courses/modifications/: delta depuis le jeton, suppressions et sorties de liste en pierres tombales"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_course, cls.chauffeur = _client_et_chauffeur("sync")
+        cls.autre_client, _ = _client_et_chauffeur("sync_autre")
+        maintenant = timezone.now()
+        cls.courses = _creer_courses(cls.client_course, [maintenant] * 3, statut='demandee')
+        _creer_courses(cls.autre_client, [maintenant], statut='demandee')
+
+    def setUp(self):
+        self.api = APIClient()
+
+    def synchroniser(self, depuis=None, **filtres):
+        parametres = {'client_id': self.client_course.pk, **filtres}
+        if depuis:
+            parametres['depuis'] = depuis
+        reponse = self.api.get('/api/courses/modifications/', parametres)
+        self.assertEqual(reponse.status_code, 200)
+        return reponse.data
+
+    def test_jeton_aller_retour(self):
+        date = timezone.now()
+        self.assertEqual(decoder_jeton(encoder_jeton(date, 42)), (date, 42))
+        self.assertEqual(decoder_jeton(encoder_jeton(date)), (date, None))
+        with self.assertRaises(ValueError):
+            decoder_jeton(encoder_jeton(date.replace(tzinfo=None)))
+        self.assertEqual(self.api.get('/api/courses/modifications/', {'depuis': 'pas-un-jeton'}).status_code, 400)
+
+    def test_delta_et_suppressions(self):
+        premiere = self.synchroniser()
+        self.assertEqual(sorted(course['id'] for course in premiere['courses']), self.courses)
+        self.assertEqual(premiere['supprimees'], [])
+        self.assertTrue(premiere['complet'])
+
+        modifiee, supprimee, inchangee = Course.objects.filter(pk__in=self.courses).order_by('id')
+        modifiee.tarif_estime = Decimal('20000')
+        modifiee.save()
+        supprimee_id = supprimee.pk
+        supprimee.delete()
+        nouvelle, = _creer_courses(self.client_course, [timezone.now()], statut='demandee')
+        _creer_courses(self.autre_client, [timezone.now()], statut='demandee')
+
+        delta = self.synchroniser(premiere['jeton'])
+        self.assertEqual([course['id'] for course in delta['courses']], [modifiee.pk, nouvelle])
+        self.assertEqual(delta['supprimees'], [supprimee_id])
+
+        # Rien de neuf depuis le dernier jeton
+        vide = self.synchroniser(delta['jeton'])
+        self.assertEqual((vide['courses'], vide['supprimees']), ([], []))
+
+    def test_course_sortie_du_filtre(self):
+        premiere = self.synchroniser(statut='demandee')
+        acceptee = Course.objects.get(pk=self.courses[0])
+        acceptee.chauffeur, acceptee.statut = self.chauffeur, 'acceptee'
+        acceptee.save()
+
+        delta = self.synchroniser(premiere['jeton'], statut='demandee')
+        self.assertEqual(delta['courses'], [])
+        self.assertEqual(delta['supprimees'], [acceptee.pk])
+
+    def test_reponse_partielle(self):
+        visibles = Course.objects.filter(client=self.client_course)
+        perimetre = {'client_id': self.client_course.pk}
+        partielle = modifications(visibles, perimetre, taille_max=2)
+        self.assertFalse(partielle['complet'])
+        suite = modifications(visibles, perimetre, jeton=partielle['jeton'], taille_max=2)
+        self.assertTrue(suite['complet'])
+        self.assertEqual([course.pk for course in partielle['courses'] + suite['courses']], self.courses)
+
+
+
+
+class PariteCourseLectureTests(TestCase):
+    """CourseLecture (values() + dicts) rend le même JSON que CourseSerializer, clés et ordre compris"""
+
+    @classmethod
+    def setUpTestData(cls):
+        client = Client.objects.create(
+            utilisateur=CustomUser.objects.create(username="parite_client", is_client=True), telephone="620000000"
+        )
+        chauffeur = Chauffeur.objects.create(
+            utilisateur=CustomUser.objects.create(username="parite_chauffeur", is_chauffeur=True),
+            telephone="620000001", numero_permis="PAR001",
+        )
+        debut = timezone.now() - timedelta(hours=2)
+        commun = {'client': client, 'type_vehicule_demande': 'economique', 'methode_paiement': 'especes'}
+        # Terminée: chauffeur, tarif final, durée, coordonnées à 9 décimales
+        Course.objects.create(
+            **commun, chauffeur=chauffeur, statut='terminee',
+            adresse_depart="Kaloum", adresse_destination="Ratoma « Kipé »",
+            latitude_depart=Decimal('9.509212345'), longitude_depart=Decimal('-13.712298765'),
+            latitude_destination=Decimal('9.64123'), longitude_destination=Decimal('-13.5784'),
+            tarif_estime=Decimal('15000.5'), tarif_final=Decimal('17250'),
+            date_debut=debut, date_fin=debut + timedelta(minutes=37, seconds=12),
+        )
+        # Démarrée: date de début sans date de fin
+        Course.objects.create(
+            **commun, chauffeur=chauffeur, statut='en_cours', adresse_depart="Matam", adresse_destination="Dixinn",
+            latitude_depart=Decimal('9.55'), longitude_depart=Decimal('-13.65'),
+            tarif_estime=Decimal('8000'), date_debut=debut,
+        )
+        # Demandée: sans chauffeur, sans coordonnées ni dates, réservation à l'avance
+        Course.objects.create(
+            **commun, statut='demandee', adresse_depart="=Adresse saisie", adresse_destination="",
+            tarif_estime=Decimal('0.01'), type_course='reservation', date_reservation=debut + timedelta(days=1),
+        )
+
+    def comparer(self):
+        courses = Course.objects.select_related('client__utilisateur', 'chauffeur__utilisateur').order_by('id')
+        attendu = CourseSerializer(courses, many=True).data
+        obtenu = CourseLecture.representer(CourseLecture.projeter(courses))
+        self.assertEqual(len(obtenu), 3)
+        for serializer, rapide in zip(attendu, obtenu):
+            with self.subTest(course=serializer['id']):
+                # Texte JSON: compare aussi l'ordre des clés et les types (Decimal rendus en chaînes)
+                self.assertEqual(json.dumps(rapide), json.dumps(serializer))
+
+    def test_parite(self):
+        self.comparer()
+
+    @override_settings(TIME_ZONE='Europe/Paris')
+    def test_parite_hors_utc(self):
+        self.comparer()
+
+
+
+class HistoriqueCoursesTests(TestCase):
+    """/clients/<id>/courses/ et /chauffeurs/<id>/courses/: taille de page, période, sortie en flux"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_course, cls.chauffeur = _client_et_chauffeur("histo")
+        autre_client, _ = _client_et_chauffeur("histo_autre")
+        debut = timezone.make_aware(datetime(2026, 3, 1, 8))
+        cls.courses = _creer_courses(cls.client_course, [debut + timedelta(days=i) for i in range(12)])
+        cls.avec_chauffeur = _creer_courses(
+            cls.client_course, [debut + timedelta(days=20, hours=i) for i in range(3)], chauffeur=cls.chauffeur
+        )
+        _creer_courses(autre_client, [debut] * 4, chauffeur=cls.chauffeur)
+        cls.url_client = f'/api/clients/{cls.client_course.pk}/courses/'
+        cls.url_chauffeur = f'/api/chauffeurs/{cls.chauffeur.pk}/courses/'
+
+    def setUp(self):
+        self.api = APIClient()
+
+    def test_taille_de_page(self):
+        reponse = self.api.get(self.url_client, {'page_size': 5})
+        self.assertEqual(reponse.data['count'], 15)
+        self.assertEqual([course['id'] for course in reponse.data['results']], self.avec_chauffeur[::-1] + self.courses[:-3:-1])
+        self.assertEqual(len(self.api.get(self.url_client, {'page_size': 500}).data['results']), 15)
+
+    def test_periode(self):
+        reponse = self.api.get(self.url_client, {'du': '2026-03-03', 'au': '2026-03-05'})
+        self.assertEqual([course['id'] for course in reponse.data['results']], self.courses[4:1:-1])
+        self.assertEqual(self.api.get(self.url_client, {'du': 'hier'}).status_code, 400)
+
+    def test_courses_du_chauffeur(self):
+        reponse = self.api.get(self.url_chauffeur, {'au': '2026-03-21T09:30:00+00:00'})
+        self.assertEqual(reponse.data['count'], 6)
+        ids = [course['id'] for course in reponse.data['results']]
+        self.assertEqual(ids[:2], self.avec_chauffeur[1::-1])
+        self.assertTrue(all(course['chauffeur_id'] == self.chauffeur.pk for course in reponse.data['results']))
+
+    def test_sortie_en_flux(self):
+        reponse = self.api.get(self.url_client, {'sortie': 'json', 'du': '2026-03-10'})
+        self.assertTrue(reponse.streaming)
+        self.assertIn('courses_client_', reponse['Content-Disposition'])
+        courses = json.loads(b''.join(reponse.streaming_content))
+        pagine = self.api.get(self.url_client, {'du': '2026-03-10', 'page_size': 100}).data['results']
+        self.assertEqual(courses, json.loads(json.dumps(pagine)))
+
+
+class ExportsTests(TestCase):
+    """/courses/exporter/ et /paiements/exporter/: lignes CSV et NDJSON identiques à la base"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_course, cls.chauffeur = _client_et_chauffeur("export")
+        debut = timezone.now() - timedelta(days=2)
+        cls.courses = _creer_courses(
+            cls.client_course, [debut, debut + timedelta(hours=1)], chauffeur=cls.chauffeur,
+            adresse_depart="=HYPERLINK(\"x\")", tarif_estime=Decimal('15000.50'),
+        )
+        cls.courses += _creer_courses(cls.client_course, [debut + timedelta(hours=2)], statut='annulee')
+        Course.objects.filter(pk=cls.courses[0]).update(tarif_final=Decimal('17250'), date_fin=debut + timedelta(minutes=30))
+        Paiement.objects.create(course_id=cls.courses[0], montant=Decimal('17250.00'), operateur_mobile_money='orange')
+        cls.admin = CustomUser.objects.create(username="export_admin", is_staff=True)
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def lire(self, url, **parametres):
+        reponse = self.api.get(url, parametres)
+        self.assertEqual(reponse.status_code, 200)
+        return reponse, b''.join(reponse.streaming_content).decode()
+
+    def attendu(self, nom, queryset):
+        """Lignes de la base, valeurs au format de l'export"""
+        export = EXPORTS[nom]
+        lignes = queryset.order_by(*export.ordre).values_list(*[champ for _, champ in export.colonnes])
+        return [dict(zip(export.entetes, ligne)) for ligne in lignes]
+
+    def valeur_csv(self, valeur):
+        if valeur is None:
+            return ''
+        if isinstance(valeur, datetime):
+            return timezone.localtime(valeur).isoformat()
+        if isinstance(valeur, str) and valeur.startswith('='):
+            return "'" + valeur
+        return str(valeur)
+
+    def test_csv_courses(self):
+        reponse, texte = self.lire('/api/courses/exporter/')
+        self.assertEqual(reponse['Content-Type'], 'text/csv; charset=utf-8')
+        lignes = list(csv.DictReader(io.StringIO(texte)))
+        attendu = self.attendu('courses', Course.objects.all())
+        self.assertEqual([ligne['id'] for ligne in lignes], [str(pk) for pk in self.courses])
+        for ligne, base in zip(lignes, attendu):
+            self.assertEqual(ligne, {cle: self.valeur_csv(valeur) for cle, valeur in base.items()})
+        self.assertEqual(lignes[0]['tarif_estime'], '15000.50')
+
+    def test_ndjson_courses_filtrees(self):
+        reponse, texte = self.lire('/api/courses/exporter/', sortie='ndjson', statut='terminee')
+        self.assertEqual(reponse['Content-Type'], 'application/x-ndjson')
+        lignes = [json.loads(ligne) for ligne in texte.splitlines()]
+        attendu = self.attendu('courses', Course.objects.filter(statut='terminee'))
+        self.assertEqual(len(lignes), 2)
+        for ligne, base in zip(lignes, attendu):
+            # En NDJSON les textes restent tels quels, montants et dates en chaînes
+            self.assertEqual(ligne, {
+                cle: timezone.localtime(valeur).isoformat() if isinstance(valeur, datetime)
+                else format(valeur, 'f') if isinstance(valeur, Decimal) else valeur
+                for cle, valeur in base.items()
+            })
+
+    def test_csv_paiements(self):
+        _, texte = self.lire('/api/paiements/exporter/', operateur='orange')
+        ligne, = csv.DictReader(io.StringIO(texte))
+        base, = self.attendu('paiements', Paiement.objects.all())
+        self.assertEqual(ligne, {cle: self.valeur_csv(valeur) for cle, valeur in base.items()})
+
+    def test_refus(self):
+        self.assertEqual(self.api.get('/api/courses/exporter/', {'sortie': 'xlsx'}).status_code, 400)
+        self.assertEqual(self.api.get('/api/courses/exporter/', {'du': 'hier'}).status_code, 400)
+        self.api.force_authenticate(CustomUser.objects.create(username="export_client", is_client=True))
+        self.assertEqual(self.api.get('/api/courses/exporter/').status_code, 403)
@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 
-from .views import LogoutRefreshView,UserProfileView, MeilleurChauffeurDuMoisView, RevenuJournalierView,RevenuMensuelView,ChangePasswordView, CheckPhoneView,NombreClientsTotalView
+from .views import LogoutRefreshView,UserProfileView, MeilleurChauffeurDuMoisView, RevenuJournalierView,RevenuMensuelView,ChangePasswordView, CheckPhoneView,NombreClientsTotalView,ChauffeursDisponiblesView,SanteChannelsView
 
 from . import views
 
@@ -28,6 +28,12 @@ urlpatterns = [
     path('change-password/', ChangePasswordView.as_view(), name='change-password'),
     path('me/', UserProfileView.as_view(), name='user-profile'),
     path('check-phone/', CheckPhoneView.as_view(), name='check-phone'),  
+    path('chauffeurs-disponibles/', ChauffeursDisponiblesView.as_view(), name='chauffeurs-disponibles'),
+    path('sante/channels/', SanteChannelsView.as_view(), name='sante-channels'),
+    # Cycle de vie des courses en vues async (serveur ASGI)
+    path('courses-async/<int:pk>/accepter/', views.accepter_course_async, name='course-async-accepter'),
+    path('courses-async/<int:pk>/demarrer/', views.demarrer_course_async, name='course-async-demarrer'),
+    path('courses-async/<int:pk>/terminer/', views.terminer_course_async, name='course-async-terminer'),
     # Tes vues de statistiques
     path('revenu-mensuel/', RevenuMensuelView.as_view(), name='revenu-mensuel'),
     path('revenu-journalier/', RevenuJournalierView.as_view(), name='revenu-journalier'),
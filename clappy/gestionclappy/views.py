@@ -1,11 +1,14 @@
+import asyncio
 import logging
-import threading 
-import http.client
-from django.conf import settings
+import math
+import time
 import phonenumbers
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action, permission_classes, api_view
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from django.db.models import Count, Avg, Sum
 from django.utils import timezone
 from datetime import timedelta
@@ -14,21 +17,40 @@ import json
 from rest_framework.pagination import PageNumberPagination
 from asgiref.sync import async_to_sync, sync_to_async
 from channels.layers import get_channel_layer
-from .models import Client, Chauffeur, Vehicule, Course, Paiement, Evaluation, HistoriquePosition, Tarif
+from .models import (Client, Chauffeur, Vehicule, Course, Paiement, Evaluation, HistoriquePosition, Tarif,
+                     TracePosition)
+from .reglages import parametre
 from .serializers import (ClientSerializer, ChauffeurSerializer, ChauffeurCreateSerializer, ClientCreateSerializer,
-                          VehiculeSerializer, CourseSerializer, PaiementSerializer,
+                          VehiculeSerializer, CourseSerializer, CourseLecture, PaiementSerializer,
                           EvaluationSerializer, HistoriquePositionSerializer, TarifSerializer, UserSerializer)
 from django.contrib.auth import authenticate
 from rest_framework.permissions import IsAdminUser, AllowAny
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.views import APIView
-from django.db.models import Q
+from django.db import transaction
 
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from django.views.decorators.http import require_POST
 from .models import Client, Chauffeur
+from .canaux import evenement_trame, verifier_couche
+from .courses import (ACCEPTEE, CHAUFFEUR_INTROUVABLE, COURSE_INTROUVABLE, DEJA_PRISE, DEMARREE, TERMINEE,
+                      accepter_course, ademarrer_course, courses_visibles, demarrer_course, terminer_course)
+from .exports import EXPORTS, SORTIES, TYPES_CONTENU
+from .flux import filtrer_periode, json_en_flux, reponse_en_flux
+from .dispatch import (DispatchService, groupe_chauffeur, groupe_sans_position, groupe_type, groupe_zone,
+                       groupes_autour, trame_course_confirmee)
+from .geo import distances_et_eta
+from .ingestion import plus_recents, tampon_positions, valider_positions
+from .positions import get_index
+from .notifications import ajouter_sms, ajouter_websocket, planifier
+from .pagination import PaginationCurseur
+from .synchronisation import modifications
+from .sms import dispatcheur_sms, formater_e164
+from .tarification import moteur_tarifaire
+from .telephones import filtre_telephone
 
 # Configuration du logging
 logger = logging.getLogger(__name__)
@@ -36,8 +58,11 @@ logger = logging.getLogger(__name__)
 # Service SMS pour les notifications de réservation
 class SMSService:
     @staticmethod
-    def envoyer_sms_chauffeurs(course_id):
-        """Envoyer un SMS à tous les chauffeurs du type de véhicule demandé"""
+    def envoyer_sms_chauffeurs(course_id, chauffeur_ids=None):
+        """
+        Envoyer un SMS aux chauffeurs du type de véhicule demandé.
+        Si `chauffeur_ids` est fourni (dispatch), seuls ces chauffeurs sont contactés.
+        """
         try:
             course = Course.objects.get(id=course_id)
             type_vehicule_demande = course.type_vehicule_demande
@@ -50,6 +75,9 @@ class SMSService:
                 statut='disponible'
             ).select_related('vehicule', 'utilisateur')
             
+            if chauffeur_ids is not None:
+                chauffeurs = chauffeurs.filter(id__in=chauffeur_ids)
+            
             print(f"🔍 {chauffeurs.count()} chauffeurs trouvés pour type {type_vehicule_demande}")
             
             message_chauffeur = (
@@ -61,20 +89,15 @@ class SMSService:
                 f"Connectez-vous pour accepter la course."
             )
             
-            sms_envoyes = 0
-            # Envoyer SMS à chaque chauffeur
+            # Un seul message pour tous: file d'envoi durable, puis envoi par lots de destinataires
+            telephones = []
             for chauffeur in chauffeurs:
                 if chauffeur.telephone:
-                    print(f"📱 Envoi SMS au chauffeur {chauffeur.id}: {chauffeur.telephone}")
-                    threading.Thread(
-                        target=SMSService._envoyer_sms,
-                        args=(chauffeur.telephone, message_chauffeur),
-                        daemon=True
-                    ).start()
-                    sms_envoyes += 1
-                    print(f"📱 SMS réservation programmé pour chauffeur {chauffeur.telephone}")
+                    telephones.append(chauffeur.telephone_e164 or chauffeur.telephone)
                 else:
                     print(f"⚠ Chauffeur {chauffeur.id} n'a pas de numéro de téléphone")
+            ajouter_sms(telephones, message_chauffeur, course=course)
+            sms_envoyes = len(telephones)
             
             print(f"✅ {sms_envoyes} SMS programmés pour les chauffeurs")
             return sms_envoyes > 0
@@ -114,11 +137,7 @@ class SMSService:
             
             if client.telephone:
                 print(f"📱 Envoi SMS confirmation au client {client.telephone}")
-                threading.Thread(
-                    target=SMSService._envoyer_sms,
-                    args=(client.telephone, message_client),
-                    daemon=True
-                ).start()
+                ajouter_sms([client.telephone_e164 or client.telephone], message_client, course=course)
                 print(f"📱 SMS confirmation envoyé au client {client.telephone}")
                 return True
             else:
@@ -136,129 +155,43 @@ class SMSService:
 
     @staticmethod
     def _envoyer_sms(telephone, message):
-        """Méthode interne pour envoyer un SMS via NimbaSMS"""
-        try:
-            if not telephone:
-                print("❌ Aucun numéro de téléphone fourni")
-                return False
-
-            print(f"📱 Tentative d'envoi SMS à: {telephone}")
-            print(f"📱 Message: {message}")
-
-            # Validation et formatage international
-            try:
-                parsed = phonenumbers.parse(telephone, "GN")
-                if not phonenumbers.is_valid_number(parsed):
-                    logger.error(f"Numéro invalide: {telephone}")
-                    print(f"❌ Numéro invalide: {telephone}")
-                    return False
-                phone_e164 = phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
-                print(f"📱 Numéro formaté: {phone_e164}")
-            except phonenumbers.NumberParseException as e:
-                logger.error(f"Erreur de parsing du numéro: {telephone} - {e}")
-                print(f"❌ Erreur parsing numéro: {e}")
-                return False
-
-            # Vérifier que la clé API est configurée
-            if not hasattr(settings, 'NIMBASMS_API_KEY') or not settings.NIMBASMS_API_KEY:
-                print("❌ Clé API NimbaSMS non configurée")
-                return False
-
-            # Configuration requête
-            conn = http.client.HTTPSConnection("api.nimbasms.com", timeout=30)
-            headers = {
-                "Authorization": settings.NIMBASMS_API_KEY.strip(),
-                "Content-Type": "application/json",
-                "Accept": "application/json"
-            }
-
-            payload = {
-                "to": [phone_e164],
-                "sender_name": getattr(settings, 'NIMBASMS_SENDER_NAME', 'CLAPPY'),
-                "message": message
-            }
-
-            print(f"📱 Payload SMS: {payload}")
-
-            # Envoi
-            conn.request("POST", "/v1/messages", body=json.dumps(payload), headers=headers)
-            response = conn.getresponse()
-            response_body = response.read().decode()
-            
-            logger.info(f"Réponse NimbaSMS: {response.status} {response_body}")
-            print(f"📱 Réponse NimbaSMS: {response.status} - {response_body}")
-            
-            if response.status == 201:
-                logger.info(f"SMS envoyé avec succès à {telephone}")
-                print(f"✅ SMS envoyé avec succès à {telephone}")
-                return True
-            else:
-                logger.error(f"Erreur SMS {response.status}: {response_body}")
-                print(f"❌ Erreur SMS {response.status}: {response_body}")
-                return False
-
-        except Exception as e:
-            logger.error(f"Erreur envoi SMS: {str(e)}", exc_info=True)
-            print(f"❌ Exception envoi SMS: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return False
-        finally:
-            if 'conn' in locals():
-                conn.close()
+        """Envoyer un SMS via NimbaSMS et attendre le résultat (pool de sms.py)"""
+        print(f"📱 Message: {message}")
+        return dispatcheur_sms.envoyer(telephone, message)
 
 # Service de notification pour les courses
 class NotificationService:
     @staticmethod
     def envoyer_notification_course(course_id):
-        """Envoyer une notification à tous les chauffeurs du type de véhicule demandé"""
+        """Envoyer la course aux chauffeurs les plus proches (dispatch par vagues)"""
         try:
-            course = Course.objects.get(id=course_id)
-            type_vehicule_demande = course.type_vehicule_demande
-            
-            print(f"🚀 DÉBUT Notification course {course_id} - Type: {type_vehicule_demande}")
-            
-            # 1. Envoyer les notifications WebSocket
-            try:
-                channel_layer = get_channel_layer()
-                if channel_layer is not None:
-                    async_to_sync(channel_layer.group_send)(
-                        f"chauffeurs_{type_vehicule_demande}",
-                        {
-                            "type": "send_course_alert",
-                            "message": "Nouvelle course disponible!",
-                            "course_id": course.id,
-                            "depart": course.adresse_depart,
-                            "destination": course.adresse_destination,
-                            "tarif_estime": str(course.tarif_estime),
-                            "type_vehicule": type_vehicule_demande
-                        }
-                    )
-                    print(f"🔔 Notification WebSocket envoyée pour course {course_id}")
-                else:
-                    print("⚠ Channel layer non disponible")
-            except Exception as e:
-                print(f"⚠ Erreur WebSocket: {e}")
-                import traceback
-                traceback.print_exc()
+            print(f"🚀 DÉBUT Notification course {course_id}")
             
-            # 2. ENVOYER LES SMS AUX CHAUFFEURS
-            print(f"📱 Début envoi SMS aux chauffeurs...")
-            resultat_sms = SMSService.envoyer_sms_chauffeurs(course_id)
-            print(f"📱 Résultat envoi SMS: {resultat_sms}")
+            # WebSocket + SMS aux K chauffeurs les plus proches, rayon élargi par vagues
+            resultat = DispatchService.lancer(course_id)
             
             print(f"✅ FIN Notification course {course_id}")
-            return True
+            return resultat
                 
-        except Course.DoesNotExist:
-            print(f"❌ Course {course_id} non trouvée")
-            return False
         except Exception as e:
             print(f"❌ Erreur notification: {e}")
             import traceback
             traceback.print_exc()
             return False
 
+    @staticmethod
+    async def adiffuser_confirmation_course(course_id, chauffeur_id):
+        """Trame de confirmation aux zones autour du départ, par group_send natif (vues async)"""
+        course = await Course.objects.aget(id=course_id)
+        chauffeur = await Chauffeur.objects.aget(id=chauffeur_id)
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        evenement = evenement_trame(trame_course_confirmee(course, chauffeur))
+        groupes = groupes_autour(course.type_vehicule_demande, course.latitude_depart, course.longitude_depart)
+        await asyncio.gather(*(channel_layer.group_send(groupe, evenement) for groupe in groupes))
+        logger.info(f"Confirmation de la course {course_id} diffusée à {len(groupes)} groupe(s)")
+
     @staticmethod
     def notifier_confirmation_course(course_id, chauffeur_id):
         """Notifier que la course a été confirmée"""
@@ -269,22 +202,12 @@ class NotificationService:
             
             print(f"🚀 DÉBUT Confirmation course {course_id} par chauffeur {chauffeur_id}")
             
-            # 1. Notifications WebSocket
+            # 1. Notifications WebSocket (zones autour du départ, comme l'alerte)
             try:
-                channel_layer = get_channel_layer()
-                if channel_layer is not None:
-                    async_to_sync(channel_layer.group_send)(
-                        f"chauffeurs_{type_vehicule_demande}",
-                        {
-                            "type": "course_confirmed",
-                            "message": "Cette course a été confirmée par un autre chauffeur",
-                            "course_id": course.id,
-                            "chauffeur_name": str(chauffeur)
-                        }
-                    )
-                    print(f"🔔 Notification WebSocket confirmation envoyée")
-                else:
-                    print("⚠ Channel layer non disponible pour confirmation")
+                evenement = evenement_trame(trame_course_confirmee(course, chauffeur))
+                groupes = groupes_autour(type_vehicule_demande, course.latitude_depart, course.longitude_depart)
+                ajouter_websocket([(groupe, evenement) for groupe in groupes], course=course)
+                print(f"🔔 Notification WebSocket confirmation mise en file")
             except Exception as e:
                 print(f"⚠ Erreur WebSocket confirmation: {e}")
                 import traceback
@@ -309,6 +232,21 @@ class NotificationService:
             traceback.print_exc()
             return False
 
+def notifier_sans_annuler(notification, *args):
+    """
+    notification(*args) dans un point de sauvegarde de la transaction en cours.
+    Une requête en échec (file d'envoi, dispatch) annule les notifications
+    seulement: la course créée ou acceptée est bien validée avec la réponse.
+    """
+    try:
+        with transaction.atomic():
+            return notification(*args)
+    except Exception as e:
+        print(f"⚠ Notification échouée: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
 def send_welcome_sms_taxi(phone, username, role, password=None):
     """Envoi un SMS de bienvenue pour les utilisateurs taxi (clients et chauffeurs)"""
     try:
@@ -319,24 +257,10 @@ def send_welcome_sms_taxi(phone, username, role, password=None):
         print(f"📱 Envoi SMS bienvenue à {phone} pour {username} ({role})")
 
         # Validation et formatage international
-        try:
-            parsed = phonenumbers.parse(phone, "GN")
-            if not phonenumbers.is_valid_number(parsed):
-                logger.error(f"Numéro invalide: {phone}")
-                return False
-            phone_e164 = phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
-        except phonenumbers.NumberParseException:
-            logger.error(f"Erreur de parsing du numéro: {phone}")
+        phone_e164 = formater_e164(phone)
+        if phone_e164 is None:
             return False
 
-        # Configuration requête
-        conn = http.client.HTTPSConnection("api.nimbasms.com", timeout=10)
-        headers = {
-            "Authorization": settings.NIMBASMS_API_KEY.strip(),
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
-
         # Message de bienvenue personnalisé selon le rôle
         if role == 'client':
             message = (
@@ -363,32 +287,14 @@ def send_welcome_sms_taxi(phone, username, role, password=None):
                 "📞 Service client: +224 627 57 95 31"
             )
 
-        payload = {
-            "to": [phone_e164],
-            "sender_name": settings.NIMBASMS_SENDER_NAME,
-            "message": message
-        }
-
-        # Envoi et vérification
-        conn.request("POST", "/v1/messages", body=json.dumps(payload), headers=headers)
-        response = conn.getresponse()
-        response_body = response.read().decode()
-        
-        logger.info(f"Réponse NimbaSMS (taxi): {response.status} {response_body}")
-        
-        if response.status == 201:
-            logger.info(f"SMS de bienvenue taxi envoyé avec succès! Utilisateur {username}")
-            return True
-            
-        logger.error(f"Erreur SMS (taxi) {response.status}: {response_body}")
-        return False
+        # Envoi direct par le pool SMS, hors file durable: le message contient le mot de passe
+        dispatcheur_sms.soumettre(phone_e164, message)
+        logger.info(f"SMS de bienvenue taxi mis en file pour l'utilisateur {username}")
+        return True
 
     except Exception as e:
         logger.error(f"Erreur SMS (taxi): {str(e)}", exc_info=True)
         return False
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -516,11 +422,7 @@ class ClientViewSet(viewsets.ModelViewSet):
                 
                 # ENVOI DU SMS DE BIENVENUE POUR LE CLIENT
                 if client.telephone:
-                    threading.Thread(
-                        target=send_welcome_sms_taxi,
-                        args=(client.telephone, client.utilisateur.username, 'client', request.data.get('password')),
-                        daemon=True
-                    ).start()
+                    send_welcome_sms_taxi(client.telephone_e164 or client.telephone, client.utilisateur.username, 'client', request.data.get('password'))
                     print(f"📱 SMS de bienvenue programmé pour le client {client.telephone}")
                 else:
                     print("ℹ️ Pas de numéro de téléphone, aucun SMS envoyé")
@@ -541,11 +443,9 @@ class ClientViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def courses(self, request, pk=None):
-        """Liste toutes les courses d'un client"""
+        """Historique des courses d'un client (voir historique_courses)"""
         client = self.get_object()
-        courses = Course.objects.filter(client=client)
-        serializer = CourseSerializer(courses, many=True, context={'request': request})
-        return Response(serializer.data)
+        return historique_courses(request, Course.objects.filter(client=client), f"courses_client_{client.pk}.json")
 
 User = get_user_model()
 
@@ -586,7 +486,7 @@ class ChauffeurViewSet(viewsets.ModelViewSet):
         if username and User.objects.filter(username=username).exists():
             errors['username'] = ['Un utilisateur avec ce nom existe déjà']
         
-        if telephone and Chauffeur.objects.filter(telephone=telephone).exists():
+        if telephone and Chauffeur.objects.filter(**filtre_telephone(telephone)).exists():
             errors['telephone'] = ['Un chauffeur avec ce numéro existe déjà']
         
         if email and User.objects.filter(email=email).exists():
@@ -610,11 +510,7 @@ class ChauffeurViewSet(viewsets.ModelViewSet):
                 
                 # ENVOI DU SMS DE BIENVENUE POUR LE CHAUFFEUR AVEC LE MOT DE PASSE
                 if chauffeur.telephone:
-                    threading.Thread(
-                        target=send_welcome_sms_taxi,
-                        args=(chauffeur.telephone, chauffeur.utilisateur.username, 'chauffeur', password),
-                        daemon=True
-                    ).start()
+                    send_welcome_sms_taxi(chauffeur.telephone_e164 or chauffeur.telephone, chauffeur.utilisateur.username, 'chauffeur', password)
                     print(f"📱 SMS de bienvenue programmé pour le chauffeur {chauffeur.telephone} avec mot de passe: {password}")
                 else:
                     print("ℹ️ Pas de numéro de téléphone, aucun SMS envoyé")
@@ -651,11 +547,9 @@ class ChauffeurViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def courses(self, request, pk=None):
-        """Liste toutes les courses d'un chauffeur"""
+        """Historique des courses d'un chauffeur (voir historique_courses)"""
         chauffeur = self.get_object()
-        courses = Course.objects.filter(chauffeur=chauffeur)
-        serializer = CourseSerializer(courses, many=True, context={'request': request})
-        return Response(serializer.data)
+        return historique_courses(request, Course.objects.filter(chauffeur=chauffeur), f"courses_chauffeur_{chauffeur.pk}.json")
     
     @action(detail=True, methods=['get'])
     def statistiques(self, request, pk=None):
@@ -698,17 +592,30 @@ class ChauffeurConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         # Le chauffeur rejoint un groupe basé sur son type de véhicule
         user = self.scope["user"]
-        if user.is_authenticated and hasattr(user, 'chauffeur'):
+        # Pas de hasattr(user, 'chauffeur'): requête synchrone interdite ici; un
+        # utilisateur sans profil chauffeur tombe dans Chauffeur.DoesNotExist
+        if user.is_authenticated:
             try:
                 chauffeur = await sync_to_async(Chauffeur.objects.get)(utilisateur=user)
                 vehicule = await sync_to_async(Vehicule.objects.get)(chauffeur=chauffeur)
+                self.chauffeur_id = chauffeur.id
                 self.type_vehicule = vehicule.type_vehicule
-                self.group_name = f"chauffeurs_{self.type_vehicule}"
+                self.group_name = groupe_type(self.type_vehicule)
+                # Groupe personnel, utilisé par le dispatch pour cibler ce chauffeur
+                self.personal_group_name = groupe_chauffeur(chauffeur.id)
                 
                 await self.channel_layer.group_add(
                     self.group_name,
                     self.channel_name
                 )
+                await self.channel_layer.group_add(
+                    self.personal_group_name,
+                    self.channel_name
+                )
+                # Groupe de zone: les alertes ne visent que les cellules autour du départ
+                self.zone_group_name = None
+                position = await sync_to_async(self.position_recente)()
+                await self.changer_zone(*(position or (None, None)))
                 await self.accept()
                 
                 # Envoyer un message de connexion réussie
@@ -727,6 +634,16 @@ class ChauffeurConsumer(AsyncWebsocketConsumer):
                 self.group_name,
                 self.channel_name
             )
+        if getattr(self, 'zone_group_name', None):
+            await self.channel_layer.group_discard(
+                self.zone_group_name,
+                self.channel_name
+            )
+        if hasattr(self, 'personal_group_name'):
+            await self.channel_layer.group_discard(
+                self.personal_group_name,
+                self.channel_name
+            )
 
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
@@ -734,10 +651,61 @@ class ChauffeurConsumer(AsyncWebsocketConsumer):
         
         if message_type == 'confirm_course':
             course_id = text_data_json.get('course_id')
-            chauffeur_id = text_data_json.get('chauffeur_id')
             
-            # Traiter la confirmation de course
-            await self.confirm_course(course_id, chauffeur_id)
+            # Traiter la confirmation de course, toujours au nom du chauffeur connecté
+            resultat = await self.confirm_course(course_id)
+            if resultat != ACCEPTEE:
+                await self.send(text_data=json.dumps({
+                    'type': 'confirmation_refusee',
+                    'course_id': course_id,
+                    'raison': resultat
+                }))
+
+        elif message_type in ('position', 'positions'):
+            # Un point {"latitude", "longitude"} ou un lot {"positions": [...]}
+            donnees = text_data_json.get('positions', [text_data_json])
+            points, erreurs = valider_positions(donnees, chauffeur_id=self.chauffeur_id)
+            if points:
+                await sync_to_async(tampon_positions.ajouter)(points)
+                await self.changer_zone(*plus_recents(points)[self.chauffeur_id])
+            if erreurs:
+                await self.send(text_data=json.dumps({
+                    'type': 'positions_rejetees',
+                    'erreurs': erreurs
+                }))
+
+    def position_recente(self):
+        """(lat, lon) connue dans l'index si elle est assez récente, sinon None"""
+        position = get_index().position(self.chauffeur_id)
+        fraicheur = parametre('DISPATCH_FRAICHEUR_POSITION_MINUTES', 10) * 60
+        if position is None or position[2] < time.time() - fraicheur:
+            return None
+        return position[:2]
+
+    async def changer_zone(self, latitude, longitude):
+        """Passer dans le groupe de la cellule courante (ou des non localisés)"""
+        if latitude is None or longitude is None:
+            nouveau = groupe_sans_position(self.type_vehicule)
+        else:
+            nouveau = groupe_zone(self.type_vehicule, latitude, longitude)
+        if nouveau == self.zone_group_name:
+            return
+        if self.zone_group_name:
+            await self.channel_layer.group_discard(self.zone_group_name, self.channel_name)
+        await self.channel_layer.group_add(nouveau, self.channel_name)
+        self.zone_group_name = nouveau
+
+    async def dispatch(self, message):
+        if message['type'] == 'relayer_trame':
+            # Relais sans accès à la base: on évite le close_old_connections que channels
+            # fait avant chaque handler (un aller-retour vers un thread par message et par socket)
+            await self.relayer_trame(message)
+            return
+        await super().dispatch(message)
+
+    async def relayer_trame(self, event):
+        """Trame déjà sérialisée par l'émetteur (canaux.evenement_trame): aucun ré-encodage"""
+        await self.send(text_data=event['texte'])
 
     async def send_course_alert(self, event):
         """Envoyer une alerte de nouvelle course à tous les chauffeurs du groupe"""
@@ -748,7 +716,9 @@ class ChauffeurConsumer(AsyncWebsocketConsumer):
             "depart": event['depart'],
             "destination": event['destination'],
             "tarif_estime": str(event['tarif_estime']),
-            "type_vehicule": event['type_vehicule']
+            "type_vehicule": event['type_vehicule'],
+            "distance_km": event.get('distance_km'),
+            "eta_minutes": event.get('eta_minutes')
         }))
 
     async def course_confirmed(self, event):
@@ -761,30 +731,18 @@ class ChauffeurConsumer(AsyncWebsocketConsumer):
         }))
 
     @sync_to_async
-    def confirm_course(self, course_id, chauffeur_id):
-        """Confirmer une course (méthode synchrone wrappée)"""
-        from .models import Course, Chauffeur
+    def confirm_course(self, course_id):
+        """Confirmer une course (méthode synchrone wrappée), même arbitrage et même visibilité que l'API"""
+        chauffeur_id = self.chauffeur_id
         try:
-            course = Course.objects.get(id=course_id)
-            chauffeur = Chauffeur.objects.get(id=chauffeur_id)
-            
-            # Vérifier si la course est toujours disponible
-            if course.statut == 'demandee':
-                course.chauffeur = chauffeur
-                course.statut = 'acceptee'
-                course.date_acceptation = timezone.now()
-                course.save()
-                
-                # Mettre à jour le statut du chauffeur
-                chauffeur.statut = 'en_course'
-                chauffeur.save()
-                
-                # Notifier les autres chauffeurs
-                NotificationService.notifier_confirmation_course(course.id, chauffeur.id)
-                return True
-            return False
-        except (Course.DoesNotExist, Chauffeur.DoesNotExist):
-            return False
+            with transaction.atomic():
+                resultat = accepter_course(course_id, chauffeur_id, courses=courses_visibles(self.scope["user"]))
+                if resultat == ACCEPTEE:
+                    # Notifier les autres chauffeurs
+                    notifier_sans_annuler(NotificationService.notifier_confirmation_course, course_id, chauffeur_id)
+        except (TypeError, ValueError):
+            return COURSE_INTROUVABLE
+        return resultat
 
 class VehiculeViewSet(viewsets.ModelViewSet):
     queryset = Vehicule.objects.all().select_related('chauffeur__utilisateur')
@@ -796,27 +754,90 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+def historique_courses(request, courses, nom_fichier):
+    """
+    Courses d'un client ou d'un chauffeur, de la plus récente à la plus ancienne.
+    ?du=&au= bornent date_demande; pages numérotées ou ?pagination=curseur;
+    ?sortie=json envoie tout l'historique en flux, sans pagination.
+    """
+    try:
+        courses = filtrer_periode(courses, request.query_params.get('du'), request.query_params.get('au'))
+    except ValueError as e:
+        return Response({'erreur': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    courses = courses.order_by('-date_demande', '-id')
+
+    if parametre('COURSES_LECTURE_RAPIDE', True):
+        lignes, representer = CourseLecture.projeter(courses), CourseLecture.representer
+    else:
+        lignes = courses.select_related('client__utilisateur', 'chauffeur__utilisateur')
+
+        def representer(page):
+            return CourseSerializer(page, many=True, context={'request': request}).data
+
+    if request.query_params.get('sortie') == 'json':
+        return json_en_flux(request, lignes, representer, nom_fichier)
+    pagination = PaginationCurseur() if PaginationCurseur.demandee(request) else StandardResultsSetPagination()
+    page = pagination.paginate_queryset(lignes, request)
+    return pagination.get_paginated_response(representer(page))
+
+
+def exporter_en_flux(request, nom):
+    """
+    Export `nom` (exports.EXPORTS) en flux: ?sortie=csv (défaut) ou ndjson,
+    ?du=&au= sur sa date, filtres d'égalité de l'export (?statut=...).
+    """
+    export = EXPORTS[nom]
+    sortie = request.query_params.get('sortie', 'csv')
+    if sortie not in SORTIES:
+        return Response({'erreur': f"Sortie inconnue, choisir parmi: {', '.join(SORTIES)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    parametres = request.query_params
+    try:
+        lignes = export.lignes(parametres.get('du'), parametres.get('au'),
+                               **{filtre: parametres.get(filtre) for filtre in export.filtres})
+    except ValueError as e:
+        return Response({'erreur': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    encoder, debut = export.encodeur(sortie)
+    logger.info("Export %s (%s) demandé par %s: %s", nom, sortie, request.user, dict(parametres))
+    return reponse_en_flux(request, lignes, encoder, TYPES_CONTENU[sortie], export.nom_fichier(sortie), debut=debut)
+
 class CourseViewSet(viewsets.ModelViewSet):
-    queryset = Course.objects.select_related('client', 'chauffeur', 'paiement', 'evaluation').all()
+    queryset = Course.objects.select_related(
+        'client__utilisateur', 'chauffeur__utilisateur', 'paiement', 'evaluation'
+    ).all()
     serializer_class = CourseSerializer
     pagination_class = StandardResultsSetPagination
     permission_classes = [permissions.AllowAny]
 
+    def list(self, request, *args, **kwargs):
+        """Liste par le chemin rapide (values() + dicts, sortie identique à CourseSerializer)"""
+        if not parametre('COURSES_LECTURE_RAPIDE', True):
+            return super().list(request, *args, **kwargs)
+        queryset = CourseLecture.projeter(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(CourseLecture.representer(page))
+        return Response(CourseLecture.representer(queryset))
+
+    @property
+    def paginator(self):
+        """?pagination=curseur: pagination keyset sur (date_demande, id), sans COUNT ni OFFSET"""
+        if not hasattr(self, '_paginator') and PaginationCurseur.demandee(self.request):
+            self._paginator = PaginationCurseur()
+        return super().paginator
+
     def perform_create(self, serializer):
         try:
-            course = serializer.save(statut='demandee', date_demande=timezone.now())
-            print(f"✅ Course {course.id} créée avec succès")
-            print(f"📋 Détails course: Type={course.type_vehicule_demande}, Départ={course.adresse_depart}")
+            # Course et notifications (file d'envoi) dans la même transaction
+            with transaction.atomic():
+                course = serializer.save(statut='demandee', date_demande=timezone.now())
+                print(f"✅ Course {course.id} créée avec succès")
+                print(f"📋 Détails course: Type={course.type_vehicule_demande}, Départ={course.adresse_depart}")
 
-            try:
                 # 🔥 CETTE MÉTHODE ENVOIE MAINTENANT LES SMS + WEBSOCKET
                 print(f"🚀 Lancement notifications pour course {course.id}")
-                NotificationService.envoyer_notification_course(course.id)
-                print(f"✅ Notifications lancées pour course {course.id}")
-            except Exception as e:
-                print(f"⚠ Notification échouée: {e}")
-                import traceback
-                traceback.print_exc()
+                if notifier_sans_annuler(NotificationService.envoyer_notification_course, course.id):
+                    print(f"✅ Notifications lancées pour course {course.id}")
         except Exception as e:
             print(f"❌ Erreur création course: {e}")
             import traceback
@@ -829,24 +850,10 @@ class CourseViewSet(viewsets.ModelViewSet):
 
         # 🚖 Si c'est un chauffeur connecté
         if hasattr(user, 'chauffeur'):
-            chauffeur = user.chauffeur
-
-            try:
-                vehicule = Vehicule.objects.get(chauffeur=chauffeur)
-                type_vehicule = vehicule.type_vehicule
-
-                # ✅ Le chauffeur voit uniquement :
-                # - les courses de son type de véhicule
-                # - qui sont demandées ou qu'il a acceptées
-                queryset = queryset.filter(
-                    type_vehicule_demande=type_vehicule
-                ).filter(
-                    Q(statut='demandee', chauffeur__isnull=True) |
-                    Q(chauffeur=chauffeur)
-                )
-
-            except Vehicule.DoesNotExist:
-                return Course.objects.none()
+            # ✅ Le chauffeur voit uniquement :
+            # - les courses de son type de véhicule
+            # - qui sont demandées ou qu'il a acceptées
+            queryset = courses_visibles(user, queryset)
 
         else:
             # 👤 Pour client/admin : filtres facultatifs
@@ -866,61 +873,43 @@ class CourseViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def accepter(self, request, pk=None):
-        """Accepter une course"""
-        course = self.get_object()
+        """Accepter une course: le premier chauffeur gagne, les suivants reçoivent 409"""
         chauffeur_id = request.data.get('chauffeur_id')
-        print(f"🚖 Chauffeur {chauffeur_id} tente d'accepter la course {course.id}")
-        if course.statut != 'demandee':
-            return Response({'erreur': 'Course déjà acceptée ou terminée'}, status=status.HTTP_400_BAD_REQUEST)
-
+        print(f"🚖 Chauffeur {chauffeur_id} tente d'accepter la course {pk}")
         try:
-            chauffeur = Chauffeur.objects.get(id=chauffeur_id)
-            course.chauffeur = chauffeur
-            course.statut = 'acceptee'
-            course.date_acceptation = timezone.now()
-            course.save()
-
-            chauffeur.statut = 'en_course'
-            chauffeur.save()
-
-            # 🔥 CETTE MÉTHODE ENVOIE MAINTENANT LE SMS DE CONFIRMATION AU CLIENT
-            NotificationService.notifier_confirmation_course(course.id, chauffeur.id)
-
-            return Response({'statut': 'Course acceptée'})
-        except Chauffeur.DoesNotExist:
+            with transaction.atomic():
+                resultat = accepter_course(pk, chauffeur_id, courses=self.get_queryset())
+                if resultat == ACCEPTEE:
+                    # 🔥 CETTE MÉTHODE ENVOIE MAINTENANT LE SMS DE CONFIRMATION AU CLIENT
+                    notifier_sans_annuler(NotificationService.notifier_confirmation_course, pk, chauffeur_id)
+        except (TypeError, ValueError):
+            return Response({'erreur': 'Identifiant de course ou de chauffeur invalide'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if resultat == DEJA_PRISE:
+            print(f"⛔ Course {pk} déjà prise, chauffeur {chauffeur_id} refusé")
+            return Response({'erreur': 'Course déjà prise'}, status=status.HTTP_409_CONFLICT)
+        if resultat == COURSE_INTROUVABLE:
+            return Response({'erreur': 'Course non trouvée'}, status=status.HTTP_404_NOT_FOUND)
+        if resultat == CHAUFFEUR_INTROUVABLE:
             return Response({'erreur': 'Chauffeur non trouvé'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'statut': 'Course acceptée'})
 
     @action(detail=True, methods=['post'])
     def demarrer(self, request, pk=None):
         """Démarrer une course"""
-        course = self.get_object()
-        if course.statut != 'acceptee':
+        resultat = demarrer_course(self.get_object().pk, courses=self.get_queryset())
+        if resultat != DEMARREE:
             return Response({'erreur': 'Course non acceptée'}, status=status.HTTP_400_BAD_REQUEST)
 
-        course.statut = 'en_cours'
-        course.date_debut = timezone.now()
-        course.save()
-
         return Response({'statut': 'Course démarrée'})
 
     @action(detail=True, methods=['post'])
     def terminer(self, request, pk=None):
         """Terminer une course"""
-        course = self.get_object()
-        course.statut = 'terminee'
-        course.date_fin = timezone.now()
-        course.tarif_final = request.data.get('tarif_final', course.tarif_estime)
-        course.save()
-
-        if course.chauffeur:
-            course.chauffeur.statut = 'disponible'
-            course.chauffeur.save()
-
-        Paiement.objects.create(
-            course=course,
-            montant=course.tarif_final,
-            statut_paiement='en_attente'
-        )
+        resultat = terminer_course(self.get_object().pk, request.data.get('tarif_final'), courses=self.get_queryset())
+        if resultat != TERMINEE:
+            return Response({'erreur': 'Course non acceptée ou déjà terminée'}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({'statut': 'Course terminée'})
 
@@ -931,6 +920,170 @@ class CourseViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(courses, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    def trajet(self, request, pk=None):
+        """
+        Trajet du chauffeur pendant la course, dans l'ordre: positions détaillées
+        (partitions de la période de la course), ou traces résumées au-delà de la rétention.
+        """
+        course = self.get_object()
+        if course.chauffeur_id is None:
+            return Response({'erreur': 'Course sans chauffeur'}, status=status.HTTP_400_BAD_REQUEST)
+        points = [
+            {'latitude': latitude, 'longitude': longitude, 'date_position': date}
+            for latitude, longitude, date in HistoriquePosition.objects.trajet_course(course).values_list(
+                'latitude', 'longitude', 'date_position')
+        ]
+        resume = False
+        if not points:
+            debut = course.date_acceptation or course.date_debut or course.date_demande
+            traces = TracePosition.objects.filter(
+                chauffeur_id=course.chauffeur_id, date_debut__gte=debut, date_debut__lte=course.date_fin or timezone.now()
+            ).order_by('date_debut')
+            points = [
+                {'latitude': latitude, 'longitude': longitude, 'date_position': date}
+                for latitude, longitude, date in traces.values_list('latitude', 'longitude', 'date_debut')
+            ]
+            resume = bool(points)
+        return Response({'course_id': course.id, 'resume': resume, 'points': points})
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def exporter(self, request):
+        """Export CSV/NDJSON des courses (exporter_en_flux), administrateurs seulement"""
+        return exporter_en_flux(request, 'courses')
+
+    def perimetre_synchronisation(self):
+        """Ce qu'un appareil a pu recevoir: les courses qui en sortent lui sont signalées comme supprimées"""
+        user = self.request.user
+        if hasattr(user, 'chauffeur'):
+            type_vehicule = Vehicule.objects.filter(chauffeur=user.chauffeur).values_list(
+                'type_vehicule', flat=True).first()
+            return {'type_vehicule_demande': type_vehicule}
+        return {
+            champ: self.request.query_params[champ]
+            for champ in ('client_id', 'chauffeur_id') if self.request.query_params.get(champ)
+        }
+
+    @action(detail=False, methods=['get'])
+    def modifications(self, request):
+        """
+        Courses créées, modifiées ou supprimées depuis le jeton `depuis`
+        (sans jeton: toutes les courses de la liste). Mêmes filtres que la liste.
+        """
+        try:
+            delta = modifications(
+                self.filter_queryset(self.get_queryset()),
+                self.perimetre_synchronisation(),
+                jeton=request.query_params.get('depuis'),
+            )
+        except ValueError:
+            return Response({'erreur': 'Jeton de synchronisation invalide'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'courses': self.get_serializer(delta['courses'], many=True).data,
+            'supprimees': delta['supprimees'],
+            'jeton': delta['jeton'],
+            'complet': delta['complet'],
+        })
+
+# ---------- Cycle de vie des courses, vues async (ASGI) ----------
+# Mêmes règles que CourseViewSet.accepter/demarrer/terminer. L'ORM async n'a pas
+# de transactions: les écritures qui doivent être validées ensemble passent par
+# un seul sync_to_async; les diffusions WebSocket partent après la réponse.
+
+def _contexte_course(request):
+    """
+    Courses visibles par l'utilisateur, authentifié comme dans les vues DRF
+    (JWT, session, basic). Comme CourseViewSet, l'authentification est facultative;
+    des identifiants invalides lèvent AuthenticationFailed.
+    """
+    utilisateur = Request(request, authenticators=[
+        classe() for classe in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    ]).user
+    return courses_visibles(utilisateur)
+
+
+async def _preparer(request):
+    """(courses visibles, données du corps) ou une JsonResponse d'erreur"""
+    try:
+        courses = await sync_to_async(_contexte_course)(request)
+    except APIException as e:
+        return None, JsonResponse(e.detail if isinstance(e.detail, dict) else {'detail': e.detail},
+                                  status=e.status_code)
+    if request.content_type == 'application/json':
+        try:
+            donnees = json.loads(request.body or b'{}')
+        except ValueError:
+            return None, JsonResponse({'erreur': 'JSON invalide'}, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        donnees = request.POST
+    return (courses, donnees), None
+
+
+def _accepter_et_confirmer_client(course_id, chauffeur_id, courses):
+    with transaction.atomic():
+        resultat = accepter_course(course_id, chauffeur_id, courses=courses)
+        if resultat == ACCEPTEE:
+            # Le SMS au client reste dans la file durable, validé avec l'acceptation
+            SMSService.envoyer_sms_confirmation_client(course_id)
+    return resultat
+
+
+@csrf_exempt
+@require_POST
+async def accepter_course_async(request, pk):
+    """Accepter une course: 409 pour les chauffeurs arrivés après le premier"""
+    contexte, erreur = await _preparer(request)
+    if erreur:
+        return erreur
+    courses, donnees = contexte
+    chauffeur_id = donnees.get('chauffeur_id')
+    try:
+        resultat = await sync_to_async(_accepter_et_confirmer_client)(pk, chauffeur_id, courses)
+    except (TypeError, ValueError):
+        return JsonResponse({'erreur': 'Identifiant de chauffeur invalide'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if resultat == DEJA_PRISE:
+        return JsonResponse({'erreur': 'Course déjà prise'}, status=status.HTTP_409_CONFLICT)
+    if resultat == COURSE_INTROUVABLE:
+        return JsonResponse({'erreur': 'Course non trouvée'}, status=status.HTTP_404_NOT_FOUND)
+    if resultat == CHAUFFEUR_INTROUVABLE:
+        return JsonResponse({'erreur': 'Chauffeur non trouvé'}, status=status.HTTP_404_NOT_FOUND)
+
+    planifier(NotificationService.adiffuser_confirmation_course(pk, chauffeur_id))
+    return JsonResponse({'statut': 'Course acceptée'})
+
+
+@csrf_exempt
+@require_POST
+async def demarrer_course_async(request, pk):
+    """Démarrer une course acceptée"""
+    contexte, erreur = await _preparer(request)
+    if erreur:
+        return erreur
+    resultat = await ademarrer_course(pk, courses=contexte[0])
+    if resultat == COURSE_INTROUVABLE:
+        return JsonResponse({'erreur': 'Course non trouvée'}, status=status.HTTP_404_NOT_FOUND)
+    if resultat != DEMARREE:
+        return JsonResponse({'erreur': 'Course non acceptée'}, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse({'statut': 'Course démarrée'})
+
+
+@csrf_exempt
+@require_POST
+async def terminer_course_async(request, pk):
+    """Terminer une course (paiement en attente créé dans la même transaction)"""
+    contexte, erreur = await _preparer(request)
+    if erreur:
+        return erreur
+    courses, donnees = contexte
+    resultat = await sync_to_async(terminer_course)(pk, donnees.get('tarif_final'), courses=courses)
+    if resultat == COURSE_INTROUVABLE:
+        return JsonResponse({'erreur': 'Course non trouvée'}, status=status.HTTP_404_NOT_FOUND)
+    if resultat != TERMINEE:
+        return JsonResponse({'erreur': 'Course non acceptée ou déjà terminée'}, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse({'statut': 'Course terminée'})
+
+
 class PaiementViewSet(viewsets.ModelViewSet):
     queryset = Paiement.objects.all().select_related('course')
     serializer_class = PaiementSerializer
@@ -954,21 +1107,86 @@ class PaiementViewSet(viewsets.ModelViewSet):
         
         return Response({'statut': 'Paiement confirmé'})
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def exporter(self, request):
+        """Export CSV/NDJSON des paiements et de leur course (exporter_en_flux), administrateurs seulement"""
+        return exporter_en_flux(request, 'paiements')
+
 class EvaluationViewSet(viewsets.ModelViewSet):
     queryset = Evaluation.objects.all().select_related('chauffeur_utilisateur', 'client_utilisateur', 'course')
     serializer_class = EvaluationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 class HistoriquePositionViewSet(viewsets.ModelViewSet):
-    queryset = HistoriquePosition.objects.all().select_related('chauffeur__utilisateur')
+    queryset = HistoriquePosition.objects.select_related('chauffeur__utilisateur').order_by('-date_position')
     serializer_class = HistoriquePositionSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @action(detail=False, methods=['post'])
+    def lot(self, request):
+        """
+        Enregistrer plusieurs positions en une requête.
+        Corps: [{"chauffeur", "latitude", "longitude", "date_position"}, ...] ou {"positions": [...]}.
+        date_position (ISO 8601, facultative, heure de réception par défaut) permet d'envoyer
+        les points enregistrés hors ligne: tous sont gardés, seuls les doublons exacts sont fusionnés.
+        """
+        donnees = request.data.get('positions') if isinstance(request.data, dict) else request.data
+        # Un chauffeur connecté n'envoie que ses propres positions
+        chauffeur_id = request.user.chauffeur.id if hasattr(request.user, 'chauffeur') else None
+
+        points, erreurs = valider_positions(donnees, chauffeur_id=chauffeur_id)
+        if not points and erreurs:
+            return Response({'erreurs': erreurs}, status=status.HTTP_400_BAD_REQUEST)
+
+        tampon_positions.ajouter(points)
+        return Response({'acceptees': len(points), 'erreurs': erreurs}, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def exporter(self, request):
+        """Export CSV/NDJSON des positions (exporter_en_flux), administrateurs seulement"""
+        return exporter_en_flux(request, 'positions')
+
 class TarifViewSet(viewsets.ModelViewSet):
     queryset = Tarif.objects.filter(est_actif=True)
     serializer_class = TarifSerializer
     permission_classes = [permissions.IsAuthenticated]
-    
+
+    @action(detail=False, methods=['post'])
+    def estimer(self, request):
+        """
+        Tarifer plusieurs trajets en une requête, sans accès à la base.
+        Corps: [{"distance_km", "duree_minutes", "type_vehicule"}, ...] ou {"trajets": [...]};
+        "latitude_depart"/"longitude_depart" optionnels appliquent la majoration de la zone.
+        """
+        donnees = request.data.get('trajets') if isinstance(request.data, dict) else request.data
+        if not isinstance(donnees, list):
+            return Response({"erreur": "Une liste de trajets est attendue"}, status=status.HTTP_400_BAD_REQUEST)
+
+        trajets = []
+        for index, item in enumerate(donnees):
+            try:
+                distance_km = float(item['distance_km'])
+                duree_minutes = float(item.get('duree_minutes', 0))
+                depart = (item.get('latitude_depart'), item.get('longitude_depart'))
+                depart = tuple(float(valeur) for valeur in depart) if None not in depart else (None, None)
+                # float() accepte "inf" et "nan"
+                if not all(math.isfinite(valeur) for valeur in (distance_km, duree_minutes, *depart) if valeur is not None):
+                    raise ValueError
+                if distance_km < 0 or duree_minutes < 0:
+                    raise ValueError
+            except (KeyError, TypeError, ValueError, AttributeError):
+                return Response(
+                    {"erreur": f"Trajet {index} invalide: distance_km et duree_minutes positifs attendus"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            trajets.append((distance_km, duree_minutes, item.get('type_vehicule', 'berline'), *depart))
+
+        devis = moteur_tarifaire.devis_lot(trajets)
+        return Response([
+            {'type_vehicule': trajet[2], 'tarif_estime': str(tarif), 'majoration': multiplicateur}
+            for trajet, (tarif, multiplicateur) in zip(trajets, devis)
+        ])
+
 class RevenuMensuelView(APIView):
     permission_classes = [permissions.AllowAny]
 
@@ -1173,8 +1391,48 @@ class ChauffeursDisponiblesView(APIView):
                 }
             })
 
+        # Point de prise en charge optionnel: distance et temps d'approche, tri du plus proche au plus loin
+        latitude = request.query_params.get('latitude')
+        longitude = request.query_params.get('longitude')
+        if latitude is not None and longitude is not None:
+            try:
+                latitude, longitude = float(latitude), float(longitude)
+            except ValueError:
+                return Response(
+                    {"erreur": "latitude et longitude doivent être des nombres"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            index = get_index()
+            localises = [(item, index.position(item['id'])) for item in data]
+            localises = [(item, position) for item, position in localises if position is not None]
+            for item in data:
+                item['distance_km'] = None
+                item['eta_minutes'] = None
+            if localises:
+                distances, etas = distances_et_eta(
+                    [position[0] for _, position in localises],
+                    [position[1] for _, position in localises],
+                    latitude, longitude
+                )
+                for (item, _), distance, eta in zip(localises, distances.tolist(), etas.tolist()):
+                    item['distance_km'] = round(distance, 2)
+                    item['eta_minutes'] = round(eta)
+            data.sort(key=lambda item: (item['distance_km'] is None, item['distance_km'] or 0))
+
         return Response(data)
 
+class SanteChannelsView(APIView):
+    """Contrôle de santé de la couche channels (aller-retour send/receive), 503 si en échec"""
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        resultat = async_to_sync(verifier_couche)()
+        return Response(
+            resultat,
+            status=status.HTTP_200_OK if resultat['ok'] else status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+
 class NombreClientsTotalView(APIView):
     permission_classes = [permissions.AllowAny]
 
@@ -1208,11 +1466,14 @@ class CheckPhoneView(APIView):
                 'error': 'Le numéro de téléphone est requis'
             }, status=400)
         
+        # Comparaison sur la forme E.164 indexée: "622 00 00 00" et "+224622000000" sont le même numéro
+        critere = filtre_telephone(telephone)
+
         # Vérifier si le téléphone existe dans Client
-        client_exists = Client.objects.filter(telephone=telephone).exists()
+        client_exists = Client.objects.filter(**critere).exists()
         
         # Vérifier si le téléphone existe dans Chauffeur (si applicable)
-        chauffeur_exists = Chauffeur.objects.filter(telephone=telephone).exists()
+        chauffeur_exists = Chauffeur.objects.filter(**critere).exists()
         
         exists = client_exists or chauffeur_exists
         